@@ -0,0 +1,40 @@
+# benchmarks/compare.py（对比两次压测结果，输出各场景吞吐量、延迟与SQL数的变化）
+# 用法：python -m benchmarks.compare base.json new.json
+import argparse
+import json
+
+METRICS = (
+    ('throughput_rps', lambda r: r['throughput_rps'], True),
+    ('p50_ms', lambda r: r['latency_ms']['p50'], False),
+    ('p95_ms', lambda r: r['latency_ms']['p95'], False),
+    ('p99_ms', lambda r: r['latency_ms']['p99'], False),
+    ('queries', lambda r: r['queries_per_request'], False),
+)
+
+
+def _load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='对比两次压测结果')
+    parser.add_argument('base')
+    parser.add_argument('new')
+    options = parser.parse_args(argv)
+    base, new = _load(options.base), _load(options.new)
+    if base['meta']['config'] != new['meta']['config']:
+        print('注意：两次压测的数据量/并发配置不同，结果不可直接比较')
+    print(f"base {(base['meta']['git_commit'] or '')[:10]}  ->  new {(new['meta']['git_commit'] or '')[:10]}")
+    for scenario in sorted(set(base['scenarios']) & set(new['scenarios'])):
+        print(scenario)
+        for name, getter, higherIsBetter in METRICS:
+            old, cur = getter(base['scenarios'][scenario]), getter(new['scenarios'][scenario])
+            change = (cur - old) / old * 100 if old else 0
+            better = (change > 0) == higherIsBetter if change else None
+            mark = '' if better is None else ('+' if better else '-')
+            print(f'  {name:<15} {old:>10} -> {cur:>10}  {change:+7.1f}% {mark}')
+
+
+if __name__ == '__main__':
+    main()
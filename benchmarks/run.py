@@ -0,0 +1,233 @@
+# benchmarks/run.py（登录、用户/角色查询、用户详情与JWT中间件的并发压测）
+# 每次运行重建数据库并按参数生成确定性数据，用多个线程各持一个测试客户端并发请求，
+# 统计吞吐量、p50/p95/p99延迟与每请求SQL数，连同当前git提交输出为JSON，便于跨提交对比。
+# 用法：
+#     python -m benchmarks.run --users 10000 --concurrency 8 --requests 1000 --output bench.json
+#     BENCH_DB=mysql BENCH_DB_NAME=python222_bench python -m benchmarks.run
+#     python -m benchmarks.compare old.json new.json
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+SCENARIOS = ('login', 'user_search', 'role_search', 'user_action', 'middleware')
+
+
+def _git(*args):
+    try:
+        return subprocess.run(('git',) + args, capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def percentile(sortedValues, p):
+    """最近秩法百分位"""
+    if not sortedValues:
+        return None
+    return sortedValues[max(0, math.ceil(p / 100 * len(sortedValues)) - 1)]
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def _make_request(scenario, client, i, options, token):
+    auth = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+    if scenario == 'login':
+        userId = i % options.login_users + 1
+        return client.post('/user/login', {'username': f'bench_user_{userId}', 'password': options.password},
+                           content_type='application/json')
+    if scenario == 'user_search':
+        # 轮换查询词与页码，覆盖三元组检索与空查询
+        query = ('', 'user_1', 'bench', '_12')[i % 4]
+        return client.post('/user/search', {'pageNum': i % 5 + 1, 'pageSize': options.page_size, 'query': query},
+                           content_type='application/json', **auth)
+    if scenario == 'role_search':
+        return client.post('/role/search/', {'pageNum': 1, 'pageSize': options.page_size,
+                                              'query': ('', 'role_1')[i % 2]},
+                           content_type='application/json', **auth)
+    if scenario == 'user_action':
+        return client.get('/user/action', {'id': i % options.users + 1}, **auth)
+    if scenario == 'middleware':
+        return client.get('/bench/ping', **auth)
+    raise ValueError(scenario)
+
+
+def run_scenario(scenario, options, token):
+    from django.db import connection
+    from django.test import Client
+
+    latencies = []
+    queries = []
+    errors = []
+    lock = threading.Lock()
+    counter = iter(range(options.requests))
+    counterLock = threading.Lock()
+    barrier = threading.Barrier(options.concurrency + 1)
+
+    def worker():
+        client = Client()
+        localLatencies, localQueries, localErrors = [], [], 0
+        for i in range(options.warmup):
+            _make_request(scenario, client, i, options, token)
+        barrier.wait()
+        queryCounter = _QueryCounter()
+        with connection.execute_wrapper(queryCounter):
+            while True:
+                with counterLock:
+                    i = next(counter, None)
+                if i is None:
+                    break
+                before = queryCounter.count
+                begin = time.perf_counter()
+                response = _make_request(scenario, client, i, options, token)
+                elapsed = time.perf_counter() - begin
+                localLatencies.append(elapsed * 1000)
+                localQueries.append(queryCounter.count - before)
+                if response.status_code != 200 or response.json().get('code') != 200:
+                    localErrors += 1
+        connection.close()
+        with lock:
+            latencies.extend(localLatencies)
+            queries.extend(localQueries)
+            errors.append(localErrors)
+
+    threads = [threading.Thread(target=worker) for _ in range(options.concurrency)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    begin = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - begin
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': sum(errors),
+        'concurrency': options.concurrency,
+        'duration_s': round(duration, 3),
+        'throughput_rps': round(len(latencies) / duration, 1) if duration else None,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50), 3),
+            'p95': round(percentile(latencies, 95), 3),
+            'p99': round(percentile(latencies, 99), 3),
+            'mean': round(sum(latencies) / len(latencies), 3),
+            'max': round(latencies[-1], 3),
+        },
+        'queries_per_request': round(sum(queries) / len(queries), 2),
+    }
+
+
+def setup_database(options):
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connection
+
+    from .seed import seed
+
+    db = settings.DATABASES['default']
+    if db['ENGINE'].endswith('sqlite3'):
+        connection.close()
+        for suffix in ('', '-wal', '-shm'):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(str(db['NAME']) + suffix)
+    else:
+        call_command('flush', interactive=False, verbosity=0)
+    call_command('migrate', verbosity=0)
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=WAL')  # 允许并发读
+    seed(users=options.users, roles=options.roles, menus=options.menus, fanout=options.fanout,
+         roles_per_user=options.roles_per_user, seed=options.seed)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--roles', type=int, default=20)
+    parser.add_argument('--menus', type=int, default=200)
+    parser.add_argument('--fanout', type=int, default=50, help='每个角色关联的菜单数')
+    parser.add_argument('--roles-per-user', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--concurrency', type=int, default=8, help='并发客户端（线程）数')
+    parser.add_argument('--requests', type=int, default=1000, help='每个场景的总请求数')
+    parser.add_argument('--warmup', type=int, default=5, help='每个客户端正式计时前的预热请求数')
+    parser.add_argument('--page-size', type=int, default=20)
+    parser.add_argument('--login-users', type=int, default=50, help='登录场景轮换使用的用户数')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='逗号分隔，可选：' + ','.join(SCENARIOS))
+    parser.add_argument('--skip-seed', action='store_true', help='复用上次生成的数据库')
+    parser.add_argument('--output', help='结果JSON文件，默认输出到标准输出')
+    options = parser.parse_args(argv)
+    options.scenarios = [name for name in options.scenarios.split(',') if name]
+    unknown = set(options.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f'未知场景：{",".join(sorted(unknown))}')
+    return options
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    import django
+    django.setup()
+    from django.db import connection
+    from rest_framework_simplejwt.tokens import RefreshToken
+
+    from user.models import SysUser
+    from .seed import BENCH_PASSWORD
+
+    options.password = BENCH_PASSWORD
+    if not options.skip_seed:
+        setup_database(options)
+    token = str(RefreshToken.for_user(SysUser.objects.get(id=1)).access_token)
+
+    results = {}
+    for scenario in options.scenarios:
+        # 视图与中间件中的print会严重干扰计时，压测期间丢弃标准输出
+        with contextlib.redirect_stdout(io.StringIO()):
+            results[scenario] = run_scenario(scenario, options, token)
+        print(f"{scenario:<12} {results[scenario]['throughput_rps']:>8} req/s  "
+              f"p50 {results[scenario]['latency_ms']['p50']:>8} ms  "
+              f"p99 {results[scenario]['latency_ms']['p99']:>8} ms  "
+              f"{results[scenario]['queries_per_request']} queries/req", file=sys.stderr)
+
+    report = {
+        'meta': {
+            'git_commit': _git('rev-parse', 'HEAD'),
+            'git_dirty': bool(_git('status', '--porcelain', '--untracked-files=no')),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'cpu_count': os.cpu_count(),
+            'config': {key: getattr(options, key) for key in (
+                'users', 'roles', 'menus', 'fanout', 'roles_per_user', 'seed', 'concurrency', 'requests',
+                'warmup', 'page_size', 'login_users')},
+        },
+        'scenarios': results,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if options.output:
+        with open(options.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+# benchmarks/seed.py（按配置的数据量生成确定性的压测数据）
+# 同样的参数与随机种子总是生成同样的数据，不同提交之间的压测结果才有可比性。
+import random
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from menu import closure
+from menu.models import SysMenu, SysRoleMenu
+from role.models import SysRole, SysUserRole
+from user.models import SysUser
+from user.search import rebuild_index
+
+BENCH_PASSWORD = 'bench123456'
+BATCH_SIZE = 2000
+
+
+def _menus(count):
+    """目录(M) -> 菜单(C) -> 按钮(F) 三层结构"""
+    menus = []
+    directories = max(1, count // 20)
+    for i in range(1, count + 1):
+        if i <= directories:
+            parentId, menuType = 0, 'M'
+        elif i <= directories * 5:
+            parentId, menuType = (i - 1) % directories + 1, 'C'
+        else:
+            parentId, menuType = (i - 1) % (directories * 4) + directories + 1, 'F'
+        menus.append(SysMenu(id=i, name=f'bench_menu_{i}', icon='system', parent_id=parentId, order_num=i % 10,
+                             path=f'/bench/{i}', component=f'bench/{i}/index', menu_type=menuType,
+                             perms=f'bench:menu:{i}', create_time=date(2024, 1, 1)))
+    return menus
+
+
+def seed(users=10000, roles=20, menus=200, fanout=50, roles_per_user=2, seed=42):
+    """
+    :param fanout: 每个角色关联的菜单数
+    :param roles_per_user: 每个用户关联的角色数（1~roles_per_user个）
+    """
+    rng = random.Random(seed)
+    password = make_password(BENCH_PASSWORD)  # 所有压测用户共用一个哈希，避免生成数据时逐个计算PBKDF2
+    baseDate = date(2024, 1, 1)
+    with transaction.atomic():
+        SysMenu.objects.bulk_create(_menus(menus), batch_size=BATCH_SIZE)
+        SysRole.objects.bulk_create([SysRole(id=i, name=f'bench_role_{i}', code=f'bench_{i}')
+                                     for i in range(1, roles + 1)], batch_size=BATCH_SIZE)
+        SysRoleMenu.objects.bulk_create([
+            SysRoleMenu(role_id=roleId, menu_id=menuId)
+            for roleId in range(1, roles + 1)
+            for menuId in rng.sample(range(1, menus + 1), min(fanout, menus))
+        ], batch_size=BATCH_SIZE)
+        SysUser.objects.bulk_create([
+            SysUser(id=i, username=f'bench_user_{i}', password=password, avatar='default.jpg',
+                    email=f'bench_user_{i}@example.com', phonenumber=f'138{i:08d}', status=1,
+                    create_time=baseDate + timedelta(days=i % 365), update_time=baseDate, remark='')
+            for i in range(1, users + 1)
+        ], batch_size=BATCH_SIZE)
+        SysUserRole.objects.bulk_create([
+            SysUserRole(user_id=userId, role_id=roleId)
+            for userId in range(1, users + 1)
+            for roleId in rng.sample(range(1, roles + 1), rng.randint(1, min(roles_per_user, roles)))
+        ], batch_size=BATCH_SIZE)
+    # bulk_create不触发信号，手动回填检索索引与菜单闭包表
+    rebuild_index()
+    closure.rebuild()
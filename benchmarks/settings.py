@@ -0,0 +1,17 @@
+# benchmarks/settings.py（压测专用配置：在项目配置基础上替换数据库与路由）
+# 默认使用本地SQLite文件；BENCH_DB=mysql 时沿用项目的MySQL连接参数，库名取 BENCH_DB_NAME。
+import os
+
+from python222.settings import *  # noqa: F401,F403
+from python222.settings import BASE_DIR, DATABASES as PROJECT_DATABASES
+
+if os.environ.get('BENCH_DB', 'sqlite') == 'mysql':
+    DATABASES = {'default': {**PROJECT_DATABASES['default'],
+                             'NAME': os.environ.get('BENCH_DB_NAME', 'python222_bench')}}
+else:
+    DATABASES = {'default': {'ENGINE': 'django.db.backends.sqlite3',
+                             'NAME': os.environ.get('BENCH_DB_NAME', str(BASE_DIR / 'bench.sqlite3'))}}
+
+ROOT_URLCONF = 'benchmarks.urls'
+ALLOWED_HOSTS = ['*']
+DEBUG = False
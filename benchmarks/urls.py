@@ -0,0 +1,19 @@
+# benchmarks/urls.py（压测路由：只挂载被压测的接口，另加一个空接口用于单独测量JWT中间件开销）
+from django.urls import path
+
+from python222.fastjson import JsonResponse
+from role.views import SearchView as RoleSearchView
+from user.views import ActionView, LoginView, SearchView
+
+
+def ping(request):
+    return JsonResponse({'code': 200})
+
+
+urlpatterns = [
+    path('user/login', LoginView.as_view()),
+    path('user/search', SearchView.as_view()),
+    path('user/action', ActionView.as_view()),
+    path('role/search/', RoleSearchView.as_view()),
+    path('bench/ping', ping),
+]
@@ -0,0 +1,177 @@
+# menu/cache.py（用户权限菜单树缓存）
+# 缓存条目按用户存放，条目内记录生成时的"用户角色集合版本 + 各角色菜单版本"，
+# 读取时比对当前版本，任一版本变化即视为失效，由 menu/signals.py 负责递增版本号。
+# 写入方需在查库前取 generation()，写入时传回：查库期间发生过任何失效则放弃写入，
+# 否则在查库后才取版本号，会把查到的旧数据存到变更后的新版本号下。
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+
+from python222.lru import LRUCache
+
+DEFAULT_MENU_CACHE = {
+    'BACKEND': 'locmem',  # locmem：进程内LRU；django：使用Django缓存框架（多进程共享）
+    'MAX_SIZE': 10000,  # 仅locmem有效
+    'TIMEOUT': 3600,  # 条目最长存活秒数，作为兜底
+    'CACHE_ALIAS': 'default',  # 仅django有效
+}
+
+
+def _new_version():
+    # 版本号丢失（如被缓存淘汰）后用时间戳重新初始化，保证不会与旧版本号重复
+    return time.time_ns()
+
+
+class LocMemBackend:
+    """进程内后端：条目走LRU淘汰，版本号单独存放不参与淘汰"""
+
+    def __init__(self, max_size):
+        self._entries = LRUCache(max_size)
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self._entries.get(key)
+
+    def set(self, key, value, timeout):
+        self._entries.set(key, value, timeout)
+
+    def get_versions(self, keys):
+        with self._lock:
+            return [self._versions.setdefault(key, _new_version()) for key in keys]
+
+    def bump_version(self, key):
+        with self._lock:
+            self._versions[key] = self._versions.get(key, _new_version()) + 1
+
+
+class DjangoCacheBackend:
+    """Django缓存后端：适合多进程部署（需配置redis/memcached等共享缓存）"""
+
+    def __init__(self, alias):
+        from django.core.cache import caches
+        self._cache = caches[alias]
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value, timeout):
+        self._cache.set(key, value, timeout)
+
+    def get_versions(self, keys):
+        found = self._cache.get_many(keys)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            for key in missing:
+                self._cache.add(key, _new_version(), None)
+            found.update(self._cache.get_many(missing))
+        return [found.get(key) for key in keys]
+
+    def bump_version(self, key):
+        try:
+            self._cache.incr(key)
+        except ValueError:
+            self._cache.add(key, _new_version(), None)
+
+
+class UserMenuCache:
+    """按用户缓存登录所需的菜单数据，以用户、角色版本号做精确失效"""
+
+    def __init__(self, backend, namespace='menu_tree', timeout=3600):
+        self.backend = backend
+        self.namespace = namespace
+        self.timeout = timeout
+
+    # 每次失效都会递增的全局代数，只用于判断查库期间是否发生过失效，不参与读取时的版本比对
+    GENERATION_KEY = 'menu_ver:generation'
+
+    @staticmethod
+    def user_version_key(user_id):
+        return f'menu_ver:user:{user_id}'
+
+    @staticmethod
+    def role_version_key(role_id):
+        return f'menu_ver:role:{role_id}'
+
+    def stamp(self, user_id, role_ids):
+        """用户当前的权限版本（用户角色集合版本 + 各角色版本），任一关联变更后都会变化"""
+        keys = [self.user_version_key(user_id)] + [self.role_version_key(role_id) for role_id in role_ids]
+        return tuple(self.backend.get_versions(keys))
+
+    def get(self, user_id):
+        """命中且版本一致时返回缓存的payload，否则返回None"""
+        entry = self.backend.get(f'{self.namespace}:{user_id}')
+        if entry is None:
+            return None
+        role_ids, stamp, payload = entry
+        if stamp != self.stamp(user_id, role_ids):
+            return None
+        return payload
+
+    def generation(self):
+        """查库前调用，结果传给set()"""
+        return self.backend.get_versions([self.GENERATION_KEY])[0]
+
+    def set(self, user_id, role_ids, payload, generation):
+        """
+        :param generation: 查库前取得的 generation()；与当前值不同说明查库期间有失效，放弃写入
+        :return: 是否写入
+        """
+        role_ids = tuple(sorted(role_ids))
+        stamp = self.stamp(user_id, role_ids)
+        if self.generation() != generation:
+            return False
+        self.backend.set(f'{self.namespace}:{user_id}', (role_ids, stamp, payload), self.timeout)
+        return True
+
+    def invalidate_user(self, user_id):
+        """用户的角色集合变化"""
+        self.backend.bump_version(self.user_version_key(user_id))
+        self.backend.bump_version(self.GENERATION_KEY)
+
+    def invalidate_roles(self, role_ids):
+        """角色本身或其菜单变化，影响拥有这些角色的所有用户"""
+        for role_id in set(role_ids):
+            self.backend.bump_version(self.role_version_key(role_id))
+        self.backend.bump_version(self.GENERATION_KEY)
+
+
+_backend = None
+_caches = {}
+_lock = threading.Lock()
+
+
+def _get_backend():
+    global _backend
+    if _backend is None:
+        conf = {**DEFAULT_MENU_CACHE, **getattr(settings, 'MENU_CACHE', {})}
+        if conf['BACKEND'] == 'django':
+            _backend = DjangoCacheBackend(conf['CACHE_ALIAS'])
+        elif conf['BACKEND'] == 'locmem':
+            _backend = LocMemBackend(conf['MAX_SIZE'])
+        else:
+            raise ValueError(f"未知的MENU_CACHE后端：{conf['BACKEND']}")
+    return _backend
+
+
+def get_menu_cache(namespace='menu_tree'):
+    """获取指定命名空间的缓存实例，同一后端下的各命名空间共享版本号"""
+    with _lock:
+        cache = _caches.get(namespace)
+        if cache is None:
+            conf = {**DEFAULT_MENU_CACHE, **getattr(settings, 'MENU_CACHE', {})}
+            cache = _caches[namespace] = UserMenuCache(_get_backend(), namespace, conf['TIMEOUT'])
+        return cache
+
+
+def _reset(**kwargs):
+    global _backend
+    if kwargs['setting'] == 'MENU_CACHE':
+        with _lock:
+            _backend = None
+            _caches.clear()
+
+
+setting_changed.connect(_reset)
@@ -0,0 +1,135 @@
+# menu/closure.py（菜单层级闭包表的维护与查询）
+# SysMenu 只有 parent_id，子树/祖先链需要在Python中逐层查找父节点；
+# 闭包表 sys_menu_closure 为每对 (祖先, 后代) 存一行，子树与祖先链都只需一次走索引的查询。
+# parent_id 为0或指向不存在的菜单时视为顶级菜单。
+# 单个菜单的新增/移动/删除由 menu/signals.py 增量维护；bulk_create/update 等绕过信号的批量操作
+# 之后需执行 python manage.py rebuild_menu_closure。
+from collections import defaultdict
+
+from django.db import router, transaction
+from django.db.models import F
+
+from .models import SysMenu, SysMenuClosure
+
+BATCH_SIZE = 2000
+
+
+def compute_closure(pairs):
+    """
+    由 (id, parent_id) 计算全部闭包行
+    :return: [(ancestor_id, descendant_id, depth), ...]；存在环时抛出ValueError
+    """
+    parents = dict(pairs)
+    children = defaultdict(list)
+    for menuId, parentId in parents.items():
+        if parentId in parents and parentId != menuId:
+            children[parentId].append(menuId)
+    roots = [menuId for menuId, parentId in parents.items() if parentId not in parents or parentId == menuId]
+    rows = []
+    visited = set()
+    # 自顶向下遍历，沿途维护当前节点的祖先链
+    stack = [(root, ()) for root in roots]
+    while stack:
+        menuId, chain = stack.pop()
+        visited.add(menuId)
+        chain = chain + (menuId,)
+        depthOf = len(chain) - 1
+        rows.extend((ancestorId, menuId, depthOf - i) for i, ancestorId in enumerate(chain))
+        stack.extend((childId, chain) for childId in children[menuId])
+    if len(visited) != len(parents):
+        raise ValueError(f'菜单parent_id存在环：{sorted(set(parents) - visited)}')
+    return rows
+
+
+def _manager(using):
+    return SysMenuClosure.objects.db_manager(using)
+
+
+def insert_node(menu, using=None):
+    """新增菜单：自身一行 + 父菜单的每个祖先各一行"""
+    using = using or router.db_for_write(SysMenuClosure)
+    rows = [SysMenuClosure(ancestor_id=menu.id, descendant_id=menu.id, depth=0)]
+    if menu.parent_id and menu.parent_id != menu.id:
+        rows.extend(SysMenuClosure(ancestor_id=ancestorId, descendant_id=menu.id, depth=depth + 1)
+                    for ancestorId, depth in _manager(using).filter(descendant_id=menu.parent_id)
+                    .values_list('ancestor_id', 'depth'))
+    _manager(using).bulk_create(rows)
+
+
+def detach_subtree(menuId, using=None):
+    """删除子树与外部祖先之间的连接，子树内部连接保留（子树整体成为顶级）"""
+    using = using or router.db_for_write(SysMenuClosure)
+    subtreeIds = _manager(using).filter(ancestor_id=menuId).values('descendant_id')
+    ancestorIds = _manager(using).filter(descendant_id=menuId, depth__gt=0).values('ancestor_id')
+    # MySQL不允许DELETE的子查询引用同一张表，先取出id
+    outerLinks = list(_manager(using).filter(descendant_id__in=subtreeIds, ancestor_id__in=ancestorIds)
+                      .values_list('id', flat=True))
+    for i in range(0, len(outerLinks), BATCH_SIZE):
+        _manager(using).filter(id__in=outerLinks[i:i + BATCH_SIZE]).delete()
+
+
+def move_subtree(menu, using=None):
+    """菜单的parent_id变化：先断开与原祖先的连接，再与新父菜单的祖先做笛卡尔积连接"""
+    using = using or router.db_for_write(SysMenuClosure)
+    with transaction.atomic(using=using):
+        subtree = list(_manager(using).filter(ancestor_id=menu.id).values_list('descendant_id', 'depth'))
+        if not subtree:  # 闭包表中还没有该菜单（如升级前创建），按新增处理
+            insert_node(menu, using)
+            return
+        if menu.parent_id in {descendantId for descendantId, _ in subtree}:
+            raise ValueError('不能把菜单移动到自身或其子菜单下')
+        detach_subtree(menu.id, using)
+        if not menu.parent_id:
+            return
+        newAncestors = list(_manager(using).filter(descendant_id=menu.parent_id)
+                            .values_list('ancestor_id', 'depth'))
+        _manager(using).bulk_create([
+            SysMenuClosure(ancestor_id=ancestorId, descendant_id=descendantId, depth=ancestorDepth + depth + 1)
+            for ancestorId, ancestorDepth in newAncestors
+            for descendantId, depth in subtree
+        ], batch_size=BATCH_SIZE)
+
+
+def rebuild(using=None):
+    """按当前 parent_id 全量重建闭包表，返回写入的行数"""
+    using = using or router.db_for_write(SysMenuClosure)
+    pairs = SysMenu.objects.using(using).values_list('id', 'parent_id')
+    rows = compute_closure(pairs)
+    with transaction.atomic(using=using):
+        _manager(using).all().delete()
+        _manager(using).bulk_create(
+            [SysMenuClosure(ancestor_id=a, descendant_id=d, depth=depth) for a, d, depth in rows],
+            batch_size=BATCH_SIZE)
+    return len(rows)
+
+
+# ---------------------------- 查询 ----------------------------
+def subtree(menuId, include_self=True, max_depth=None):
+    """
+    菜单及其全部后代（一次联表查询），按层级、order_num排序，结果带 depth 属性
+    :param max_depth: 只取到第几层后代，None表示不限
+    """
+    # 条件须放在同一个filter()中，多次filter多值关联会产生多个JOIN
+    conditions = {'ancestor_links__ancestor_id': menuId}
+    if not include_self:
+        conditions['ancestor_links__depth__gt'] = 0
+    if max_depth is not None:
+        conditions['ancestor_links__depth__lte'] = max_depth
+    return SysMenu.objects.filter(**conditions).annotate(depth=F('ancestor_links__depth')) \
+        .order_by('depth', 'order_num', 'id')
+
+
+def ancestors(menuId, include_self=False):
+    """菜单的祖先链（一次联表查询），从顶级菜单到直接父菜单排序，结果带 depth 属性"""
+    conditions = {'descendant_links__descendant_id': menuId}
+    if not include_self:
+        conditions['descendant_links__depth__gt'] = 0
+    return SysMenu.objects.filter(**conditions).annotate(depth=F('descendant_links__depth')).order_by('-depth')
+
+
+def descendant_ids(menuIds, include_self=True):
+    """多个菜单的全部后代id（如级联停用目录下的所有菜单）"""
+    queryset = SysMenuClosure.objects.filter(ancestor_id__in=menuIds)
+    if not include_self:
+        queryset = queryset.filter(depth__gt=0)
+    return set(queryset.values_list('descendant_id', flat=True))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from menu.closure import rebuild
+
+
+class Command(BaseCommand):
+    help = '按 sys_menu.parent_id 全量重建菜单闭包表（批量导入或直接改库后执行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=None, help='数据库别名，默认按路由取写库')
+
+    def handle(self, *args, **options):
+        try:
+            count = rebuild(options['database'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f'菜单闭包表已重建，共 {count} 行'))
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_closure(apps, schema_editor):
+    # 为已有菜单生成闭包行
+    from menu.closure import compute_closure
+    SysMenu = apps.get_model('menu', 'SysMenu')
+    SysMenuClosure = apps.get_model('menu', 'SysMenuClosure')
+    db = schema_editor.connection.alias
+    rows = compute_closure(SysMenu.objects.using(db).values_list('id', 'parent_id'))
+    SysMenuClosure.objects.using(db).bulk_create(
+        [SysMenuClosure(ancestor_id=a, descendant_id=d, depth=depth) for a, d, depth in rows], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SysMenuClosure',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('depth', models.IntegerField(verbose_name='层级差')),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='menu.sysmenu')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='menu.sysmenu')),
+            ],
+            options={
+                'db_table': 'sys_menu_closure',
+                'indexes': [models.Index(fields=['descendant', 'depth'], name='sys_menu_closure_up')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='sysmenuclosure',
+            constraint=models.UniqueConstraint(fields=('ancestor', 'descendant'), name='sys_menu_closure_pair'),
+        ),
+        migrations.RunPython(backfill_closure, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, router, transaction
 from rest_framework import serializers
 from role.models import SysRole
 
@@ -22,15 +22,37 @@ class SysMenu(models.Model):
     def __lt__(self, other):
         return self.order_num < other.order_num
 
+    # 菜单与闭包表（由 menu/signals.py 维护）在同一事务中写入
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using') or router.db_for_write(SysMenu, instance=self)):
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using') or router.db_for_write(SysMenu, instance=self)):
+            return super().delete(*args, **kwargs)
+
     class Meta:
         db_table = "sys_menu"
 
 
+# 菜单层级闭包表：每对 (祖先, 后代) 一行，depth为层级差（自身到自身为0），由 menu/closure.py 维护
+class SysMenuClosure(models.Model):
+    id = models.BigAutoField(primary_key=True)
+    ancestor = models.ForeignKey(SysMenu, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(SysMenu, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.IntegerField(verbose_name="层级差")
+
+    class Meta:
+        db_table = "sys_menu_closure"
+        constraints = [models.UniqueConstraint(fields=['ancestor', 'descendant'], name='sys_menu_closure_pair')]
+        # 子树查询走 (ancestor, descendant) 唯一索引，祖先链查询走 (descendant, depth)
+        indexes = [models.Index(fields=['descendant', 'depth'], name='sys_menu_closure_up')]
+
+
 class SysMenuSerializer(serializers.ModelSerializer):
     children = serializers.SerializerMethodField()
 
     def get_children(self, obj):
-        print("111")
         if hasattr(obj, "children"):
             serializerMenuList: list[SysMenuSerializer2] = list()
             for sysMenu in obj.children:
@@ -0,0 +1,164 @@
+# menu/permissions.py（按用户编译的权限标识集合与鉴权入口）
+# 每个用户的有效权限（其全部角色关联菜单的perms）编译为不可变的驻留字符串集合，按用户缓存；
+# 缓存与菜单树共用 menu/cache.py 的用户/角色版本号，角色或菜单变更后由 menu/signals.py 统一失效。
+# 命中缓存时一次鉴权只是集合查找，不访问数据库。
+import functools
+import sys
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.http import HttpRequest
+from rest_framework.permissions import BasePermission
+from rest_framework_simplejwt.settings import api_settings
+
+from python222.db_router import replica_reads
+from python222.fastjson import JsonResponse
+from .cache import get_menu_cache
+from .services import MENU_STICKY_KEY, resolve_user_menus
+
+# 拥有该标识的用户视为拥有全部权限（超级管理员）
+ALL_PERMISSIONS = '*:*:*'
+PERMS_NAMESPACE = 'perms'
+
+
+def _split_perms(value):
+    # perms 字段可能以逗号分隔多个标识
+    return [sys.intern(perm.strip()) for perm in value.split(',') if perm.strip()]
+
+
+def compile_user_perms(user_id):
+    """
+    查询用户的有效权限（与登录菜单共用一次联表查询）
+    :return: (角色id列表, 权限标识frozenset)
+    """
+    with replica_reads(MENU_STICKY_KEY):
+        roleList, menuList = resolve_user_menus(user_id)
+    perms = frozenset(perm for menu in menuList if menu.perms for perm in _split_perms(menu.perms))
+    return [role.id for role in roleList], perms
+
+
+def get_user_perms(user_id):
+    """用户的权限标识集合，优先读取缓存"""
+    permCache = get_menu_cache(PERMS_NAMESPACE)
+    perms = permCache.get(user_id)
+    if perms is None:
+        generation = permCache.generation()
+        roleIds, perms = compile_user_perms(user_id)
+        permCache.set(user_id, roleIds, perms, generation)
+    return perms
+
+
+def check_perms(perms, required, any_perm=False):
+    if ALL_PERMISSIONS in perms:
+        return True
+    if any_perm:
+        return any(perm in perms for perm in required)
+    return all(perm in perms for perm in required)
+
+
+def has_perms(user_id, *required, any_perm=False):
+    """
+    :param any_perm: True表示拥有任一权限即可，默认需全部拥有
+    """
+    return check_perms(get_user_perms(user_id), required, any_perm)
+
+
+def _request_user_id(request):
+    # JwtAuthenticationMiddleware 解析的用户id；DRF的Request会把属性访问转给原始HttpRequest
+    userId = getattr(request, 'jwt_user_id', None)
+    if userId is None and isinstance(getattr(request, 'auth', None), dict):
+        userId = request.auth.get(api_settings.USER_ID_CLAIM)
+    return userId
+
+
+def _denied(userId):
+    if userId is None:
+        return JsonResponse({'code': 401, 'info': '请先登录！'}, status=401)
+    return JsonResponse({'code': 403, 'info': '没有操作权限！'}, status=403)
+
+
+def require_perms(*required, any_perm=False):
+    """
+    视图鉴权装饰器，可直接用于函数视图或类视图的方法（同步、异步均可）
+    用法：
+        @require_perms('system:user:add')
+        def post(self, request): ...
+    """
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def wrapper(*args, **kwargs):
+                request = next(arg for arg in args if isinstance(arg, HttpRequest))
+                userId = _request_user_id(request)
+                if userId is None or not check_perms(await sync_to_async(get_user_perms)(userId),
+                                                     required, any_perm):
+                    return _denied(userId)
+                return await view(*args, **kwargs)
+        else:
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                request = next(arg for arg in args if isinstance(arg, HttpRequest))
+                userId = _request_user_id(request)
+                if userId is None or not has_perms(userId, *required, any_perm=any_perm):
+                    return _denied(userId)
+                return view(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def require_roles(*codes):
+    """
+    按角色编码鉴权：角色编码由登录时写入Token的roles声明提供（见 user/tokens.py），不访问数据库
+    用法：
+        @require_roles('admin')
+        def post(self, request): ...
+    """
+
+    def allowed(request):
+        roles = (getattr(request, 'jwt_claims', None) or {}).get('roles', ())
+        return any(code in roles for code in codes)
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def wrapper(*args, **kwargs):
+                request = next(arg for arg in args if isinstance(arg, HttpRequest))
+                if not allowed(request):
+                    return _denied(_request_user_id(request))
+                return await view(*args, **kwargs)
+        else:
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                request = next(arg for arg in args if isinstance(arg, HttpRequest))
+                if not allowed(request):
+                    return _denied(_request_user_id(request))
+                return view(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+class HasPerms(BasePermission):
+    """
+    DRF权限类，所需权限取视图的 required_perms 属性：
+        class UserViewSet(ViewSet):
+            permission_classes = [HasPerms]
+            required_perms = ('system:user:list',)
+    或 permission_classes = [HasPerms.of('system:user:list')]
+    """
+    message = '没有操作权限！'
+    required_perms = ()
+    any_perm = False
+
+    @classmethod
+    def of(cls, *required, any_perm=False):
+        return type('HasPerms', (cls,), {'required_perms': required, 'any_perm': any_perm})
+
+    def has_permission(self, request, view):
+        userId = _request_user_id(request)
+        if userId is None:
+            return False
+        required = self.required_perms or getattr(view, 'required_perms', ())
+        anyPerm = self.any_perm or getattr(view, 'any_perm', False)
+        return has_perms(userId, *required, any_perm=anyPerm)
@@ -1,5 +1,7 @@
 # menu/serializers.py（文档🔶1-409 标准序列化器）
 from rest_framework import serializers
+
+from python222.dictbuilder import DictBuilder
 from .models import SysMenu  # 导入menu应用的SysMenu模型（文档🔶1-405 模型定义）
 
 class SysMenuSerializer(serializers.ModelSerializer):
@@ -13,8 +15,29 @@ class SysMenuSerializer(serializers.ModelSerializer):
 
     # 自定义children序列化逻辑（文档🔶1-409 递归处理子菜单）
     def get_children(self, obj):
+        # 优先使用context中的parent_id -> 子菜单索引（menu/services.py build_menu_tree 生成）
+        children = self.context.get('children')
+        if children is not None:
+            return SysMenuSerializer(children.get(obj.id, []), many=True, context=self.context).data
         # 判断当前菜单是否有动态添加的children属性（文档🔶1-408 buildTreeMenu方法动态添加）
         if hasattr(obj, 'children') and obj.children:
             # 递归序列化子菜单（复用当前序列化器，避免额外定义子类）
             return SysMenuSerializer(obj.children, many=True).data
-        return []  # 无children时返回空列表，避免前端解析报错
\ No newline at end of file
+        return []  # 无children时返回空列表，避免前端解析报错
+
+
+buildMenuDict = DictBuilder(SysMenuSerializer)
+
+
+def build_menu_dicts(menus, children):
+    """
+    与 SysMenuSerializer(menus, many=True, context={'children': children}).data 输出相同，
+    不逐节点实例化序列化器
+    :param children: parent_id -> 子菜单列表的索引（build_menu_tree 生成）
+    """
+    result = []
+    for menu in menus:
+        item = buildMenuDict(menu)
+        item['children'] = build_menu_dicts(children.get(menu.id, ()), children)
+        result.append(item)
+    return result
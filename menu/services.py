@@ -0,0 +1,92 @@
+# menu/services.py（用户角色、权限菜单解析）
+from collections import defaultdict
+
+from django.db import connections, router
+
+from python222.db_router import replica_reads
+from role.models import SysRole
+from .cache import get_menu_cache
+from .models import SysMenu
+from .serializers import build_menu_dicts
+
+# 角色、菜单关联变更后的读己之写粘滞key（menu/signals.py 中标记）
+MENU_STICKY_KEY = 'menu'
+ROLE_COLUMNS = ('id', 'name', 'code')
+MENU_COLUMNS = ('id', 'name', 'icon', 'parent_id', 'order_num', 'path', 'component', 'menu_type', 'perms',
+                'create_time', 'update_time', 'remark')
+
+# 角色与菜单一次联表取回；没有菜单的角色依靠LEFT JOIN保留，菜单列为NULL
+USER_ROLE_MENU_SQL = """
+    SELECT {role_columns}, {menu_columns}
+    FROM sys_user_role ur
+    INNER JOIN sys_role r ON r.id = ur.role_id
+    LEFT JOIN sys_role_menu rm ON rm.role_id = r.id
+    LEFT JOIN sys_menu m ON m.id = rm.menu_id
+    WHERE ur.user_id = %s
+    ORDER BY COALESCE(m.order_num, 999), m.id, r.id
+""".format(
+    role_columns=', '.join(f'r.{column}' for column in ROLE_COLUMNS),
+    menu_columns=', '.join(f'm.{column}' for column in MENU_COLUMNS),
+)
+
+
+def resolve_user_menus(user_id):
+    """
+    查询用户的角色及去重后的菜单（含按钮）
+    :return: (角色列表, 按order_num排序的菜单列表)
+    """
+    db = router.db_for_read(SysMenu)
+    with connections[db].cursor() as cursor:
+        cursor.execute(USER_ROLE_MENU_SQL, [user_id])
+        rows = cursor.fetchall()
+
+    roleCount = len(ROLE_COLUMNS)
+    roles = {}
+    menus = {}
+    for row in rows:
+        roleId = row[0]
+        if roleId not in roles:
+            roles[roleId] = SysRole.from_db(db, ROLE_COLUMNS, row[:roleCount])
+        menuId = row[roleCount]
+        if menuId is not None and menuId not in menus:
+            menus[menuId] = SysMenu.from_db(db, MENU_COLUMNS, row[roleCount:])
+    roleList = sorted(roles.values(), key=lambda role: role.id)
+    return roleList, list(menus.values())
+
+
+def build_menu_tree(menuList):
+    """
+    线性时间构建菜单树，不修改菜单对象
+    :param menuList: 已排序的菜单列表，子菜单按原顺序挂载
+    :return: (顶级菜单列表, parent_id -> 子菜单列表的索引)
+    """
+    children = defaultdict(list)
+    roots = []
+    for menu in menuList:
+        if menu.parent_id == 0:
+            roots.append(menu)
+        else:
+            children[menu.parent_id].append(menu)
+    return roots, children
+
+
+def get_user_menu_payload(user_id):
+    """
+    登录接口所需的角色名称串与序列化后的菜单树，优先读取缓存
+    :return: (roles, menuList)
+    """
+    menuCache = get_menu_cache()
+    cached = menuCache.get(user_id)
+    if cached is not None:
+        return cached
+
+    # 菜单查询走只读副本；关联刚变更时走主库，避免把副本上的旧数据写入新版本缓存
+    generation = menuCache.generation()
+    with replica_reads(MENU_STICKY_KEY):
+        roleList, menuList = resolve_user_menus(user_id)
+    roots, children = build_menu_tree(menuList)
+    serializerMenus = build_menu_dicts(roots, children)
+    roles = ",".join([role.name for role in roleList])
+    payload = (roles, serializerMenus)
+    menuCache.set(user_id, [role.id for role in roleList], payload, generation)
+    return payload
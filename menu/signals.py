@@ -0,0 +1,85 @@
+# menu/signals.py（角色、菜单关联变化时使菜单缓存失效）
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from python222.db_router import mark_written
+from role.models import SysRole, SysUserRole
+from .cache import get_menu_cache
+from . import closure
+from .models import SysMenu, SysRoleMenu
+from .services import MENU_STICKY_KEY
+
+
+# 版本号在事务提交后再递增，避免其它请求在提交前按旧数据重建缓存并写入新版本号；
+# 同时开启菜单查询的主库粘滞期，避免从复制延迟的副本上按旧数据重建缓存
+def _on_commit(invalidate):
+    def callback():
+        mark_written(MENU_STICKY_KEY)
+        invalidate()
+    transaction.on_commit(callback)
+
+
+@receiver([post_save, post_delete], sender=SysUserRole)
+def invalidate_user_menus(sender, instance, **kwargs):
+    user_id = instance.user_id
+    _on_commit(lambda: get_menu_cache().invalidate_user(user_id))
+
+
+@receiver([post_save, post_delete], sender=SysRoleMenu)
+def invalidate_role_menus(sender, instance, **kwargs):
+    role_id = instance.role_id
+    _on_commit(lambda: get_menu_cache().invalidate_roles([role_id]))
+
+
+@receiver(post_save, sender=SysRole)
+def invalidate_role(sender, instance, **kwargs):
+    # 缓存中包含角色名称，角色修改同样需要失效
+    role_id = instance.id
+    _on_commit(lambda: get_menu_cache().invalidate_roles([role_id]))
+
+
+@receiver([post_save, post_delete], sender=SysMenu)
+def invalidate_menu(sender, instance, **kwargs):
+    # 只失效引用了该菜单的角色（删除菜单前关联已被移除，此时结果为空）
+    role_ids = list(SysRoleMenu.objects.filter(menu_id=instance.id).values_list('role_id', flat=True))
+    if role_ids:
+        _on_commit(lambda: get_menu_cache().invalidate_roles(role_ids))
+
+
+# ---------------------------- 菜单闭包表维护（menu/closure.py） ----------------------------
+# SysMenu.save()/delete() 已包在事务中，闭包表与菜单同时提交或回滚
+
+# parent_id可为NULL，查询结果为None时不能再用None表示"未读取原父菜单"
+_NOT_LOADED = object()
+
+
+@receiver(pre_save, sender=SysMenu)
+def remember_parent(sender, instance, raw=False, using=None, update_fields=None, **kwargs):
+    instance._closure_old_parent = _NOT_LOADED
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    if update_fields is not None and 'parent_id' not in update_fields:
+        return
+    rows = list(SysMenu.objects.using(using).filter(pk=instance.pk).values_list('parent_id', flat=True))
+    if rows:
+        instance._closure_old_parent = rows[0]
+
+
+@receiver(post_save, sender=SysMenu)
+def maintain_closure(sender, instance, created, raw=False, using=None, **kwargs):
+    if raw:
+        return
+    if created:
+        closure.insert_node(instance, using)
+        return
+    oldParent = getattr(instance, '_closure_old_parent', _NOT_LOADED)
+    # parent_id为NULL与为0都表示顶级菜单
+    if oldParent is not _NOT_LOADED and (oldParent or 0) != (instance.parent_id or 0):
+        closure.move_subtree(instance, using)
+
+
+@receiver(pre_delete, sender=SysMenu)
+def detach_closure(sender, instance, using=None, **kwargs):
+    # 自身相关的行随外键级联删除；子菜单的parent_id指向已删除菜单，按顶级菜单处理
+    closure.detach_subtree(instance.id, using)
@@ -1,3 +1,208 @@
-from django.test import TestCase
+import json
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.test import RequestFactory, TestCase, override_settings
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from python222.fastjson import JsonResponse
+
+from role.models import SysRole, SysUserRole
+from user.models import SysUser
+from . import closure
+from .cache import get_menu_cache
+from .models import SysMenu, SysMenuClosure, SysRoleMenu
+from .permissions import HasPerms, get_user_perms, has_perms, require_perms, require_roles
+from .serializers import SysMenuSerializer, build_menu_dicts
+from .services import build_menu_tree, resolve_user_menus
+
+
+class MenuServiceTest(TestCase):
+    def setUp(self):
+        self.user = SysUser.objects.create(username='admin', password='x')
+        self.role1 = SysRole.objects.create(name='管理员', code='admin')
+        self.role2 = SysRole.objects.create(name='普通角色', code='common')
+        self.role3 = SysRole.objects.create(name='空角色', code='empty')
+        for role in (self.role1, self.role2, self.role3):
+            SysUserRole.objects.create(user=self.user, role=role)
+        self.root = SysMenu.objects.create(name='系统管理', parent_id=0, order_num=2)
+        self.home = SysMenu.objects.create(name='首页', parent_id=0, order_num=1)
+        self.child = SysMenu.objects.create(name='用户管理', parent_id=self.root.id, order_num=1)
+        self.button = SysMenu.objects.create(name='用户新增', parent_id=self.child.id, menu_type='F',
+                                             perms='system:user:add')
+        for menu in (self.root, self.home, self.child, self.button):
+            SysRoleMenu.objects.create(role=self.role1, menu=menu)
+        # 两个角色共享的菜单只应返回一次
+        SysRoleMenu.objects.create(role=self.role2, menu=self.child)
+
+    def test_resolve_user_menus_single_query(self):
+        with self.assertNumQueries(1):
+            roleList, menuList = resolve_user_menus(self.user.id)
+        self.assertEqual([role.id for role in roleList], [self.role1.id, self.role2.id, self.role3.id])
+        self.assertEqual(len(menuList), 4)
+        self.assertEqual(menuList[0].id, self.home.id)
+
+    def test_build_menu_tree(self):
+        _, menuList = resolve_user_menus(self.user.id)
+        roots, children = build_menu_tree(menuList)
+        self.assertEqual([menu.id for menu in roots], [self.home.id, self.root.id])
+        self.assertEqual([menu.id for menu in children[self.root.id]], [self.child.id])
+        self.assertEqual([menu.id for menu in children[self.child.id]], [self.button.id])
+        self.assertFalse(any(hasattr(menu, 'children') for menu in menuList))
+
+    def test_build_menu_dicts_matches_serializer(self):
+        _, menuList = resolve_user_menus(self.user.id)
+        roots, children = build_menu_tree(menuList)
+        expected = SysMenuSerializer(roots, many=True, context={'children': children}).data
+        self.assertEqual(json.dumps(build_menu_dicts(roots, children)), json.dumps(expected))
+
+    def test_user_perms_cached_and_invalidated(self):
+        self.assertEqual(get_user_perms(self.user.id), frozenset({'system:user:add'}))
+        with self.assertNumQueries(0):
+            self.assertTrue(has_perms(self.user.id, 'system:user:add'))
+            self.assertFalse(has_perms(self.user.id, 'system:user:add', 'system:user:delete'))
+        delete = SysMenu.objects.create(name='用户删除', parent_id=self.child.id, menu_type='F',
+                                        perms='system:user:delete')
+        with self.captureOnCommitCallbacks(execute=True):
+            SysRoleMenu.objects.create(role=self.role2, menu=delete)
+        self.assertTrue(has_perms(self.user.id, 'system:user:add', 'system:user:delete'))
+
+    def test_stale_read_not_cached(self):
+        # 查库后、写缓存前另一请求提交了变更并递增版本号：查到的旧数据不能写入缓存
+        def concurrent_change(user_id):
+            result = resolve_user_menus(user_id)
+            get_menu_cache().invalidate_roles([self.role1.id])
+            return result
+
+        with mock.patch('menu.permissions.resolve_user_menus', concurrent_change):
+            get_user_perms(self.user.id)
+        self.assertIsNone(get_menu_cache('perms').get(self.user.id))
+        get_user_perms(self.user.id)
+        self.assertIsNotNone(get_menu_cache('perms').get(self.user.id))
+
+    def closure_rows(self):
+        return set(SysMenuClosure.objects.values_list('ancestor_id', 'descendant_id', 'depth'))
+
+    def test_move_null_parent_menu(self):
+        orphan = SysMenu.objects.create(name='日志管理', parent_id=None)
+        leaf = SysMenu.objects.create(name='操作日志', parent_id=orphan.id)
+        orphan.parent_id = self.root.id
+        orphan.save()
+        self.assertEqual(closure.descendant_ids([self.root.id], include_self=False),
+                         {self.child.id, self.button.id, orphan.id, leaf.id})
+        self.assertEqual([menu.id for menu in closure.ancestors(leaf.id)], [self.root.id, orphan.id])
+        # NULL与0都是顶级，二者之间的修改不改变层级
+        orphan.parent_id = None
+        orphan.save()
+        orphan.parent_id = 0
+        orphan.save()
+        incremental = self.closure_rows()
+        closure.rebuild()
+        self.assertEqual(self.closure_rows(), incremental)
+
+    def test_menu_closure(self):
+        self.assertEqual([menu.id for menu in closure.subtree(self.root.id)],
+                         [self.root.id, self.child.id, self.button.id])
+        self.assertEqual([(menu.id, menu.depth) for menu in closure.ancestors(self.button.id)],
+                         [(self.root.id, 2), (self.child.id, 1)])
+        # 移动：用户管理挂到首页下
+        self.child.parent_id = self.home.id
+        self.child.save()
+        self.assertEqual([menu.id for menu in closure.subtree(self.root.id)], [self.root.id])
+        self.assertEqual(closure.descendant_ids([self.home.id], include_self=False), {self.child.id, self.button.id})
+        incremental = self.closure_rows()
+        closure.rebuild()
+        self.assertEqual(self.closure_rows(), incremental)
+        with self.assertRaises(ValueError):
+            self.home.parent_id = self.button.id
+            self.home.save()
+        # 删除：子菜单成为顶级
+        SysRoleMenu.objects.filter(menu=self.child).delete()
+        self.child.delete()
+        self.assertEqual([menu.id for menu in closure.ancestors(self.button.id)], [])
+
+
+@require_perms('system:user:add')
+def add_user(request):
+    return JsonResponse({'code': 200})
+
+
+@require_perms('system:user:add', 'system:user:delete', any_perm=True)
+async def edit_user(request):
+    return JsonResponse({'code': 200})
+
+
+@require_roles('admin')
+def admin_only(request):
+    return JsonResponse({'code': 200})
+
+
+@require_roles('admin')
+async def admin_only_async(request):
+    return JsonResponse({'code': 200})
+
+
+class AddUserAPI(APIView):
+    authentication_classes = []  # 由JwtAuthenticationMiddleware认证，这里只测权限类
+    permission_classes = [HasPerms.of('system:user:add')]
+
+    def get(self, request):
+        return Response({'code': 200})
+
+
+class PermissionCheckTest(TestCase):
+    def setUp(self):
+        self.enterContext(override_settings(MENU_CACHE={'BACKEND': 'locmem'}))  # 每个用例使用新的缓存
+        self.editor = SysUser.objects.create(username='editor', password='x')
+        self.viewer = SysUser.objects.create(username='viewer', password='x')
+        self.admin = SysUser.objects.create(username='root', password='x')
+        editorRole = SysRole.objects.create(name='编辑', code='editor')
+        adminRole = SysRole.objects.create(name='超级管理员', code='admin')
+        SysUserRole.objects.create(user=self.editor, role=editorRole)
+        SysUserRole.objects.create(user=self.admin, role=adminRole)
+        add = SysMenu.objects.create(name='用户新增', parent_id=0, menu_type='F', perms='system:user:add')
+        everything = SysMenu.objects.create(name='全部权限', parent_id=0, menu_type='F', perms='*:*:*')
+        SysRoleMenu.objects.create(role=editorRole, menu=add)
+        SysRoleMenu.objects.create(role=adminRole, menu=everything)
+
+    def request(self, user=None, roles=None):
+        request = RequestFactory().get('/x')
+        if user is not None:
+            request.jwt_user_id = str(user.id)  # 与Token中一致，用户id为字符串
+            request.jwt_claims = {'user_id': str(user.id), 'roles': roles or []}
+        return request
+
+    def status(self, view, *args):
+        if iscoroutinefunction(view):
+            return async_to_sync(view)(self.request(*args)).status_code
+        return view(self.request(*args)).status_code
+
+    def test_require_perms(self):
+        for view in (add_user, edit_user):
+            self.assertEqual(self.status(view), 401)
+            self.assertEqual(self.status(view, self.viewer), 403)
+            self.assertEqual(self.status(view, self.editor), 200)
+            self.assertEqual(self.status(view, self.admin), 200)  # '*:*:*'拥有全部权限
+
+    def test_cached_check_without_queries(self):
+        self.assertEqual(self.status(add_user, self.editor), 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.status(add_user, self.editor), 200)
+            self.assertEqual(self.status(edit_user, self.editor), 200)
+
+    def test_require_roles(self):
+        for view in (admin_only, admin_only_async):
+            with self.assertNumQueries(0):
+                self.assertEqual(self.status(view), 401)
+                self.assertEqual(self.status(view, self.editor, ['editor']), 403)
+                self.assertEqual(self.status(view, self.admin, ['admin']), 200)
+
+    def test_drf_permission_class(self):
+        view = AddUserAPI.as_view()
+        self.assertEqual(view(self.request()).status_code, 403)
+        self.assertEqual(view(self.request(self.viewer)).status_code, 403)
+        self.assertEqual(view(self.request(self.editor)).status_code, 200)
+        self.assertEqual(view(self.request(self.admin)).status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(view(self.request(self.editor)).status_code, 200)
@@ -0,0 +1,125 @@
+# python222/db_router.py（只读副本路由）
+# 只有显式标记为只读的代码（read_only_view 装饰的视图、replica_reads 上下文）才把读请求发往副本，
+# 其余读写一律走 default，避免普通视图"写后立即读"读到副本上的旧数据。
+# 读己之写：SaveView/StatusView 等写接口返回后，在 STICKY_SECONDS 内该用户的只读请求仍走主库；
+# 粘滞标记存放在Django缓存中，多进程部署时 CACHE_ALIAS 应指向共享缓存（Redis/Memcached）。
+# 配置示例：
+#     DATABASES['replica'] = {...}
+#     DATABASE_REPLICAS = ['replica']
+#     DATABASE_ROUTERS = ['python222.db_router.ReadReplicaRouter']
+import contextvars
+import functools
+import random
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpRequest
+
+DEFAULT_READ_REPLICA = {
+    'STICKY_SECONDS': 5,  # 写入后仍从主库读取的时长，应大于副本的复制延迟
+    'CACHE_ALIAS': 'default',  # 保存粘滞标记的缓存
+}
+STICKY_KEY_PREFIX = 'db_sticky:'
+
+# 当前上下文使用的副本别名，None表示走主库；contextvar会随 sync_to_async 传递到执行ORM的线程
+_replica = contextvars.ContextVar('python222_read_replica', default=None)
+
+
+def get_replica_config():
+    return {**DEFAULT_READ_REPLICA, **getattr(settings, 'READ_REPLICA', {})}
+
+
+def get_replicas():
+    return [alias for alias in getattr(settings, 'DATABASE_REPLICAS', ()) if alias in settings.DATABASES]
+
+
+def _sticky_cache():
+    return caches[get_replica_config()['CACHE_ALIAS']]
+
+
+def mark_written(key):
+    """记录一次写入：STICKY_SECONDS 内以该key声明的只读请求改走主库"""
+    if key is None or not get_replicas():
+        return
+    _sticky_cache().set(f'{STICKY_KEY_PREFIX}{key}', 1, get_replica_config()['STICKY_SECONDS'])
+
+
+def is_sticky(key):
+    return key is not None and _sticky_cache().get(f'{STICKY_KEY_PREFIX}{key}') is not None
+
+
+@contextmanager
+def replica_reads(*stickyKeys):
+    """
+    上下文内的读请求发往副本（同一上下文固定使用一个副本）
+    :param stickyKeys: 任一key处于写后粘滞期内时仍走主库
+    """
+    replicas = get_replicas()
+    alias = None
+    if replicas and not any(is_sticky(key) for key in stickyKeys):
+        alias = random.choice(replicas)
+    token = _replica.set(alias)
+    try:
+        yield alias
+    finally:
+        _replica.reset(token)
+
+
+def _user_key(args):
+    request = next((arg for arg in args if isinstance(arg, HttpRequest)), None)
+    userId = getattr(request, 'jwt_user_id', None)  # JwtAuthenticationMiddleware 解析的当前用户
+    return f'user:{userId}' if userId is not None else None
+
+
+def read_only_view(view):
+    """
+    只读视图装饰器，可直接用于函数视图或类视图的方法（同步、异步均可）
+    当前用户处于写后粘滞期内时走主库
+    """
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def wrapper(*args, **kwargs):
+            with replica_reads(_user_key(args)):
+                return await view(*args, **kwargs)
+    else:
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            with replica_reads(_user_key(args)):
+                return view(*args, **kwargs)
+    return wrapper
+
+
+def sticky_after_write(view):
+    """写视图装饰器：请求完成后为当前用户开启读己之写的粘滞期"""
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def wrapper(*args, **kwargs):
+            try:
+                return await view(*args, **kwargs)
+            finally:
+                mark_written(_user_key(args))
+    else:
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                return view(*args, **kwargs)
+            finally:
+                mark_written(_user_key(args))
+    return wrapper
+
+
+class ReadReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _replica.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # 副本与主库数据相同，允许跨别名关联
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
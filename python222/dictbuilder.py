@@ -0,0 +1,72 @@
+# python222/dictbuilder.py（按字段列表预编译的模型对象 -> 字典转换器）
+# DRF的ModelSerializer每实例化一次都要重新内省模型字段、构造Field对象，菜单树每个节点一个序列化器，
+# 登录时大部分耗时都花在这里。DictBuilder只在首次使用时从序列化器取一次字段列表与转换方式，
+# 之后每个对象只做取属性与必要的类型转换，输出与 Serializer(obj).data 相同。
+from operator import attrgetter
+
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+# 模型取出的值已是输出类型，直接返回（DRF中为 int(value)/str(value)/bool(value)）
+PASSTHROUGH_FIELDS = (serializers.IntegerField, serializers.CharField, serializers.BooleanField,
+                      serializers.FloatField, serializers.PrimaryKeyRelatedField)
+
+
+def _date_isoformat(value):
+    return value if isinstance(value, str) else value.isoformat()
+
+
+def _converter(field):
+    """返回值转换函数，None表示原样输出"""
+    if isinstance(field, (serializers.ChoiceField, serializers.DateTimeField)):
+        return field.to_representation
+    if isinstance(field, PASSTHROUGH_FIELDS):
+        return None
+    if isinstance(field, serializers.DateField) and \
+            getattr(field, 'format', api_settings.DATE_FORMAT).lower() == ISO_8601:
+        return _date_isoformat
+    return field.to_representation
+
+
+class DictBuilder:
+    """
+    用法：
+        buildUser = DictBuilder(SysUserSerializer)
+        buildUser(user)  # 等价于 SysUserSerializer(user).data
+    SerializerMethodField 与只写字段不输出，由调用方自行补充（如菜单的children）
+    """
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        self._compiled = None
+
+    def _compile(self):
+        # 延迟到首次调用：模块导入时模型关系可能尚未加载完成
+        names, attnames, converters = [], [], []
+        for name, field in self.serializer_class().fields.items():
+            if field.write_only or isinstance(field, serializers.SerializerMethodField):
+                continue
+            modelField = self.serializer_class.Meta.model._meta.get_field(field.source)
+            names.append(name)
+            attnames.append(modelField.attname)
+            converters.append(_converter(field))
+        fields = tuple(zip(names, converters))
+        if len(attnames) == 1:
+            getter = attrgetter(attnames[0])
+            self._compiled = fields, lambda obj: (getter(obj),)
+        else:
+            self._compiled = fields, attrgetter(*attnames)
+        return self._compiled
+
+    @staticmethod
+    def _build(fields, values):
+        return {name: value if convert is None or value is None else convert(value)
+                for (name, convert), value in zip(fields, values)}
+
+    def __call__(self, obj):
+        fields, getter = self._compiled or self._compile()
+        return self._build(fields, getter(obj))
+
+    def many(self, objs):
+        fields, getter = self._compiled or self._compile()
+        return [self._build(fields, getter(obj)) for obj in objs]
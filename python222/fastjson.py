@@ -0,0 +1,80 @@
+# python222/fastjson.py（项目统一的JSON编解码与响应类）
+# 安装了orjson时使用orjson（C实现，直接输出UTF-8字节，原生支持date/datetime/UUID），否则退回标准库json。
+# 可通过 settings.JSON_BACKEND = 'orjson' / 'json' 强制指定；orjson无法处理的类型（Decimal、惰性翻译字符串等）
+# 交给 DjangoJSONEncoder.default 转换，两种后端输出的数据一致。
+# 用法：
+#     from python222.fastjson import JsonResponse, JSONDecodeError, parse_json
+#     data = parse_json(request.body)  # 直接解析bytes，无需先decode
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.signals import setting_changed
+from django.http import HttpResponse, JsonResponse as DjangoJsonResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# orjson.JSONDecodeError 是 json.JSONDecodeError 的子类，两种后端抛出的异常都能被捕获
+JSONDecodeError = json.JSONDecodeError
+
+_djangoDefault = DjangoJSONEncoder().default
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        backend = getattr(settings, 'JSON_BACKEND', None) or ('orjson' if orjson is not None else 'json')
+        if backend == 'orjson' and orjson is None:
+            raise ImportError("JSON_BACKEND = 'orjson' 需要先安装 orjson")
+        _backend = backend
+    return _backend
+
+
+def _reset(**kwargs):
+    global _backend
+    if kwargs['setting'] == 'JSON_BACKEND':
+        _backend = None
+
+
+setting_changed.connect(_reset)
+
+
+def dumps(obj):
+    """序列化为UTF-8字节"""
+    if get_backend() == 'orjson':
+        # OPT_UTC_Z：UTC时间输出为 "...Z"，与DjangoJSONEncoder一致
+        return orjson.dumps(obj, default=_djangoDefault, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z)
+    return json.dumps(obj, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def loads(data):
+    """解析bytes或str，格式错误时抛出 JSONDecodeError"""
+    if get_backend() == 'orjson':
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def parse_json(body):
+    """解析请求体（request.body），空请求体视为格式错误"""
+    return loads(body)
+
+
+class JsonResponse(DjangoJsonResponse):
+    """
+    与 django.http.JsonResponse 参数相同；未指定 encoder / json_dumps_params 时走快速编码，
+    指定时沿用Django原有实现
+    """
+
+    def __init__(self, data, encoder=None, safe=True, json_dumps_params=None, **kwargs):
+        if encoder is not None or json_dumps_params is not None:
+            super().__init__(data, encoder=encoder or DjangoJSONEncoder, safe=safe,
+                             json_dumps_params=json_dumps_params, **kwargs)
+            return
+        if safe and not isinstance(data, dict):
+            raise TypeError('In order to allow non-dict objects to be serialized set the safe parameter to False.')
+        kwargs.setdefault('content_type', 'application/json')
+        HttpResponse.__init__(self, content=dumps(data), **kwargs)
@@ -0,0 +1,168 @@
+# python222/media.py（媒体文件下载视图）
+# 替代 django.views.static.serve：支持强ETag与条件请求(304)、单段Range请求(206)、长期缓存头，
+# 并可配置为只返回 X-Sendfile / X-Accel-Redirect 头，由前置代理(Apache/Nginx)直接发送文件。
+# 只有按内容哈希命名的文件（见 user/storage.py）内容永不改变，使用哈希作ETag并按不可变资源长期缓存；
+# 缩略图（可被 generate_avatar_variants --force 原地重写）与未分片的旧文件短期缓存并按ETag重新验证。
+import mimetypes
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+
+DEFAULT_MEDIA_SERVING = {
+    'CACHE_CONTROL': 'public, max-age=31536000, immutable',  # 按内容哈希命名的文件
+    'MUTABLE_CACHE_CONTROL': 'public, max-age=300, must-revalidate',  # 其它文件
+    'SENDFILE': None,  # None：由Django发送；'x-sendfile'：Apache/lighttpd；'x-accel-redirect'：Nginx
+    'ACCEL_REDIRECT_PREFIX': '/protected-media/',  # Nginx中对应 internal location 的前缀
+    'CHUNK_SIZE': 64 * 1024,
+}
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+# ".../ab/cd/<sha256>.<扩展名>"：文件名为内容的sha256，上级目录为哈希前缀
+CONTENT_ADDRESSED_RE = re.compile(r'(?:^|/)([0-9a-f]{2})/([0-9a-f]{2})/([0-9a-f]{64})\.[A-Za-z0-9]+$')
+
+
+def get_media_config():
+    return {**DEFAULT_MEDIA_SERVING, **getattr(settings, 'MEDIA_SERVING', {})}
+
+
+def content_digest(path):
+    """按内容哈希命名的文件返回其sha256，否则返回None"""
+    match = CONTENT_ADDRESSED_RE.search(path.replace('\\', '/'))
+    if match is None:
+        return None
+    first, second, digest = match.groups()
+    return digest if digest.startswith(first + second) else None
+
+
+def _etag(stat, digest=None):
+    if digest is not None:
+        return f'"{digest}"'
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def _not_modified(request, etag, mtime):
+    ifNoneMatch = request.META.get('HTTP_IF_NONE_MATCH')
+    if ifNoneMatch is not None:
+        # If-None-Match 优先于 If-Modified-Since（RFC 9110）
+        tags = [tag.strip() for tag in ifNoneMatch.split(',')]
+        return '*' in tags or etag in tags or f'W/{etag}' in tags
+    ifModifiedSince = request.META.get('HTTP_IF_MODIFIED_SINCE')
+    if ifModifiedSince:
+        try:
+            return int(mtime) <= parsedate_to_datetime(ifModifiedSince).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _parse_range(header, size):
+    """
+    解析单段Range
+    :return: (start, end) 闭区间；None表示忽略Range返回完整文件；(-1, -1)表示范围无法满足
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None  # 多段或格式不支持时按规范可直接返回完整内容
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # bytes=-N：最后N个字节
+        length = int(last)
+        if length == 0:
+            return -1, -1
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return -1, -1
+    return start, end
+
+
+def _if_range_matches(request, etag, lastModified):
+    ifRange = request.META.get('HTTP_IF_RANGE')
+    return ifRange is None or ifRange.strip() in (etag, lastModified)
+
+
+def _iter_range(path, start, length, chunkSize):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            data = f.read(min(chunkSize, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+def serve_media(request, path, document_root=None):
+    conf = get_media_config()
+    root = document_root or settings.MEDIA_ROOT
+    try:
+        fullPath = safe_join(root, path)
+    except SuspiciousFileOperation:  # 路径越出媒体目录
+        raise Http404('文件不存在')
+    try:
+        stat = os.stat(fullPath)
+    except OSError:
+        raise Http404('文件不存在')
+    if not os.path.isfile(fullPath):
+        raise Http404('文件不存在')
+
+    digest = content_digest(path)
+    etag = _etag(stat, digest)
+    lastModified = formatdate(stat.st_mtime, usegmt=True)
+    headers = {'ETag': etag, 'Last-Modified': lastModified,
+               'Cache-Control': conf['CACHE_CONTROL'] if digest is not None else conf['MUTABLE_CACHE_CONTROL']}
+
+    if _not_modified(request, etag, stat.st_mtime):
+        response = HttpResponseNotModified()
+        for key, value in headers.items():
+            response[key] = value
+        return response
+
+    contentType, encoding = mimetypes.guess_type(fullPath)
+    contentType = contentType or 'application/octet-stream'
+
+    # 交给前置代理发送文件，Range与条件请求同样由代理处理
+    if conf['SENDFILE']:
+        response = HttpResponse(content_type=contentType)
+        if conf['SENDFILE'] == 'x-accel-redirect':
+            relative = os.path.relpath(fullPath, root).replace(os.sep, '/')
+            response['X-Accel-Redirect'] = conf['ACCEL_REDIRECT_PREFIX'].rstrip('/') + '/' + relative
+        else:
+            response['X-Sendfile'] = fullPath
+        for key, value in headers.items():
+            response[key] = value
+        return response
+
+    byteRange = None
+    rangeHeader = request.META.get('HTTP_RANGE')
+    if rangeHeader and request.method in ('GET', 'HEAD') and _if_range_matches(request, etag, lastModified):
+        byteRange = _parse_range(rangeHeader, stat.st_size)
+
+    if byteRange == (-1, -1):
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{stat.st_size}'
+        return response
+
+    if byteRange is not None:
+        start, end = byteRange
+        length = end - start + 1
+        response = StreamingHttpResponse(_iter_range(fullPath, start, length, conf['CHUNK_SIZE']),
+                                         status=206, content_type=contentType)
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        response['Content-Length'] = str(length)
+    else:
+        response = FileResponse(open(fullPath, 'rb'), content_type=contentType)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Accept-Ranges'] = 'bytes'
+    for key, value in headers.items():
+        response[key] = value
+    return response
@@ -0,0 +1,412 @@
+# python222/metrics.py（接口指标采集中间件与Prometheus文本格式输出）
+# 按URL名称统计请求耗时直方图、状态码、SQL条数与耗时、响应大小。
+# 多进程部署（gunicorn/uwsgi多worker）时不依赖外部服务：每个进程定期把自己的累计值写入
+# METRICS['DIR'] 下的 metrics_<pid>.json，/metrics 请求时汇总目录中所有文件后输出。
+# 进程退出后文件保留，计数保持单调递增；为避免重启后文件无限增多，每个进程启动时把已退出进程的文件
+# 合并进 metrics_archive.json 后删除。默认目录名带上项目路径与配置模块的摘要，同一台机器上的不同部署互不汇总；
+# 自行指定DIR时每个部署需使用独立目录，且目录只能在本机（判断进程是否退出依赖本机pid）。
+import atexit
+import contextvars
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from django.urls import Resolver404, resolve
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover  非POSIX系统不合并旧文件
+    fcntl = None
+
+DEFAULT_METRICS = {
+    'ENABLED': True,
+    'PATH': '/metrics',  # None表示不提供指标接口（仍然采集）
+    'ALLOWED_IPS': None,  # 允许访问指标接口的来源IP列表，None表示不限制
+    'DIR': None,  # 多进程汇总目录，默认取环境变量 PROMETHEUS_MULTIPROC_DIR 或系统临时目录下按部署区分的子目录
+    'FLUSH_INTERVAL': 5,  # 进程写出累计值的最小间隔（秒）
+}
+# 各进程的桶边界必须一致，否则无法汇总
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+HISTOGRAMS = {
+    'http_request_duration_seconds': ('请求处理耗时（秒）', LATENCY_BUCKETS),
+    'http_request_db_queries': ('单个请求执行的SQL条数', QUERY_COUNT_BUCKETS),
+    'http_response_size_bytes': ('响应体大小（字节，流式响应不统计）', SIZE_BUCKETS),
+}
+UNRESOLVED = '<unresolved>'
+KEY_SEPARATOR = '\x1f'
+ARCHIVE_FILE = 'metrics_archive.json'
+LOCK_FILE = '.compact.lock'
+
+# 其它模块登记的附加指标（如 user/hashing.py 的密码哈希统计）：name -> (说明, 类型, 采集函数)
+# 采集函数返回本进程的累计样本 [(后缀, 标签字典, 值), ...]，各进程的同名样本相加后输出
+_collectors = {}
+
+
+def register_collector(name, helpText, kind, collect):
+    """
+    :param kind: counter 或 histogram（histogram的_bucket样本需为累计值）
+    """
+    _collectors[name] = (helpText, kind, collect)
+
+
+def get_metrics_config():
+    conf = {**DEFAULT_METRICS, **getattr(settings, 'METRICS', {})}
+    if not conf['DIR']:
+        # 目录名带上项目路径与配置模块，避免同一台机器上的多个部署（如生产与压测）共用目录、互相累加
+        deployment = f"{getattr(settings, 'BASE_DIR', '')}:{settings.SETTINGS_MODULE}"
+        deploymentKey = hashlib.md5(deployment.encode()).hexdigest()[:8]
+        conf['DIR'] = os.environ.get('PROMETHEUS_MULTIPROC_DIR') or \
+                      os.path.join(tempfile.gettempdir(), f'python222_metrics_{deploymentKey}')
+    return conf
+
+
+# ---------------------------- SQL统计 ----------------------------
+# 当前请求的 [SQL条数, SQL耗时]；contextvar会随 sync_to_async 传递到执行ORM的线程
+_queryStats = contextvars.ContextVar('python222_query_stats', default=None)
+
+
+def _count_queries(execute, sql, params, many, context):
+    stats = _queryStats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    begin = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats[0] += 1
+        stats[1] += time.perf_counter() - begin
+
+
+def _install_wrapper(connection, **kwargs):
+    # 连接断开重连时会再次触发connection_created，避免重复添加
+    if _count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_queries)
+
+
+# ---------------------------- 进程内累计值 ----------------------------
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}  # "view␟method␟status" -> 次数
+        self.db_seconds = {}  # view -> SQL总耗时
+        self.histograms = {name: {} for name in HISTOGRAMS}  # name -> view -> [各桶计数..., sum, count]
+
+    def _observe(self, name, view, value):
+        buckets = HISTOGRAMS[name][1]
+        series = self.histograms[name].get(view)
+        if series is None:
+            series = self.histograms[name][view] = [0] * (len(buckets) + 2)
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                series[i] += 1
+                break
+        series[-2] += value
+        series[-1] += 1
+
+    def record(self, view, method, status, seconds, queries, querySeconds, size):
+        key = KEY_SEPARATOR.join((view, method, str(status)))
+        with self._lock:
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.db_seconds[view] = self.db_seconds.get(view, 0.0) + querySeconds
+            self._observe('http_request_duration_seconds', view, seconds)
+            self._observe('http_request_db_queries', view, queries)
+            if size is not None:
+                self._observe('http_response_size_bytes', view, size)
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = {
+                'requests': dict(self.requests),
+                'db_seconds': dict(self.db_seconds),
+                'histograms': {name: {view: list(series) for view, series in views.items()}
+                               for name, views in self.histograms.items()},
+            }
+        snapshot['collected'] = _collect_registered()
+        return snapshot
+
+
+def _collect_registered():
+    collected = {}
+    for name, (helpText, kind, collect) in _collectors.items():
+        try:
+            samples = collect()
+        except Exception as e:
+            print(f"采集指标 {name} 异常：{e}")
+            continue
+        collected[name] = {
+            'help': helpText,
+            'type': kind,
+            # 样本以JSON字符串为键，便于写入文件与跨进程相加
+            'samples': {json.dumps([suffix, sorted(labels.items())]): value for suffix, labels, value in samples},
+        }
+    return collected
+
+
+def merge_snapshots(snapshots):
+    merged = {'requests': {}, 'db_seconds': {}, 'histograms': {name: {} for name in HISTOGRAMS}, 'collected': {}}
+    for snapshot in snapshots:
+        for name, metric in snapshot.get('collected', {}).items():
+            target = merged['collected'].setdefault(name, {'help': metric['help'], 'type': metric['type'],
+                                                           'samples': {}})
+            for key, value in metric['samples'].items():
+                target['samples'][key] = target['samples'].get(key, 0) + value
+        for key, value in snapshot.get('requests', {}).items():
+            merged['requests'][key] = merged['requests'].get(key, 0) + value
+        for view, value in snapshot.get('db_seconds', {}).items():
+            merged['db_seconds'][view] = merged['db_seconds'].get(view, 0.0) + value
+        for name, views in snapshot.get('histograms', {}).items():
+            if name not in HISTOGRAMS:
+                continue
+            target = merged['histograms'][name]
+            for view, series in views.items():
+                if len(series) != len(HISTOGRAMS[name][1]) + 2:
+                    continue  # 桶配置不同的旧文件
+                current = target.setdefault(view, [0] * len(series))
+                for i, value in enumerate(series):
+                    current[i] += value
+    return merged
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(snapshot):
+    """输出Prometheus文本格式（version 0.0.4）"""
+    lines = ['# HELP http_requests_total 请求次数', '# TYPE http_requests_total counter']
+    for key, value in sorted(snapshot['requests'].items()):
+        view, method, status = key.split(KEY_SEPARATOR)
+        lines.append(f'http_requests_total{{view="{_escape(view)}",method="{_escape(method)}",'
+                     f'status="{status}"}} {value}')
+    lines += ['# HELP http_request_db_query_seconds_total SQL执行总耗时（秒）',
+              '# TYPE http_request_db_query_seconds_total counter']
+    for view, value in sorted(snapshot['db_seconds'].items()):
+        lines.append(f'http_request_db_query_seconds_total{{view="{_escape(view)}"}} {_number(value)}')
+    for name, (helpText, buckets) in HISTOGRAMS.items():
+        lines += [f'# HELP {name} {helpText}', f'# TYPE {name} histogram']
+        for view, series in sorted(snapshot['histograms'].get(name, {}).items()):
+            label = f'view="{_escape(view)}"'
+            cumulative = 0
+            for bound, count in zip(buckets, series):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{label},le="{_number(float(bound))}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{label},le="+Inf"}} {series[-1]}')
+            lines.append(f'{name}_sum{{{label}}} {_number(series[-2])}')
+            lines.append(f'{name}_count{{{label}}} {series[-1]}')
+    for name, metric in sorted(snapshot.get('collected', {}).items()):
+        lines += [f'# HELP {name} {metric["help"]}', f'# TYPE {name} {metric["type"]}']
+        for key, value in sorted(metric['samples'].items()):
+            suffix, labels = json.loads(key)
+            label = ','.join(f'{labelName}="{_escape(str(labelValue))}"' for labelName, labelValue in labels)
+            lines.append(f'{name}{suffix}{{{label}}} {_number(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+# ---------------------------- 多进程汇总 ----------------------------
+class MultiProcessStore:
+    def __init__(self, directory, registry, interval):
+        self.directory = directory
+        self.registry = registry
+        self.interval = interval
+        self._lastFlush = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        try:
+            self._compact()
+        except OSError as e:
+            print(f"合并旧指标文件失败：{e}")
+
+    def _path(self):
+        # fork出的worker与父进程pid不同，按当前pid取文件名
+        return os.path.join(self.directory, f'metrics_{os.getpid()}.json')
+
+    def _write(self, path, snapshot):
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp, path)
+
+    def _compact(self):
+        """
+        启动时（本进程写出第一个快照之前）把已退出进程的文件合并进归档文件后删除，返回合并的文件数
+        本进程pid对应的已有文件来自pid相同的旧进程，同样合并，避免被本进程的快照覆盖而使计数回退
+        """
+        if fcntl is None:
+            return 0
+        with open(os.path.join(self.directory, LOCK_FILE), 'w') as lockFile:
+            # 多个worker同时启动时串行合并，避免同一个文件被重复计入归档
+            fcntl.flock(lockFile, fcntl.LOCK_EX)
+            archivePath = os.path.join(self.directory, ARCHIVE_FILE)
+            snapshots, merged = [], []
+            for filename, pid in self._pid_files():
+                if pid != os.getpid() and _pid_alive(pid):
+                    continue
+                try:
+                    with open(os.path.join(self.directory, filename), encoding='utf-8') as f:
+                        snapshots.append(json.load(f))
+                except ValueError:
+                    pass  # 损坏的文件直接删除
+                merged.append(filename)
+            if not merged:
+                return 0
+            try:
+                with open(archivePath, encoding='utf-8') as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                pass
+            self._write(archivePath, merge_snapshots(snapshots))
+            for filename in merged:
+                try:
+                    os.remove(os.path.join(self.directory, filename))
+                except FileNotFoundError:
+                    pass
+            return len(merged)
+
+    def _pid_files(self):
+        for filename in os.listdir(self.directory):
+            if filename.startswith('metrics_') and filename.endswith('.json'):
+                pid = filename[len('metrics_'):-len('.json')]
+                if pid.isdigit():
+                    yield filename, int(pid)
+
+    def flush(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._lastFlush < self.interval:
+            return
+        with self._lock:
+            self._lastFlush = now
+            self._write(self._path(), self.registry.snapshot())
+
+    def collect(self):
+        self.flush(force=True)
+        snapshots = []
+        for filename in os.listdir(self.directory):
+            if not (filename.startswith('metrics_') and filename.endswith('.json')):
+                continue
+            try:
+                with open(os.path.join(self.directory, filename), encoding='utf-8') as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # 其它进程正在替换或文件损坏
+        return merge_snapshots(snapshots)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # 进程存在但属于其它用户
+        return True
+    return True
+
+
+_registry = MetricsRegistry()
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            conf = get_metrics_config()
+            _store = MultiProcessStore(conf['DIR'], _registry, conf['FLUSH_INTERVAL'])
+        return _store
+
+
+@atexit.register
+def _flush_on_exit():
+    if _store is not None:
+        try:
+            _store.flush(force=True)
+        except OSError:
+            pass
+
+
+# ---------------------------- 中间件 ----------------------------
+class MetricsMiddleware(MiddlewareMixin):
+    """
+    需放在MIDDLEWARE第一位：统计的耗时包含其它中间件（含JWT校验），指标接口也无需Token
+    """
+
+    def __init__(self, get_response=None):
+        super().__init__(get_response)
+        conf = get_metrics_config()
+        self.enabled = conf['ENABLED']
+        self.path = conf['PATH']
+        self.allowed_ips = frozenset(conf['ALLOWED_IPS']) if conf['ALLOWED_IPS'] is not None else None
+        if self.enabled:
+            connection_created.connect(_install_wrapper, dispatch_uid='python222_metrics')
+            for connection in connections.all(initialized_only=True):
+                _install_wrapper(connection)
+
+    def _metrics_response(self, request):
+        if self.allowed_ips is not None and request.META.get('REMOTE_ADDR') not in self.allowed_ips:
+            return HttpResponseForbidden()
+        return HttpResponse(render_prometheus(get_store().collect()),
+                            content_type='text/plain; version=0.0.4; charset=utf-8')
+
+    def _record(self, request, response, begin, stats):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            # 被中间件提前返回（如401）的请求尚未解析路由，补一次解析以便按接口归类
+            try:
+                match = resolve(request.path_info)
+            except Resolver404:
+                pass
+        view = match.view_name if match is not None else UNRESOLVED
+        if response.streaming:
+            size = int(response['Content-Length']) if response.has_header('Content-Length') else None
+        else:
+            size = len(response.content)
+        _registry.record(view, request.method, response.status_code, time.perf_counter() - begin,
+                         stats[0], stats[1], size)
+        get_store().flush()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):  # 异步链路（ASGI）由MiddlewareMixin切换到 __acall__
+            return self.__acall__(request)
+        if self.path and request.path == self.path:
+            return self._metrics_response(request)
+        if not self.enabled:
+            return self.get_response(request)
+        stats = [0, 0.0]
+        token = _queryStats.set(stats)
+        begin = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _queryStats.reset(token)
+        self._record(request, response, begin, stats)
+        return response
+
+    async def __acall__(self, request):
+        if self.path and request.path == self.path:
+            return self._metrics_response(request)
+        if not self.enabled:
+            return await self.get_response(request)
+        stats = [0, 0.0]
+        token = _queryStats.set(stats)
+        begin = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _queryStats.reset(token)
+        self._record(request, response, begin, stats)
+        return response
@@ -0,0 +1,101 @@
+# python222/pagination.py（游标分页：按 (id) 或 (create_time, id) 做键集翻页，避免深分页的OFFSET扫描）
+import base64
+import json
+from datetime import date
+
+from django.db.models import F, Q
+
+# 排序方式 -> 键字段（最后一个字段必须唯一，保证顺序稳定）
+ORDERINGS = {
+    'id': ('id',),
+    'create_time': ('create_time', 'id'),
+}
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(orderBy, values):
+    values = [value.isoformat() if isinstance(value, date) else value for value in values]
+    raw = json.dumps({'o': orderBy, 'k': values}, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, orderBy):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        data = json.loads(raw)
+        values = data['k']
+    except (ValueError, TypeError, KeyError) as e:
+        raise InvalidCursor('游标格式错误') from e
+    if not isinstance(values, list):
+        raise InvalidCursor('游标格式错误')
+    if data.get('o') != orderBy or len(values) != len(ORDERINGS[orderBy]):
+        raise InvalidCursor('游标与排序方式不匹配')
+    # 游标来自客户端，键值类型不对时会在查询阶段报错，这里先拦下（bool是int的子类，需排除）
+    lastId = values[-1]
+    if not isinstance(lastId, int) or isinstance(lastId, bool):
+        raise InvalidCursor('游标格式错误')
+    if orderBy == 'create_time' and values[0] is not None:
+        try:
+            values[0] = date.fromisoformat(values[0])
+        except (ValueError, TypeError) as e:
+            raise InvalidCursor('游标格式错误') from e
+    return values
+
+
+def _after(orderBy, values):
+    """构造"位于游标之后"的过滤条件"""
+    if orderBy == 'id':
+        return Q(id__gt=values[0])
+    createTime, lastId = values
+    # create_time可为空，排序时空值在前
+    if createTime is None:
+        return Q(create_time__isnull=True, id__gt=lastId) | Q(create_time__isnull=False)
+    return Q(create_time__gt=createTime) | Q(create_time=createTime, id__gt=lastId)
+
+
+def _key(row, fields):
+    if isinstance(row, dict):
+        return [row[field] for field in fields]
+    return [getattr(row, field) for field in fields]
+
+
+def _page_queryset(queryset, pageSize, cursor, orderBy):
+    if orderBy not in ORDERINGS:
+        raise InvalidCursor(f'不支持的排序方式：{orderBy}')
+    fields = ORDERINGS[orderBy]
+    if orderBy == 'create_time':
+        queryset = queryset.order_by(F('create_time').asc(nulls_first=True), 'id')
+    else:
+        queryset = queryset.order_by(*fields)
+    if cursor:
+        queryset = queryset.filter(_after(orderBy, decode_cursor(cursor, orderBy)))
+    # 多取一条用于判断是否还有下一页，不需要额外COUNT
+    return queryset[:pageSize + 1]
+
+
+def _split_page(rows, pageSize, orderBy):
+    nextCursor = None
+    if len(rows) > pageSize:
+        rows = rows[:pageSize]
+        nextCursor = encode_cursor(orderBy, _key(rows[-1], ORDERINGS[orderBy]))
+    return rows, nextCursor
+
+
+def keyset_page(queryset, pageSize, cursor=None, orderBy='id'):
+    """
+    取游标之后的一页数据
+    :param queryset: 待分页的查询集（可以是 .values() 查询集，但需包含键字段）
+    :param cursor: 上一页返回的nextCursor，为空表示第一页
+    :return: (本页数据列表, 下一页游标；没有下一页时为None)
+    """
+    rows = list(_page_queryset(queryset, pageSize, cursor, orderBy))
+    return _split_page(rows, pageSize, orderBy)
+
+
+async def akeyset_page(queryset, pageSize, cursor=None, orderBy='id'):
+    """keyset_page 的异步版本，供异步视图使用"""
+    rows = [row async for row in _page_queryset(queryset, pageSize, cursor, orderBy)]
+    return _split_page(rows, pageSize, orderBy)
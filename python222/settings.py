@@ -67,7 +67,21 @@ SIMPLE_JWT = {
 
 
 
+# 登录菜单树缓存（menu/cache.py），多进程部署且需跨进程共享时可改为 'django' 后端
+MENU_CACHE = {
+    'BACKEND': 'locmem',
+    'MAX_SIZE': 10000,
+    'TIMEOUT': 3600,
+}
+
+# JwtAuthenticationMiddleware：免Token校验的路径（精确匹配/前缀匹配）与已验签Token缓存容量
+JWT_WHITE_LIST = ['/user/login', '/user/refresh']
+JWT_WHITE_PREFIXES = ['/media']
+JWT_TOKEN_CACHE_SIZE = 10000
+
+
 MIDDLEWARE = [
+    'python222.metrics.MetricsMiddleware',  # 放在第一位：统计完整耗时，/metrics 接口无需Token
     "corsheaders.middleware.CorsMiddleware" ,
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -126,6 +140,15 @@ DATABASES = {
     }
 }
 
+# 只读副本（python222/db_router.py）：在DATABASES中增加副本连接并把别名加入DATABASE_REPLICAS，
+# 查询、详情等只读接口即从副本读取；写接口之后STICKY_SECONDS秒内该用户仍读主库
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['python222.db_router.ReadReplicaRouter']
+READ_REPLICA = {
+    'STICKY_SECONDS': 5,
+    'CACHE_ALIAS': 'default',
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -169,4 +192,45 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 MEDIA_ROOT = BASE_DIR / 'media'
-MEDIA_URL = 'media/'
\ No newline at end of file
+MEDIA_URL = 'media/'
+# 媒体文件下载（python222/media.py）：生产环境由Nginx发送文件时配置 'SENDFILE': 'x-accel-redirect'
+MEDIA_SERVING = {
+    'CACHE_CONTROL': 'public, max-age=31536000, immutable',
+    'MUTABLE_CACHE_CONTROL': 'public, max-age=300, must-revalidate',
+    'SENDFILE': None,
+    'ACCEL_REDIRECT_PREFIX': '/protected-media/',
+}
+# 密码哈希进程池（user/hashing.py）：登录、改密等接口的PBKDF2计算在独立进程中执行
+PASSWORD_HASHING = {
+    'MODE': 'process',
+    'WORKERS': 2,
+    'MAX_PENDING': 32,
+    'TIMEOUT': 5,
+    'MAX_BULK_JOBS': 1,
+}
+# JSON编解码后端（python222/fastjson.py）：None表示安装了orjson时自动使用，可设为 'orjson' 或 'json'
+JSON_BACKEND = None
+# 接口指标（python222/metrics.py）：多worker部署时各进程把累计值写到DIR目录，由 /metrics 汇总输出
+# DIR为None时使用系统临时目录下按部署区分的子目录；已退出进程的文件在worker启动时合并进归档文件
+METRICS = {
+    'ENABLED': True,
+    'PATH': '/metrics',
+    'ALLOWED_IPS': None,
+    'DIR': None,
+    'FLUSH_INTERVAL': 5,
+}
+# 用户名查重布隆过滤器（user/bloom.py）：过滤器判定不存在的用户名不查库；PATH为None时持久化到系统临时目录
+USERNAME_FILTER = {
+    'ENABLED': True,
+    'CAPACITY': 1_000_000,
+    'ERROR_RATE': 0.001,
+    'PATH': None,
+    'CATCH_UP_INTERVAL': 30,
+    'REBUILD_INTERVAL': 3600,
+    'WARM_IN_BACKGROUND': True,
+}
+# Token吊销（user/revocation.py）：各进程每REFRESH_INTERVAL秒同步一次吊销快照；RETENTION为None时取refresh token有效期
+TOKEN_REVOCATION = {
+    'REFRESH_INTERVAL': 2,
+    'RETENTION': None,
+}
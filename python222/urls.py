@@ -1,9 +1,9 @@
 
 # from django.contrib import admin
 from django.urls import path, include, re_path
-from django.views.static import serve
 
 from python222 import settings
+from python222.media import serve_media
 
 urlpatterns = [
 
@@ -11,6 +11,6 @@ urlpatterns = [
     path('user/', include('user.urls')), # 用户模块
     path('role/', include('role.urls')), # 角色模块
     # path('menu/', include('menu.urls')), # 权限模块
-    re_path('media/(?P<path>.*)', serve, {'document_root': settings.MEDIA_ROOT},name='media')
+    re_path('media/(?P<path>.*)', serve_media, {'document_root': settings.MEDIA_ROOT},name='media')
 ]
 
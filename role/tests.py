@@ -1,3 +1,49 @@
-from django.test import TestCase
+import base64
+import json
 
-# Create your tests here.
+from django.test import RequestFactory, TestCase
+
+from python222.pagination import InvalidCursor, decode_cursor, encode_cursor
+from .models import SysRole
+from .views import SearchView
+
+
+def raw_cursor(data):
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip('=')
+
+
+class RoleSearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(5):
+            SysRole.objects.create(name=f'角色{i}', code=f'role{i}')
+
+    def search(self, body):
+        request = RequestFactory().post('/role/search/', data=body, content_type='application/json')
+        return json.loads(SearchView.as_view()(request).content)
+
+    def test_cursor_pages(self):
+        seen, cursor = [], ''
+        while cursor is not None:
+            result = self.search(json.dumps({'pageSize': 2, 'query': '角色', 'cursor': cursor}))
+            seen += [role['id'] for role in result['roleList']]
+            cursor = result['nextCursor']
+        self.assertEqual(seen, sorted(SysRole.objects.values_list('id', flat=True)))
+
+    def test_bad_requests(self):
+        for body in ('not json', json.dumps({'query': ''}), json.dumps({'pageSize': 0, 'pageNum': 1}),
+                     json.dumps({'pageSize': 2, 'pageNum': 99}), json.dumps({'pageSize': 2, 'cursor': 'abc'}),
+                     json.dumps({'pageSize': 2, 'cursor': raw_cursor({'o': 'id', 'k': ['1']})})):
+            self.assertEqual(self.search(body)['code'], 400, body)
+
+
+class DecodeCursorTest(TestCase):
+    def test_round_trip(self):
+        self.assertEqual(decode_cursor(encode_cursor('id', [5]), 'id'), [5])
+        self.assertEqual(decode_cursor(encode_cursor('create_time', [None, 7]), 'create_time'), [None, 7])
+
+    def test_malformed_values(self):
+        for data in ({'o': 'id', 'k': 5}, {'o': 'id', 'k': 'a'}, {'o': 'id', 'k': ['5']}, {'o': 'id', 'k': [True]},
+                     {'o': 'id', 'k': [{'a': 1}]}, {'o': 'create_time', 'k': ['2024-01-01', None]}, [1]):
+            with self.assertRaises(InvalidCursor):
+                decode_cursor(raw_cursor(data), data['o'] if isinstance(data, dict) else 'id')
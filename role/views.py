@@ -1,8 +1,10 @@
 from django.shortcuts import render
 from django.views import View
-from django.http import JsonResponse
-from django.core.paginator import Paginator
-import json
+from django.core.paginator import InvalidPage, Paginator
+
+from python222.db_router import read_only_view
+from python222.fastjson import JSONDecodeError, JsonResponse, parse_json
+from python222.pagination import InvalidCursor, keyset_page
 from .models import SysRole
 
 # Create your views here.
@@ -10,16 +12,43 @@ from .models import SysRole
 
 # 角色信息查询
 class SearchView(View):
+    @read_only_view
     def post(self, request):
-        data = json.loads(request.body.decode("utf-8"))
-        pageNum = data['pageNum'] # 当前页
-        pageSize = data['pageSize'] # 每页大小
-        query = data['query'] # 查询参数
-        print(pageSize, pageNum)
-        roleListPage = Paginator(SysRole.objects.filter(name__icontains=query),
-        pageSize).page(pageNum)
-        obj_roles = roleListPage.object_list.values() # 转成字典
-        roles = list(obj_roles) # 把外层的容器转为List
-        total = SysRole.objects.filter(name__icontains=query).count()
-        return JsonResponse(
-            {'code': 200, 'roleList': roles, 'total': total})
\ No newline at end of file
+        try:
+            data = parse_json(request.body)
+            try:
+                pageSize = int(data['pageSize']) # 每页大小
+            except (TypeError, ValueError):
+                return JsonResponse({'code': 400, 'info': 'pageSize需为整数'})
+            if pageSize < 1:
+                return JsonResponse({'code': 400, 'info': 'pageSize需大于0'})
+            query = data.get('query', '') # 查询参数
+            role_queryset = SysRole.objects.filter(name__icontains=query)
+            if 'cursor' in data:
+                # 游标分页（可选），传入上一页的nextCursor，首页传空字符串
+                roles, nextCursor = keyset_page(role_queryset.values(), pageSize,
+                                                data['cursor'], data.get('orderBy', 'id'))
+                result = {'code': 200, 'roleList': roles, 'nextCursor': nextCursor}
+                if data.get('withTotal'):
+                    result['total'] = role_queryset.count()
+                return JsonResponse(result)
+            pageNum = data['pageNum'] # 当前页
+            print(pageSize, pageNum)
+            paginator = Paginator(role_queryset.order_by('id'), pageSize)
+            roleListPage = paginator.page(pageNum)
+            obj_roles = roleListPage.object_list.values() # 转成字典
+            roles = list(obj_roles) # 把外层的容器转为List
+            total = paginator.count # 复用分页器的COUNT，不再重复构造过滤条件
+            return JsonResponse(
+                {'code': 200, 'roleList': roles, 'total': total})
+        except InvalidCursor as e:
+            return JsonResponse({'code': 400, 'info': str(e)})
+        except InvalidPage as e:
+            return JsonResponse({'code': 400, 'info': f'pageNum无效：{e}'})
+        except KeyError as e:
+            return JsonResponse({'code': 400, 'info': f'缺少参数：{e}'})
+        except JSONDecodeError:
+            return JsonResponse({'code': 400, 'info': '请求格式错误，需为JSON'})
+        except Exception as e:
+            print(f"查询角色异常：{str(e)}")
+            return JsonResponse({'code': 500, 'info': '服务器内部错误'})
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class UserConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'user'
+
+    def ready(self):
+        # 注册用户检索索引维护信号
+        from . import signals  # noqa: F401
+        # 用户名过滤器在进程收到第一个请求时于后台预热（不在启动阶段查库，避免 migrate 等命令访问数据库）
+        from django.core.signals import request_started
+        from .bloom import WARMUP_DISPATCH_UID, warm_on_first_request
+        request_started.connect(warm_on_first_request, dispatch_uid=WARMUP_DISPATCH_UID)
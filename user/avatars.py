@@ -0,0 +1,147 @@
+# user/avatars.py（头像上传处理：校验解码、保存原图，后台线程池生成固定尺寸缩略图）
+# 原图按内容哈希分片存放（见 user/storage.py），文件名形如 "ab/cd/<sha256>.jpg"，相同图片只存一份。
+# 用户列表等页面只需要小尺寸头像，缩略图与原图同目录存放，命名为 "<原文件名>_<尺寸>.<格式>"。
+# Pillow为可选依赖：未安装时跳过解码校验和缩略图生成，退化为按扩展名校验并只保存原图。
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+
+from .storage import ContentAddressedStorage, atomic_write
+
+try:
+    from PIL import Image, ImageOps, UnidentifiedImageError
+except ImportError:  # pragma: no cover
+    Image = None
+
+AVATAR_DIR = 'userAvatar'
+DEFAULT_AVATAR_PIPELINE = {
+    'SIZES': (32, 64, 128),  # 缩略图边长（像素），居中裁剪为正方形
+    'FORMAT': 'webp',  # 缩略图格式：webp 或 jpeg
+    'QUALITY': 80,
+    'WORKERS': 2,  # 解码与缩略图线程数（Pillow处理图片时会释放GIL）
+    'MAX_BYTES': 5 * 1024 * 1024,  # 上传文件大小上限
+    'MAX_PIXELS': 40_000_000,  # 像素数上限，防止解压炸弹
+}
+# Pillow格式 -> 保存原图使用的扩展名
+ALLOWED_FORMATS = {'JPEG': '.jpg', 'PNG': '.png', 'GIF': '.gif', 'WEBP': '.webp'}
+ALLOWED_SUFFIXES = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+
+
+class InvalidImage(Exception):
+    pass
+
+
+def get_avatar_config():
+    return {**DEFAULT_AVATAR_PIPELINE, **getattr(settings, 'AVATAR_PIPELINE', {})}
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=get_avatar_config()['WORKERS'],
+                                           thread_name_prefix='avatar')
+        return _executor
+
+
+def get_avatar_storage():
+    return ContentAddressedStorage(os.path.join(settings.MEDIA_ROOT, AVATAR_DIR))
+
+
+def avatar_path(name):
+    return get_avatar_storage().path(name)
+
+
+def variant_name(name, size):
+    stem = os.path.splitext(name)[0]
+    return f"{stem}_{size}.{get_avatar_config()['FORMAT']}"
+
+
+def _validate(data, filename):
+    """解码校验图片，返回原图应使用的扩展名"""
+    if Image is None:
+        suffix = os.path.splitext(filename)[1].lower()
+        if suffix not in ALLOWED_SUFFIXES:
+            raise InvalidImage('仅支持jpg/png/gif/webp格式的图片')
+        return '.jpg' if suffix == '.jpeg' else suffix
+    try:
+        with Image.open(BytesIO(data)) as img:
+            if img.format not in ALLOWED_FORMATS:
+                raise InvalidImage('仅支持jpg/png/gif/webp格式的图片')
+            if img.width * img.height > get_avatar_config()['MAX_PIXELS']:
+                raise InvalidImage('图片尺寸过大')
+            img.verify()
+            return ALLOWED_FORMATS[img.format]
+    except Image.DecompressionBombError as e:
+        # 像素数超过Pillow自身的上限时在打开阶段即抛出，同样按尺寸过大处理
+        raise InvalidImage('图片尺寸过大') from e
+    except (UnidentifiedImageError, OSError, SyntaxError) as e:
+        raise InvalidImage('图片文件已损坏或无法识别') from e
+
+
+def generate_variants(name):
+    """为已保存的头像生成各尺寸缩略图（先写临时文件再原子替换，读取方不会看到半个文件）"""
+    if Image is None:
+        return
+    conf = get_avatar_config()
+    fmt = conf['FORMAT'].upper()
+    with Image.open(avatar_path(name)) as img:
+        img = ImageOps.exif_transpose(img)
+        img = img.convert('RGBA' if fmt == 'WEBP' and img.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        for size in conf['SIZES']:
+            thumb = ImageOps.fit(img, (size, size), Image.LANCZOS)
+            atomic_write(avatar_path(variant_name(name, size)),
+                         lambda f: thumb.save(f, fmt, quality=conf['QUALITY']))
+
+
+def _generate_in_background(name):
+    try:
+        generate_variants(name)
+    except Exception as e:
+        print(f"生成头像缩略图异常（{name}）：{e}")
+
+
+def _save_upload(upload):
+    """读取上传内容、解码校验并保存原图，返回 (文件名, 是否需要生成缩略图)"""
+    # 较大的上传文件由Django落在临时文件中，读取同样是阻塞IO
+    data = b''.join(upload.chunks())
+    suffix = _validate(data, upload.name)
+    name, created = get_avatar_storage().save(data, suffix)
+    return name, created or not _has_variants(name)
+
+
+async def store_avatar(upload):
+    """
+    保存上传的头像：读取、解码校验和写文件在线程池中执行，缩略图在后台生成
+    :return: 保存后的文件名（存入SysUser.avatar）
+    """
+    conf = get_avatar_config()
+    if upload.size > conf['MAX_BYTES']:
+        raise InvalidImage(f"图片不能超过{conf['MAX_BYTES'] // 1024 // 1024}MB")
+    executor = _get_executor()
+    name, needVariants = await asyncio.get_running_loop().run_in_executor(executor, _save_upload, upload)
+    if needVariants:
+        executor.submit(_generate_in_background, name)
+    return name
+
+
+def _has_variants(name):
+    if Image is None:
+        return True
+    return all(os.path.exists(avatar_path(variant_name(name, size))) for size in get_avatar_config()['SIZES'])
+
+
+def resolve_avatar(name, size):
+    """返回指定尺寸的缩略图文件名；缩略图尚未生成（或无Pillow）时返回原图"""
+    if not name or Image is None:
+        return name
+    variant = variant_name(name, size)
+    return variant if os.path.exists(avatar_path(variant)) else name
@@ -0,0 +1,270 @@
+# user/bloom.py（用户名布隆过滤器：新增用户时的用户名查重）
+# 管理员输入用户名时 CheckView 每次按键都会查库。这里在进程内维护 sys_user.username 的布隆过滤器：
+# 过滤器判定"不存在"时一定不存在，直接返回；判定"可能存在"时再走username唯一索引查询确认。
+# - 进程处理第一个请求时在后台线程加载持久化文件（冷启动无需全表扫描），再按文件中的id水位补齐之后新增的用户；
+#   没有可用文件时在后台全量构建，构建完成前的查重直接走数据库，不阻塞请求；
+# - 本进程的新增/改名由 post_save 信号即时加入；其它进程的新增按 CATCH_UP_INTERVAL 按id水位增量补齐；
+# - 布隆过滤器不支持删除，删除与改名留下的旧用户名只会造成"可能存在"，由 REBUILD_INTERVAL 的后台全量重建清理。
+# 多进程部署时，其它进程刚改名得到的用户名在下次全量重建前可能被判定为不存在，
+# 因此SaveView在写库时仍以唯一索引为准（捕获IntegrityError）。
+import hashlib
+import math
+import os
+import struct
+import tempfile
+import threading
+import time
+import unicodedata
+
+from django.conf import settings
+from django.core.signals import request_started, setting_changed
+from django.db import connections, router
+
+from .models import SysUser
+
+DEFAULT_USERNAME_FILTER = {
+    'ENABLED': True,
+    'CAPACITY': 1_000_000,  # 预计用户数，超出后重建时自动扩容
+    'ERROR_RATE': 0.001,  # 误判率（判定可能存在但实际不存在的比例）
+    'PATH': None,  # 持久化文件，默认放在系统临时目录
+    'CATCH_UP_INTERVAL': 30,  # 按id水位补齐新增用户的间隔（秒）
+    'REBUILD_INTERVAL': 3600,  # 后台全量重建的间隔（秒），同时作为持久化文件的有效期
+    'WARM_IN_BACKGROUND': True,  # 在后台线程加载/构建过滤器；False时由首次查重的请求同步构建
+}
+FILE_MAGIC = b'UBF1'
+# 文件头：magic, 位数m, 哈希数k, 元素数, id水位, 生成时间
+HEADER = struct.Struct('<4sQIQQd')
+WARM_BATCH_SIZE = 5000
+WARMUP_DISPATCH_UID = 'user.bloom.warm_on_first_request'
+
+
+def get_username_filter_config():
+    conf = {**DEFAULT_USERNAME_FILTER, **getattr(settings, 'USERNAME_FILTER', {})}
+    if not conf['PATH']:
+        # 文件名带上主库标识，避免不同数据库（如测试库、压测库）误用彼此的持久化文件
+        db = settings.DATABASES[router.db_for_write(SysUser)]
+        dbKey = hashlib.md5(f"{db.get('HOST', '')}:{db.get('PORT', '')}/{db.get('NAME', '')}".encode()).hexdigest()[:8]
+        conf['PATH'] = os.path.join(tempfile.gettempdir(), f'python222_username_bloom_{dbKey}.bin')
+    return conf
+
+
+def normalize_username(username):
+    """
+    与MySQL默认排序规则（*_general_ci / *_0900_ai_ci）的比较方式对齐：不区分大小写、重音，忽略尾部空格。
+    归一化只会把更多用户名映射到同一个值，最多增加"可能存在"的误判，不会漏判。
+    """
+    value = unicodedata.normalize('NFKD', username)
+    value = ''.join(ch for ch in value if not unicodedata.combining(ch))
+    return value.casefold().rstrip(' ')
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        capacity = max(int(capacity), 1)
+        self.m = int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.k = max(1, int(round(self.m / capacity * math.log(2))))
+        self.bits = bytearray((self.m + 7) // 8)
+        self.count = 0
+
+    @classmethod
+    def from_bits(cls, m, k, bits, count):
+        bloom = cls.__new__(cls)
+        bloom.m, bloom.k, bloom.bits, bloom.count = m, k, bits, count
+        return bloom
+
+    def _positions(self, item):
+        # 双重哈希：一次blake2b得到两个64位值，生成k个位置
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1, h2 = struct.unpack('<QQ', digest)
+        return [(h1 + i * h2) % self.m for i in range(self.k)]
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class UsernameFilter:
+    def __init__(self, conf):
+        self.conf = conf
+        self._bloom = None
+        self._watermark = 0  # 已加入过滤器的最大用户id
+        self._lastCatchUp = 0.0
+        self._builtAt = 0.0
+        self._lock = threading.Lock()
+        self._rebuilding = False
+        self._warming = False
+
+    # ------------------------ 构建与持久化 ------------------------
+    def _scan(self, bloom, afterId):
+        """按id分批把用户名加入过滤器，返回新的id水位"""
+        # 过滤器为进程内共享，以主库为准，避免从库延迟造成漏判
+        db = router.db_for_write(SysUser)
+        lastId = afterId
+        while True:
+            rows = list(SysUser.objects.using(db).filter(id__gt=lastId).order_by('id')
+                        .values_list('id', 'username')[:WARM_BATCH_SIZE])
+            for _, username in rows:
+                bloom.add(normalize_username(username))
+            if rows:
+                lastId = rows[-1][0]
+            if len(rows) < WARM_BATCH_SIZE:
+                return lastId
+
+    def _build(self):
+        total = SysUser.objects.using(router.db_for_write(SysUser)).count()
+        bloom = BloomFilter(max(self.conf['CAPACITY'], total * 2), self.conf['ERROR_RATE'])
+        watermark = self._scan(bloom, 0)
+        return bloom, watermark
+
+    def _load(self):
+        path = self.conf['PATH']
+        try:
+            with open(path, 'rb') as f:
+                magic, m, k, count, watermark, builtAt = HEADER.unpack(f.read(HEADER.size))
+                bits = bytearray(f.read())
+        except (OSError, struct.error):
+            return None
+        if magic != FILE_MAGIC or len(bits) != (m + 7) // 8 or time.time() - builtAt > self.conf['REBUILD_INTERVAL']:
+            return None
+        # 沿用文件中的参数（上次重建时可能已扩容），配置的容量与误判率在下次重建时生效
+        return BloomFilter.from_bits(m, k, bits, count), watermark, builtAt
+
+    def _save(self, bloom, watermark, builtAt):
+        path = self.conf['PATH']
+        tmp = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(HEADER.pack(FILE_MAGIC, bloom.m, bloom.k, bloom.count, watermark, builtAt))
+                f.write(bloom.bits)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"保存用户名过滤器失败：{e}")
+
+    def _ensure_warm(self):
+        if self._bloom is not None:
+            return
+        with self._lock:
+            if self._bloom is not None:
+                return
+            loaded = self._load()
+            if loaded is not None:
+                bloom, watermark, builtAt = loaded
+                watermark = self._scan(bloom, watermark)
+            else:
+                bloom, watermark = self._build()
+                builtAt = time.time()
+                self._save(bloom, watermark, builtAt)
+            self._bloom, self._watermark, self._builtAt = bloom, watermark, builtAt
+            self._lastCatchUp = time.monotonic()
+
+    def warm(self):
+        """同步加载或构建过滤器"""
+        self._ensure_warm()
+
+    def warm_in_background(self):
+        if self._bloom is not None or self._warming:
+            return
+
+        def run():
+            try:
+                self._ensure_warm()
+            except Exception as e:
+                print(f"加载用户名过滤器异常：{e}")
+            finally:
+                self._warming = False
+                connections.close_all()  # 后台线程的数据库连接不会被请求结束信号关闭
+
+        self._warming = True
+        threading.Thread(target=run, name='username-bloom-warm', daemon=True).start()
+
+    def _rebuild_in_background(self):
+        def run():
+            try:
+                bloom, watermark = self._build()
+                builtAt = time.time()
+                with self._lock:
+                    self._bloom, self._watermark, self._builtAt = bloom, watermark, builtAt
+                self._save(bloom, watermark, builtAt)
+            except Exception as e:
+                print(f"重建用户名过滤器异常：{e}")
+            finally:
+                self._rebuilding = False
+                connections.close_all()  # 后台线程的数据库连接不会被请求结束信号关闭
+
+        self._rebuilding = True
+        threading.Thread(target=run, name='username-bloom-rebuild', daemon=True).start()
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._lastCatchUp >= self.conf['CATCH_UP_INTERVAL']:
+            with self._lock:
+                if now - self._lastCatchUp >= self.conf['CATCH_UP_INTERVAL']:
+                    self._watermark = self._scan(self._bloom, self._watermark)
+                    self._lastCatchUp = now
+        if not self._rebuilding and time.time() - self._builtAt >= self.conf['REBUILD_INTERVAL']:
+            self._rebuild_in_background()
+
+    # ------------------------ 对外接口 ------------------------
+    def might_exist(self, username):
+        """False表示用户名一定不存在；True表示可能存在，需查库确认"""
+        if self._bloom is None:
+            if self.conf['WARM_IN_BACKGROUND']:
+                # 过滤器尚未就绪：触发后台加载，本次按可能存在处理，由调用方查库
+                self.warm_in_background()
+                return True
+            self._ensure_warm()
+        self._refresh()
+        return normalize_username(username) in self._bloom
+
+    def add(self, username, userId=None):
+        """新增或改名后调用；过滤器尚未加载时无需处理（加载时会从数据库读到）"""
+        if self._bloom is None:
+            return
+        with self._lock:
+            self._bloom.add(normalize_username(username))
+            # 只有紧接水位的id才能推进水位，否则可能跳过其它进程新增的用户
+            if userId is not None and userId == self._watermark + 1:
+                self._watermark = userId
+
+
+_filter = None
+_filter_lock = threading.Lock()
+
+
+def get_username_filter():
+    global _filter
+    with _filter_lock:
+        if _filter is None:
+            _filter = UsernameFilter(get_username_filter_config())
+        return _filter
+
+
+def _reset(**kwargs):
+    global _filter
+    if kwargs['setting'] == 'USERNAME_FILTER':
+        with _filter_lock:
+            _filter = None
+
+
+setting_changed.connect(_reset)
+
+
+def warm_on_first_request(**kwargs):
+    """request_started接收者（见 user/apps.py）：进程收到第一个请求时开始后台预热，之后不再触发"""
+    request_started.disconnect(dispatch_uid=WARMUP_DISPATCH_UID)
+    conf = get_username_filter_config()
+    if conf['ENABLED'] and conf['WARM_IN_BACKGROUND']:
+        get_username_filter().warm_in_background()
+
+
+def username_exists(username):
+    """用户名是否已存在：过滤器判定不存在时不查库"""
+    conf = get_username_filter_config()
+    if conf['ENABLED'] and not get_username_filter().might_exist(username):
+        return False
+    return SysUser.objects.filter(username=username).exists()
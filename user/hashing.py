@@ -0,0 +1,331 @@
+# user/hashing.py（密码哈希服务）
+# PBKDF2是CPU密集计算，放在请求线程里会占满worker并拖慢其它接口。
+# 这里统一提交到独立的进程池执行，并限制排队深度：超出上限时立即拒绝，而不是让请求无限堆积。
+import asyncio
+import atexit
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError, Future
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.signals import setting_changed
+
+from python222.metrics import register_collector
+
+DEFAULT_PASSWORD_HASHING = {
+    'MODE': 'process',  # process：进程池执行；inline：在调用线程中直接执行（调试/测试用）
+    'WORKERS': 2,  # 进程池大小，建议不超过CPU核数
+    'MAX_PENDING': 32,  # 执行中+排队中的最大任务数，超过后直接拒绝
+    'TIMEOUT': 5,  # 单次调用等待结果的最长秒数
+    'START_METHOD': 'spawn',  # 子进程启动方式，spawn可避免fork继承数据库连接和线程锁
+    'MAX_BULK_JOBS': 1,  # 本进程同时进行的批量哈希任务数（每个任务启动一个CPU核数大小的临时进程池），超出时拒绝
+}
+
+# 延迟直方图的桶上限（毫秒）
+LATENCY_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float('inf'))
+
+
+class HashingOverloaded(Exception):
+    """哈希任务排队已满或等待超时"""
+
+
+def _init_worker(settingsModule):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settingsModule)
+    import django
+    django.setup()
+
+
+def _timed(func, *args):
+    begin = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - begin
+
+
+def _check_password(password, encoded):
+    return _timed(hashers.check_password, password, encoded)
+
+
+def _make_password(password):
+    return _timed(hashers.make_password, password)
+
+
+class _OpStats:
+    __slots__ = ('count', 'rejected', 'timeouts', 'wait_seconds', 'compute_seconds', 'max_seconds', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0  # 提交到拿到结果的总耗时（含排队）
+        self.compute_seconds = 0.0  # worker中实际计算耗时
+        self.max_seconds = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'rejected': self.rejected,
+            'timeouts': self.timeouts,
+            'wait_seconds': self.wait_seconds,
+            'compute_seconds': self.compute_seconds,
+            'avg_ms': self.wait_seconds * 1000 / self.count if self.count else 0,
+            'avg_compute_ms': self.compute_seconds * 1000 / self.count if self.count else 0,
+            'max_ms': self.max_seconds * 1000,
+            'buckets': dict(zip(LATENCY_BUCKETS, self.buckets)),
+        }
+
+
+class PasswordHashingService:
+    def __init__(self, mode='process', workers=2, max_pending=32, timeout=5, start_method='spawn'):
+        self.mode = mode
+        self.workers = workers
+        self.start_method = start_method
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._stats = {'check_password': _OpStats(), 'make_password': _OpStats()}
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                    initializer=_init_worker,
+                    initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'python222.settings'),),
+                )
+            return self._executor
+
+    def _record(self, op, begin, future):
+        stats = self._stats[op]
+        elapsed = time.perf_counter() - begin
+        with self._lock:
+            if future.cancelled() or future.exception() is not None:
+                return
+            stats.count += 1
+            stats.wait_seconds += elapsed
+            stats.compute_seconds += future.result()[1]
+            stats.max_seconds = max(stats.max_seconds, elapsed)
+            elapsedMs = elapsed * 1000
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if elapsedMs <= bound:
+                    stats.buckets[i] += 1
+                    break
+
+    def _submit(self, op, func, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats[op].rejected += 1
+            raise HashingOverloaded(f'{op} 排队已满')
+        begin = time.perf_counter()
+        if self.mode == 'inline':
+            future = Future()
+            try:
+                future.set_result(func(*args))
+            except Exception as e:
+                future.set_exception(e)
+        else:
+            try:
+                try:
+                    future = self._get_executor().submit(func, *args)
+                except BrokenProcessPool:
+                    # worker进程异常退出后进程池不可再用，重建一次
+                    self._discard_executor()
+                    future = self._get_executor().submit(func, *args)
+            except Exception:
+                self._slots.release()
+                raise
+
+        def done(f):
+            self._slots.release()
+            self._record(op, begin, f)
+
+        future.add_done_callback(done)
+        return future
+
+    def _timeout(self, op):
+        with self._lock:
+            self._stats[op].timeouts += 1
+        return HashingOverloaded(f'{op} 等待超时')
+
+    def _wait(self, op, future):
+        try:
+            return future.result(self.timeout)[0]
+        except FutureTimeoutError:
+            raise self._timeout(op) from None
+
+    async def _await(self, op, future):
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            raise self._timeout(op) from None
+        return result[0]
+
+    def check_password(self, password, encoded):
+        return self._wait('check_password', self._submit('check_password', _check_password, password, encoded))
+
+    def make_password(self, password):
+        return self._wait('make_password', self._submit('make_password', _make_password, password))
+
+    async def acheck_password(self, password, encoded):
+        return await self._await('check_password',
+                                 self._submit('check_password', _check_password, password, encoded))
+
+    async def amake_password(self, password):
+        return await self._await('make_password', self._submit('make_password', _make_password, password))
+
+    def stats(self):
+        """各操作的调用次数、拒绝/超时次数与耗时分布"""
+        with self._lock:
+            return {op: stats.as_dict() for op, stats in self._stats.items()}
+
+    def _discard_executor(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        self._discard_executor()
+
+
+class BulkPasswordHasher:
+    """
+    批量导入专用的哈希器：在独立的临时进程池中并行计算，
+    不占用登录等在线接口使用的进程池和排队名额
+    """
+
+    def __init__(self, workers=None, mode=None, start_method=None):
+        conf = {**DEFAULT_PASSWORD_HASHING, **getattr(settings, 'PASSWORD_HASHING', {})}
+        self.mode = mode or conf['MODE']
+        self.workers = workers or os.cpu_count() or 1
+        self.start_method = start_method or conf['START_METHOD']
+        self._executor = None
+
+    def __enter__(self):
+        # 并发导入各自启动进程池会成倍占用CPU并挤占登录使用的进程池，超出名额时立即拒绝
+        self._slots = _get_bulk_slots()
+        if not self._slots.acquire(blocking=False):
+            raise HashingOverloaded('批量哈希任务已满')
+        try:
+            if self.mode != 'inline':
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                    initializer=_init_worker,
+                    initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'python222.settings'),),
+                )
+        except Exception:
+            self._slots.release()
+            raise
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+        finally:
+            self._slots.release()
+
+    def make_passwords(self, passwords):
+        """按输入顺序返回哈希结果"""
+        if self._executor is None:
+            return [hashers.make_password(password) for password in passwords]
+        chunksize = max(1, len(passwords) // (self.workers * 4))
+        return list(self._executor.map(hashers.make_password, passwords, chunksize=chunksize))
+
+
+_service = None
+_bulk_slots = None
+_service_lock = threading.Lock()
+
+
+def get_hashing_service():
+    global _service
+    with _service_lock:
+        if _service is None:
+            conf = {**DEFAULT_PASSWORD_HASHING, **getattr(settings, 'PASSWORD_HASHING', {})}
+            _service = PasswordHashingService(conf['MODE'], conf['WORKERS'], conf['MAX_PENDING'], conf['TIMEOUT'],
+                                              conf['START_METHOD'])
+        return _service
+
+
+def _get_bulk_slots():
+    global _bulk_slots
+    with _service_lock:
+        if _bulk_slots is None:
+            conf = {**DEFAULT_PASSWORD_HASHING, **getattr(settings, 'PASSWORD_HASHING', {})}
+            _bulk_slots = threading.BoundedSemaphore(conf['MAX_BULK_JOBS'])
+        return _bulk_slots
+
+
+def _reset(**kwargs):
+    global _service, _bulk_slots
+    if kwargs['setting'] == 'PASSWORD_HASHING':
+        with _service_lock:
+            if _service is not None:
+                _service.shutdown()
+            _service = None
+            _bulk_slots = None
+
+
+setting_changed.connect(_reset)
+
+
+@atexit.register
+def _shutdown():
+    if _service is not None:
+        _service.shutdown()
+
+
+# 便捷函数，签名与 django.contrib.auth.hashers 中的同名函数一致
+def check_password(password, encoded):
+    return get_hashing_service().check_password(password, encoded)
+
+
+def make_password(password):
+    return get_hashing_service().make_password(password)
+
+
+async def acheck_password(password, encoded):
+    return await get_hashing_service().acheck_password(password, encoded)
+
+
+async def amake_password(password):
+    return await get_hashing_service().amake_password(password)
+
+
+# ---------------------------- 指标导出（/metrics，见 python222/metrics.py） ----------------------------
+def _stats_samples(build):
+    service = _service  # 尚未调用过哈希服务的进程没有数据
+    if service is None:
+        return []
+    return [sample for op, stats in service.stats().items() for sample in build(op, stats)]
+
+
+def _latency_samples(op, stats):
+    samples = []
+    cumulative = 0
+    for bound, count in stats['buckets'].items():
+        cumulative += count
+        le = '+Inf' if bound == float('inf') else repr(bound / 1000)
+        samples.append(('_bucket', {'op': op, 'le': le}, cumulative))
+    samples.append(('_sum', {'op': op}, stats['wait_seconds']))
+    samples.append(('_count', {'op': op}, stats['count']))
+    return samples
+
+
+register_collector('password_hashing_duration_seconds', '密码哈希调用耗时（秒，含排队）', 'histogram',
+                   lambda: _stats_samples(_latency_samples))
+register_collector('password_hashing_compute_seconds_total', '密码哈希在worker中的计算耗时（秒）', 'counter',
+                   lambda: _stats_samples(lambda op, stats: [('', {'op': op}, stats['compute_seconds'])]))
+register_collector('password_hashing_rejected_total', '排队已满被立即拒绝的密码哈希调用次数', 'counter',
+                   lambda: _stats_samples(lambda op, stats: [('', {'op': op}, stats['rejected'])]))
+register_collector('password_hashing_timeouts_total', '等待超时的密码哈希调用次数', 'counter',
+                   lambda: _stats_samples(lambda op, stats: [('', {'op': op}, stats['timeouts'])]))
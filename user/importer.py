@@ -0,0 +1,247 @@
+# user/importer.py（用户批量导入：流式解析CSV/NDJSON，分批校验、并行哈希、bulk_create写入）
+import csv
+from datetime import datetime
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from python222.fastjson import JSONDecodeError, loads
+
+from .bloom import get_username_filter, normalize_username
+from .hashing import BulkPasswordHasher
+from .models import SysUser
+from .search import index_users
+
+DEFAULT_USER_IMPORT = {
+    'BATCH_SIZE': 1000,  # 每批校验、写入的行数
+    'WORKERS': None,  # 哈希进程数，None表示CPU核数
+    'MAX_ERRORS': 1000,  # 接口最多返回的错误行数
+    'DEFAULT_PASSWORD': '123456',  # 与SaveView一致的默认密码
+}
+
+def get_import_config():
+    return {**DEFAULT_USER_IMPORT, **getattr(settings, 'USER_IMPORT', {})}
+
+
+def _decode_lines(lines):
+    for index, line in enumerate(lines):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if index == 0:
+            line = line.lstrip('﻿')
+        yield line
+
+
+def iter_rows(lines, fmt):
+    """
+    逐行解析导入数据，不把整个文件读入内存
+    :param lines: 可迭代的行（bytes或str），如上传文件对象、request本身
+    :param fmt: csv（首行为表头）或 ndjson（每行一个JSON对象）
+    :return: 生成 (行号, 数据字典或None, 解析错误信息或None)
+    """
+    lines = _decode_lines(lines)
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row, None
+    elif fmt == 'ndjson':
+        for lineNo, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                row = loads(line)
+            except JSONDecodeError:
+                yield lineNo, None, 'JSON格式错误'
+                continue
+            if not isinstance(row, dict):
+                yield lineNo, None, '每行需为JSON对象'
+                continue
+            yield lineNo, row, None
+    else:
+        raise ValueError(f'不支持的导入格式：{fmt}')
+
+
+# 各字段的最大长度，与 SysUser 的列定义一致；超长在严格模式的MySQL上会以DataError中断整批写入
+FIELD_MAX_LENGTHS = {
+    'username': 100,
+    'email': 100,
+    'phonenumber': 11,
+    'avatar': 255,
+    'remark': 500,
+}
+FIELD_LABELS = {'username': '用户名', 'email': '邮箱', 'phonenumber': '手机号', 'avatar': '头像', 'remark': '备注',
+                'password': '密码'}
+
+
+def _text(value):
+    """
+    CSV中均为字符串；NDJSON中手机号、用户名等可能写成数字，按字符串处理
+    :return: 字符串（缺省为''），类型不合法时返回None
+    """
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    return None
+
+
+def clean_row(row):
+    """
+    校验并规整一行导入数据
+    :return: (规整后的字段字典, None) 或 (None, 错误信息)
+    """
+    data = {}
+    for field in ('username', 'password', 'email', 'phonenumber', 'avatar', 'remark'):
+        value = _text(row.get(field))
+        if value is None:
+            return None, f'{FIELD_LABELS[field]}需为字符串'
+        maxLength = FIELD_MAX_LENGTHS.get(field)
+        if maxLength and len(value) > maxLength:
+            return None, f'{FIELD_LABELS[field]}长度不能超过{maxLength}'
+        data[field] = value
+    data['username'] = data['username'].strip()
+    if not data['username']:
+        return None, '用户名不能为空'
+    status = row.get('status')
+    if status in (None, ''):
+        data['status'] = 1
+    else:
+        try:
+            if isinstance(status, bool) or (isinstance(status, float) and not status.is_integer()):
+                raise ValueError
+            data['status'] = int(status)
+        except (TypeError, ValueError):
+            return None, 'status需为整数'
+    return data, None
+
+
+class UserImporter:
+    """
+    分批导入用户，单行出错只记录错误，不中断整批
+    用法：
+        with UserImporter() as importer:
+            importer.run(iter_rows(f, 'csv'))
+    """
+
+    def __init__(self, batch_size=None, workers=None, max_errors=None):
+        conf = get_import_config()
+        self.batch_size = batch_size or conf['BATCH_SIZE']
+        self.max_errors = max_errors if max_errors is not None else conf['MAX_ERRORS']
+        self.default_password = conf['DEFAULT_PASSWORD']
+        self.hasher = BulkPasswordHasher(workers or conf['WORKERS'])
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+
+    def __enter__(self):
+        self.hasher.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.hasher.__exit__(*exc_info)
+
+    def _error(self, rowNo, username, info):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'row': rowNo, 'username': username, 'info': info})
+
+    def run(self, rows, progress=None):
+        batch = []
+        for rowNo, row, error in rows:
+            if error:
+                self._error(rowNo, None, error)
+                continue
+            batch.append((rowNo, row))
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+                batch = []
+                if progress:
+                    progress(self)
+        if batch:
+            self._flush(batch)
+            if progress:
+                progress(self)
+        self.errors.sort(key=lambda error: error['row'])
+        return self
+
+    def _existing_usernames(self, usernames):
+        return set(SysUser.objects.filter(username__in=usernames).values_list('username', flat=True))
+
+    def _flush(self, batch):
+        # 1. 行内校验，并去掉本批内重复的用户名
+        # 以归一化的用户名为键（见 user/bloom.py）：MySQL默认排序规则不区分大小写，
+        # "ADMIN"与"admin"在唯一索引上冲突，IN查询返回的也是库中的写法
+        pending = {}
+        for rowNo, row in batch:
+            data, error = clean_row(row)
+            if error:
+                username = row.get('username')
+                self._error(rowNo, username if isinstance(username, str) and username.strip() else None, error)
+                continue
+            key = normalize_username(data['username'])
+            if key in pending:
+                self._error(rowNo, data['username'], '用户名在导入数据中重复')
+            else:
+                pending[key] = (rowNo, data)
+        if not pending:
+            return
+
+        # 2. 用户名唯一性：整批一次IN查询（走username唯一索引）
+        for username in self._existing_usernames([data['username'] for _, data in pending.values()]):
+            item = pending.pop(normalize_username(username), None)
+            if item is not None:
+                self._error(item[0], item[1]['username'], '用户名已存在')
+        if not pending:
+            return
+
+        # 3. 并行哈希后构造对象
+        items = list(pending.values())
+        passwords = self.hasher.make_passwords([data['password'] or self.default_password for _, data in items])
+        today = datetime.now().date()
+        users = []
+        for (_, data), password in zip(items, passwords):
+            users.append(SysUser(
+                username=data['username'],
+                password=password,
+                avatar=data['avatar'] or 'default.jpg',
+                email=data['email'],
+                phonenumber=data['phonenumber'],
+                status=data['status'],
+                create_time=today,
+                update_time=today,
+                remark=data['remark'],
+            ))
+
+        # 4. 批量写入；并发写入导致唯一索引冲突时退化为逐行写入，定位出错行
+        try:
+            with transaction.atomic():
+                SysUser.objects.bulk_create(users, batch_size=self.batch_size)
+                self._after_create([user.username for user in users])
+            self.created += len(users)
+        except IntegrityError:
+            for user in users:
+                user.pk = None  # 回滚前bulk_create可能已回填主键
+                try:
+                    with transaction.atomic():
+                        user.save(force_insert=True)
+                    self.created += 1
+                except IntegrityError:
+                    self._error(pending[normalize_username(user.username)][0], user.username, '用户名已存在')
+
+    def _after_create(self, usernames):
+        # bulk_create不触发post_save信号，需手动维护派生数据
+        # （MySQL的bulk_create不回填主键，按用户名重新取回）
+        index_users(SysUser.objects.filter(username__in=usernames).only('id', 'username', 'email', 'phonenumber'))
+        usernameFilter = get_username_filter()
+        for username in usernames:
+            usernameFilter.add(username)
+
+    def result(self):
+        return {
+            'created': self.created,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errorsTruncated': self.failed > len(self.errors),
+        }
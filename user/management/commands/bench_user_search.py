@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from user.models import SysUser
+from user.search import index_users, search_users
+
+BENCH_PREFIX = 'bench_'
+
+
+class Command(BaseCommand):
+    help = '对比 icontains 全表扫描与三元组索引两种用户检索方式的耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, help='先插入指定数量的测试用户（如 1000000）')
+        parser.add_argument('--batch-size', type=int, default=5000, help='插入测试用户的批大小')
+        parser.add_argument('--repeat', type=int, default=5, help='每个查询重复次数，取最快一次')
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--cleanup', action='store_true', help='结束后删除测试用户')
+        parser.add_argument('queries', nargs='*', default=['0012345', 'bench_09', 'ch_0', '13800'])
+
+    def seed(self, count, batchSize):
+        start = SysUser.objects.filter(username__startswith=BENCH_PREFIX).count()
+        for offset in range(start, start + count, batchSize):
+            users = [
+                SysUser(username=f'{BENCH_PREFIX}{i:07d}', password='!', status=0,
+                        email=f'bench{i}@example.com', phonenumber=f'138{i:08d}')
+                for i in range(offset, min(offset + batchSize, start + count))
+            ]
+            SysUser.objects.bulk_create(users)
+            # MySQL的bulk_create不回填主键，重新查询
+            index_users(SysUser.objects.filter(username__in=[user.username for user in users]))
+            self.stdout.write(f'已插入 {offset + len(users) - start}/{count}')
+
+    def measure(self, queryset, pageSize, repeat):
+        best = None
+        for _ in range(repeat):
+            begin = time.perf_counter()
+            # 与SearchView一致：COUNT + 首页数据
+            total = queryset.count()
+            list(queryset.order_by('id').values_list('id', flat=True)[:pageSize])
+            elapsed = time.perf_counter() - begin
+            best = elapsed if best is None else min(best, elapsed)
+        return best, total
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            self.seed(options['seed'], options['batch_size'])
+
+        self.stdout.write(f'用户总数：{SysUser.objects.count()}')
+        self.stdout.write(f"{'查询':<16}{'命中数':>10}{'icontains(ms)':>16}{'trigram(ms)':>16}{'加速比':>10}")
+        for query in options['queries']:
+            scanTime, scanTotal = self.measure(SysUser.objects.filter(username__icontains=query),
+                                               options['page_size'], options['repeat'])
+            gramTime, gramTotal = self.measure(search_users(SysUser.objects.all(), query),
+                                               options['page_size'], options['repeat'])
+            if scanTotal != gramTotal:
+                self.stderr.write(f'查询 {query} 结果不一致：{scanTotal} != {gramTotal}，请先执行 rebuild_user_ngrams')
+            self.stdout.write(f'{query:<16}{gramTotal:>10}{scanTime * 1000:>16.2f}{gramTime * 1000:>16.2f}'
+                              f'{scanTime / gramTime if gramTime else 0:>10.1f}')
+
+        if options['cleanup']:
+            deleted, _ = SysUser.objects.filter(username__startswith=BENCH_PREFIX).delete()
+            self.stdout.write(f'已删除测试数据 {deleted} 行')
@@ -0,0 +1,58 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from user.avatars import get_avatar_config, get_avatar_storage, variant_name
+from user.models import SysUser
+
+# 前端与SaveView使用的默认头像，不在用户表中也要保留
+KEEP_ALWAYS = ('default.jpg',)
+
+
+class Command(BaseCommand):
+    help = '删除没有被任何用户引用的头像文件（含其缩略图与残留的临时文件）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=24,
+                            help='最近修改过的文件不删除（已上传但尚未保存到用户的头像），默认24小时')
+        parser.add_argument('--dry-run', action='store_true', help='只列出待删除的文件')
+
+    def handle(self, *args, **options):
+        storage = get_avatar_storage()
+        sizes = get_avatar_config()['SIZES']
+        deadline = time.time() - options['grace_hours'] * 3600
+
+        # 先列文件再查引用：扫描期间新上传并保存的头像修改时间在宽限期内，不会被误删
+        files = {}
+        for name, fullPath in storage.listdir():
+            try:
+                mtime = os.stat(fullPath).st_mtime
+            except FileNotFoundError:
+                continue
+            # 重复上传只刷新标记，不改文件的修改时间
+            files[name] = fullPath, max(mtime, storage.touched_at(name) or 0)
+        referenced = set(KEEP_ALWAYS)
+        referenced.update(SysUser.objects.exclude(avatar__isnull=True).exclude(avatar='')
+                          .values_list('avatar', flat=True).distinct().iterator())
+
+        keep = {name for name, (_, mtime) in files.items() if name in referenced or mtime > deadline}
+        keep.update({variant_name(name, size) for name in list(keep) for size in sizes})
+
+        garbage = sorted(set(files) - keep)
+        if options['dry_run']:
+            for name in garbage:
+                self.stdout.write(name)
+            self.stdout.write(self.style.SUCCESS(f'共 {len(files)} 个文件，待删除 {len(garbage)} 个'))
+            return
+        freed = 0
+        for name in garbage:
+            try:
+                freed += os.path.getsize(files[name][0])
+            except OSError:
+                pass
+            storage.delete(name)
+        storage.prune_markers(deadline)
+        storage.remove_empty_dirs()
+        self.stdout.write(self.style.SUCCESS(
+            f'共 {len(files)} 个文件，已删除 {len(garbage)} 个，释放 {freed // 1024} KB'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from user.avatars import ALLOWED_SUFFIXES, generate_variants, get_avatar_config, get_avatar_storage, variant_name
+
+
+class Command(BaseCommand):
+    help = '为已有头像补生成缩略图（默认跳过已生成的）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='重新生成全部缩略图')
+
+    def handle(self, *args, **options):
+        sizes = get_avatar_config()['SIZES']
+        names = {name for name, _ in get_avatar_storage().listdir() if name.lower().endswith(ALLOWED_SUFFIXES)}
+        variants = {variant_name(name, size) for name in names for size in sizes}
+        done = 0
+        for name in sorted(names - variants):
+            if not options['force'] and all(variant_name(name, size) in names for size in sizes):
+                continue
+            try:
+                generate_variants(name)
+                done += 1
+            except Exception as e:
+                self.stderr.write(f'{name} 处理失败：{e}')
+        self.stdout.write(self.style.SUCCESS(f'已生成 {done} 个头像的缩略图'))
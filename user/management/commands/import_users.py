@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from user.importer import UserImporter, iter_rows
+
+
+class Command(BaseCommand):
+    help = '从CSV（首行为表头）或NDJSON文件批量导入用户'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='导入文件路径')
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help='缺省时按扩展名判断')
+        parser.add_argument('--batch-size', type=int, help='每批写入行数')
+        parser.add_argument('--workers', type=int, help='密码哈希进程数')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+
+        def progress(importer):
+            self.stdout.write(f'已导入 {importer.created} 行，失败 {importer.failed} 行')
+
+        try:
+            with open(path, 'rb') as f, \
+                    UserImporter(options['batch_size'], options['workers']) as importer:
+                importer.run(iter_rows(f, fmt), progress)
+        except OSError as e:
+            raise CommandError(f'无法读取文件：{e}')
+        for error in importer.errors:
+            self.stderr.write(f"第{error['row']}行 {error['username'] or ''}：{error['info']}")
+        if importer.failed > len(importer.errors):
+            self.stderr.write(f'……其余 {importer.failed - len(importer.errors)} 条错误未显示')
+        self.stdout.write(self.style.SUCCESS(f'导入完成：成功 {importer.created} 行，失败 {importer.failed} 行'))
@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from user.revocation import get_revocation_config, prune_revocations
+
+
+class Command(BaseCommand):
+    help = '清理过期的Token吊销记录（被吊销的Token均已过期，记录不再需要）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, default=None,
+                            help='保留最近多少小时的记录，默认取TOKEN_REVOCATION的RETENTION（即refresh token有效期）')
+
+    def handle(self, *args, **options):
+        retention = get_revocation_config()['RETENTION']
+        if options['hours'] is not None:
+            retention = max(retention, timedelta(hours=options['hours']))
+            if retention > timedelta(hours=options['hours']):
+                self.stderr.write(f'保留时长不能短于refresh token有效期，按 {retention} 处理')
+        count = prune_revocations(retention)
+        self.stdout.write(self.style.SUCCESS(f'已删除 {count} 条过期的吊销记录'))
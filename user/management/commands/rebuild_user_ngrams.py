@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from user.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = '回填/重建用户检索三元组索引（sys_user_ngram）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='每批处理的用户数')
+
+    def handle(self, *args, **options):
+        total = rebuild_index(options['batch_size'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'索引重建完成，共 {total} 个用户'))
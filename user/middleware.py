@@ -1,18 +1,79 @@
 # user/middleware.py（适配 rest_framework_simplejwt，贴合文档鉴权目的）
-from django.http import JsonResponse
+import hashlib
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.utils.deprecation import MiddlewareMixin
 from rest_framework_simplejwt.tokens import AccessToken
 # 引用 rest_framework_simplejwt 顶层异常类（所有 Token 相关异常均继承自此类）
 from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+from python222.fastjson import JsonResponse
+from python222.lru import LRUCache
+from .revocation import get_revocations, is_revoked
+
+# 白名单默认值（登录、刷新Token接口+媒体路径不验证），可在settings中通过 JWT_WHITE_LIST / JWT_WHITE_PREFIXES 覆盖
+DEFAULT_WHITE_LIST = ["/user/login", "/user/refresh"]
+DEFAULT_WHITE_PREFIXES = ["/media"]
+
+
+class PathMatcher:
+    """启动时编译的白名单匹配器：精确路径用集合查找，前缀用一次 str.startswith(tuple)"""
+
+    def __init__(self, exact, prefixes):
+        self.exact = frozenset(exact)
+        self.prefixes = tuple(prefixes)
+
+    def __call__(self, path):
+        return path in self.exact or (bool(self.prefixes) and path.startswith(self.prefixes))
+
+
+class VerifiedTokenCache:
+    """已验签Token的有界LRU缓存，以Token摘要为键，条目在Token的exp时刻过期"""
+
+    def __init__(self, max_size):
+        self._cache = LRUCache(max_size)
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    def get(self, token):
+        return self._cache.get(self._key(token))
+
+    def set(self, token, claims):
+        ttl = claims.get('exp', 0) - time.time()
+        if ttl > 0:
+            self._cache.set(self._key(token), claims, ttl)
 
 
 class JwtAuthenticationMiddleware(MiddlewareMixin):
+    def __init__(self, get_response=None):
+        super().__init__(get_response)
+        self.is_white_listed = PathMatcher(getattr(settings, 'JWT_WHITE_LIST', DEFAULT_WHITE_LIST),
+                                           getattr(settings, 'JWT_WHITE_PREFIXES', DEFAULT_WHITE_PREFIXES))
+        self.token_cache = VerifiedTokenCache(getattr(settings, 'JWT_TOKEN_CACHE_SIZE', 10000))
+
+    async def __acall__(self, request):
+        # 异步链路：authenticate只做内存缓存查找与HMAC验签，没有阻塞IO，
+        # 直接在事件循环中执行，省去MiddlewareMixin默认的sync_to_async线程切换；
+        # 只有吊销快照到期需要同步时（每 REFRESH_INTERVAL 秒一次）才切到线程中查库
+        if get_revocations().is_stale():
+            await sync_to_async(get_revocations().refresh)()
+        response = self.authenticate(request)
+        return response or await self.get_response(request)
+
     def process_request(self, request):
+        get_revocations().refresh()
+        return self.authenticate(request)
+
+    def authenticate(self, request):
         # 1. 完全保留文档🔶1-346 白名单逻辑（登录接口+媒体路径不验证）
-        white_list = ["/user/login"]
         path = request.path
 
-        if path not in white_list and not path.startswith("/media"):
+        if not self.is_white_listed(path):
             print("要进行token验证")
             # 2. 保留文档🔶1-177 兼容 "Bearer Token" 格式的逻辑
             token = request.META.get('HTTP_AUTHORIZATION', '')
@@ -23,14 +84,25 @@ class JwtAuthenticationMiddleware(MiddlewareMixin):
             if not token:
                 return JsonResponse({'code': 401, 'info': '请先登录获取token！'}, status=401)
 
-            try:
-                # 4. 保留文档「验证 Token 有效性」的核心逻辑（用 AccessToken 替代文档的 jwt_decode_handler）
-                AccessToken(token)
-            except TokenError as e:
-                # 5. 按文档🔶1-346 错误提示格式，区分 Token 过期与无效
-                if "expired" in str(e).lower():
-                    return JsonResponse({'code': 401, 'info': 'Token过期，请重新登录！'}, status=401)
-                else:
-                    return JsonResponse({'code': 401, 'info': 'Token验证失败！'}, status=401)
+            claims = self.token_cache.get(token)
+            if claims is None:
+                try:
+                    # 4. 保留文档「验证 Token 有效性」的核心逻辑（用 AccessToken 替代文档的 jwt_decode_handler）
+                    claims = AccessToken(token).payload
+                except TokenError as e:
+                    # 5. 按文档🔶1-346 错误提示格式，区分 Token 过期与无效
+                    if "expired" in str(e).lower():
+                        return JsonResponse({'code': 401, 'info': 'Token过期，请重新登录！'}, status=401)
+                    else:
+                        return JsonResponse({'code': 401, 'info': 'Token验证失败！'}, status=401)
+                self.token_cache.set(token, claims)
+
+            # 修改状态、改密等操作会吊销用户已签发的Token（见 user/revocation.py），这里只做内存快照查找
+            if is_revoked(claims):
+                return JsonResponse({'code': 401, 'info': 'Token已失效，请重新登录！'}, status=401)
+
+            # 6. 解析结果挂到request上，下游视图无需再次解析Authorization头
+            request.jwt_claims = claims
+            request.jwt_user_id = claims.get(api_settings.USER_ID_CLAIM)
         else:
-            print("不进行token验证")  # 保留文档日志逻辑
\ No newline at end of file
+            print("不进行token验证")  # 保留文档日志逻辑
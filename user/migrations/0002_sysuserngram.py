@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SysUserNgram',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('field', models.CharField(max_length=20, verbose_name='字段名')),
+                ('gram', models.CharField(max_length=3, verbose_name='三元组')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='user.sysuser')),
+            ],
+            options={
+                'db_table': 'sys_user_ngram',
+                'indexes': [models.Index(fields=['field', 'gram', 'user'], name='sys_user_ngram_lookup')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0002_sysuserngram'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SysTokenRevocation',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('user_id', models.IntegerField(verbose_name='用户id')),
+                ('reason', models.CharField(max_length=20, verbose_name='吊销原因')),
+                ('create_time', models.DateTimeField(db_index=True, verbose_name='吊销时间')),
+            ],
+            options={
+                'db_table': 'sys_token_revocation',
+            },
+        ),
+    ]
@@ -4,6 +4,8 @@ from django.db import models
 # 正确写法：从 rest_framework 导入 ModelSerializer
 from rest_framework.serializers import ModelSerializer
 
+from python222.dictbuilder import DictBuilder
+
 
 # Create your models here.
 
@@ -23,6 +25,27 @@ class SysUser(models.Model):
     class Meta:
      db_table = "sys_user"
 
+# 用户检索用的三元组（trigram）索引表，由 user/search.py 维护
+class SysUserNgram(models.Model):
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(SysUser, on_delete=models.CASCADE)
+    field = models.CharField(max_length=20, verbose_name="字段名")
+    gram = models.CharField(max_length=3, verbose_name="三元组")
+
+    class Meta:
+        db_table = "sys_user_ngram"
+        indexes = [models.Index(fields=['field', 'gram', 'user'], name='sys_user_ngram_lookup')]
+
+# Token吊销记录，由 user/revocation.py 维护：id即吊销版本号，用户最新吊销id大于Token的tv声明时Token失效
+class SysTokenRevocation(models.Model):
+    id = models.BigAutoField(primary_key=True)
+    user_id = models.IntegerField(verbose_name="用户id")  # 不建外键：删除用户时吊销记录需保留
+    reason = models.CharField(max_length=20, verbose_name="吊销原因")
+    create_time = models.DateTimeField(db_index=True, verbose_name="吊销时间")
+
+    class Meta:
+        db_table = "sys_token_revocation"
+
 # 序列化类（修正导入后正常使用）
 class SysUserSerializer(ModelSerializer):
     class Meta:
@@ -30,3 +53,5 @@ class SysUserSerializer(ModelSerializer):
         fields = '__all__'  # 或指定需要的字段，如 ['id', 'username', 'email']
 
 
+# 预编译的SysUser转字典函数，输出与 SysUserSerializer(user).data 相同
+buildUserDict = DictBuilder(SysUserSerializer)
@@ -0,0 +1,148 @@
+# user/revocation.py（Token吊销：按用户的吊销版本号使已签发的Token失效）
+# 修改用户状态、修改/重置密码、删除用户时向 sys_token_revocation 写一行，行id即该用户新的吊销版本号。
+# 签发Token时写入 tv 声明 = 当时全表最大吊销id；用户最新吊销id大于Token的tv即视为已吊销。
+# 每个进程在内存中保存 用户id -> 最新吊销id 的快照，每 REFRESH_INTERVAL 秒按id水位增量同步一次，
+# 因此中间件对每个请求只做一次字典查找；本进程发起的吊销在事务提交后立即生效，其它进程最迟延迟一个刷新间隔。
+# 吊销记录只需保留到被吊销的Token全部过期为止，过期记录由 python manage.py prune_token_revocations 清理。
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import router, transaction
+from django.db.models import Max
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import SysTokenRevocation
+
+DEFAULT_TOKEN_REVOCATION = {
+    'REFRESH_INTERVAL': 2,  # 快照增量同步间隔（秒），即其它进程发起的吊销最长生效延迟
+    'RETENTION': None,  # 吊销记录保留时长（timedelta），None表示取 REFRESH_TOKEN_LIFETIME
+}
+# 增量同步时回看的id数：并发事务的自增id可能乱序提交，水位前的少量id需重新读取
+REFRESH_OVERLAP = 100
+BATCH_SIZE = 1000
+
+REASON_STATUS = 'status'
+REASON_PASSWORD = 'password'
+REASON_DELETED = 'deleted'
+
+
+def get_revocation_config():
+    conf = {**DEFAULT_TOKEN_REVOCATION, **getattr(settings, 'TOKEN_REVOCATION', {})}
+    if conf['RETENTION'] is None:
+        conf['RETENTION'] = api_settings.REFRESH_TOKEN_LIFETIME
+    return conf
+
+
+def _manager():
+    # 吊销记录始终读写主库：从库延迟会让刚吊销的Token继续可用，或让新签发的tv偏小而被误判吊销
+    return SysTokenRevocation.objects.db_manager(router.db_for_write(SysTokenRevocation))
+
+
+class RevocationSnapshot:
+    """进程内的 用户id -> 最新吊销id 快照"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._latest = {}
+        self._lastId = 0
+        self._loadedAt = None
+        self._lock = threading.Lock()
+
+    def is_stale(self):
+        return self._loadedAt is None or time.monotonic() - self._loadedAt >= self.interval
+
+    def refresh(self, force=False):
+        """到期时同步快照：首次按用户分组加载全表，之后只读取水位之后的新记录"""
+        if not force and not self.is_stale():
+            return
+        with self._lock:
+            if not force and not self.is_stale():
+                return
+            if self._loadedAt is None:
+                rows = _manager().values('user_id').annotate(latest=Max('id')).values_list('user_id', 'latest')
+            else:
+                rows = _manager().filter(id__gt=self._lastId - REFRESH_OVERLAP).values_list('user_id', 'id')
+            latest = self._latest
+            for userId, revocationId in rows:
+                if revocationId > latest.get(userId, 0):
+                    latest[userId] = revocationId
+                if revocationId > self._lastId:
+                    self._lastId = revocationId
+            self._loadedAt = time.monotonic()
+
+    def is_revoked(self, user_id, token_version):
+        """token_version为Token的tv声明；没有tv的旧Token按0处理"""
+        return self._latest.get(user_id, 0) > (token_version or 0)
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def get_revocations():
+    global _snapshot
+    with _snapshot_lock:
+        if _snapshot is None:
+            _snapshot = RevocationSnapshot(get_revocation_config()['REFRESH_INTERVAL'])
+        return _snapshot
+
+
+def _reset(**kwargs):
+    global _snapshot
+    if kwargs['setting'] in ('TOKEN_REVOCATION', 'SIMPLE_JWT'):
+        with _snapshot_lock:
+            _snapshot = None
+
+
+setting_changed.connect(_reset)
+
+
+def current_token_version():
+    """签发Token时写入的tv：当前最大吊销id（在此之前的吊销不影响新Token）"""
+    return _manager().aggregate(latest=Max('id'))['latest'] or 0
+
+
+def is_revoked(claims):
+    # simplejwt把用户id以字符串写入Token，快照以整数id为键
+    try:
+        userId = int(claims.get(api_settings.USER_ID_CLAIM))
+    except (TypeError, ValueError):
+        return False
+    return get_revocations().is_revoked(userId, claims.get('tv'))
+
+
+def revoke_user_tokens(user_ids, reason):
+    """
+    吊销用户已签发的全部Token（每个用户一行），在调用方事务提交后刷新本进程快照
+    :return: 吊销的用户数
+    """
+    userIds = list(dict.fromkeys(int(userId) for userId in user_ids))
+    if not userIds:
+        return 0
+    now = timezone.now()
+    _manager().bulk_create([SysTokenRevocation(user_id=userId, reason=reason, create_time=now)
+                            for userId in userIds], batch_size=BATCH_SIZE)
+    transaction.on_commit(lambda: get_revocations().refresh(force=True),
+                          using=router.db_for_write(SysTokenRevocation))
+    return len(userIds)
+
+
+def prune_revocations(retention=None):
+    """
+    删除已超过保留时长的吊销记录（被吊销的Token届时均已过期），返回删除的行数
+    最新的一行始终保留：签发Token的tv取全表最大id，删空后tv会回落，
+    运行中的进程快照仍保存着旧的吊销id，会把新签发的Token误判为已吊销
+    """
+    retention = retention if retention is not None else get_revocation_config()['RETENTION']
+    deadline = timezone.now() - retention
+    newestId = current_token_version()
+    count = 0
+    while True:
+        ids = list(_manager().filter(create_time__lt=deadline, id__lt=newestId).order_by('id')
+                   .values_list('id', flat=True)[:BATCH_SIZE])
+        if not ids:
+            return count
+        count += _manager().filter(id__in=ids).delete()[0]
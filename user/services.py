@@ -0,0 +1,127 @@
+# user/services.py（用户相关的批量查询与批量写入）
+from collections import defaultdict
+
+from django.db import transaction
+
+from menu.cache import get_menu_cache
+from menu.services import MENU_STICKY_KEY
+from python222.db_router import mark_written
+from role.models import SysRole, SysUserRole
+from .models import SysUser
+
+# 批量更新时每条UPDATE语句携带的最大id数，避免IN列表过长
+UPDATE_CHUNK_SIZE = 1000
+
+
+def _role_rows(userIds):
+    return SysUserRole.objects.filter(user_id__in=userIds) \
+        .order_by('role_id').values_list('user_id', 'role_id', 'role__name')
+
+
+def load_role_lists(userIds):
+    """
+    一次IN查询取出一批用户的角色
+    :param userIds: 用户id列表
+    :return: user_id -> [{'id': 角色id, 'name': 角色名称}]
+    """
+    roleLists = defaultdict(list)
+    if not userIds:
+        return roleLists
+    for userId, roleId, roleName in _role_rows(userIds):
+        roleLists[userId].append({'id': roleId, 'name': roleName})
+    return roleLists
+
+
+async def aload_role_lists(userIds):
+    """load_role_lists 的异步版本"""
+    roleLists = defaultdict(list)
+    if not userIds:
+        return roleLists
+    async for userId, roleId, roleName in _role_rows(userIds):
+        roleLists[userId].append({'id': roleId, 'name': roleName})
+    return roleLists
+
+
+def bulk_update_users(userIds, **fields):
+    """
+    按id分块执行 UPDATE ... WHERE id IN (...)，不逐行读取和保存
+    :return: 受影响的行数
+    """
+    userIds = list(dict.fromkeys(userIds))
+    count = 0
+    for i in range(0, len(userIds), UPDATE_CHUNK_SIZE):
+        count += SysUser.objects.filter(id__in=userIds[i:i + UPDATE_CHUNK_SIZE]).update(**fields)
+    return count
+
+
+class InvalidAssignment(ValueError):
+    pass
+
+
+def _chunks(ids):
+    for i in range(0, len(ids), UPDATE_CHUNK_SIZE):
+        yield ids[i:i + UPDATE_CHUNK_SIZE]
+
+
+def lock_changed_users(userIds, **fields):
+    """
+    在事务中加行锁取出字段值与目标值不同的用户id，已是目标值或不存在的id不返回
+    （供批量修改前筛选，避免对未变化的用户吊销Token）
+    """
+    changedIds = []
+    for chunk in _chunks(list(dict.fromkeys(userIds))):
+        changedIds.extend(SysUser.objects.select_for_update().filter(id__in=chunk)
+                          .exclude(**fields).order_by('id').values_list('id', flat=True))
+    return changedIds
+
+
+def assign_roles(assignments):
+    """
+    批量分配角色：与现有关联做差集，在一个事务中一次bulk_create新增、按id过滤批量删除
+    （id过多时按 UPDATE_CHUNK_SIZE 分块），不逐行删除重建
+    :param assignments: user_id -> 目标角色id集合（空集合表示清空该用户的角色）
+    :return: (新增的关联数, 删除的关联数)
+    """
+    userIds = list(assignments)
+    roleIds = {roleId for targetIds in assignments.values() for roleId in targetIds}
+    with transaction.atomic():
+        # 锁定用户行：同一用户的并发分配串行执行，避免重复插入同一关联；同时校验用户存在
+        found = set()
+        for chunk in _chunks(userIds):
+            found.update(SysUser.objects.select_for_update().filter(id__in=chunk).values_list('id', flat=True))
+        if len(found) != len(userIds):
+            raise InvalidAssignment(f'用户不存在：{sorted(set(userIds) - found)}')
+        missingRoles = roleIds - set(SysRole.objects.filter(id__in=roleIds).values_list('id', flat=True))
+        if missingRoles:
+            raise InvalidAssignment(f'角色不存在：{sorted(missingRoles)}')
+
+        current = defaultdict(dict)  # user_id -> {role_id: 关联行id}
+        for chunk in _chunks(userIds):
+            for rowId, userId, roleId in SysUserRole.objects.filter(user_id__in=chunk) \
+                    .values_list('id', 'user_id', 'role_id'):
+                current[userId][roleId] = rowId
+
+        toCreate, toDelete, changedUsers = [], [], set()
+        for userId, targetIds in assignments.items():
+            existing = current[userId]
+            added = [roleId for roleId in targetIds if roleId not in existing]
+            removed = [rowId for roleId, rowId in existing.items() if roleId not in targetIds]
+            toCreate.extend(SysUserRole(user_id=userId, role_id=roleId) for roleId in added)
+            toDelete.extend(removed)
+            if added or removed:
+                changedUsers.add(userId)
+
+        SysUserRole.objects.bulk_create(toCreate, batch_size=UPDATE_CHUNK_SIZE)
+        deleted = 0
+        for chunk in _chunks(toDelete):
+            # 走公开的delete()：post_delete接收者（menu/signals.py）照常触发，
+            # bulk_create不触发信号，新增关联的缓存失效在下面统一处理
+            deleted += SysUserRole.objects.filter(id__in=chunk).delete()[0]
+
+        def invalidate():
+            mark_written(MENU_STICKY_KEY)
+            menuCache = get_menu_cache()  # 各命名空间共享版本号，权限、Token角色缓存一并失效
+            for userId in changedUsers:
+                menuCache.invalidate_user(userId)
+        transaction.on_commit(invalidate)
+    return len(toCreate), deleted
@@ -0,0 +1,25 @@
+# user/signals.py（用户数据变化时维护派生数据）
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .bloom import get_username_filter
+from .models import SysUser
+from .search import INDEXED_FIELDS, index_user
+
+
+@receiver(post_save, sender=SysUser)
+def update_search_index(sender, instance, raw=False, using=None, update_fields=None, **kwargs):
+    # 删除用户时索引行随外键级联删除，这里只处理新增与修改
+    if raw:
+        return
+    if update_fields is not None and not set(update_fields) & set(INDEXED_FIELDS):
+        return
+    index_user(instance, using)
+
+
+@receiver(post_save, sender=SysUser)
+def update_username_filter(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    # 布隆过滤器不支持删除，删除用户与改名后的旧用户名由定期全量重建清理
+    if raw or (update_fields is not None and 'username' not in update_fields):
+        return
+    get_username_filter().add(instance.username, instance.id if created else None)
@@ -0,0 +1,122 @@
+# user/storage.py（按内容哈希寻址的分片文件存储）
+# 文件名取内容的sha256，按哈希前缀分到多级子目录（如 "ab/cd/abcd...ef.jpg"），
+# 相同内容只存一份；写入先落临时文件再原子重命名，读取方不会看到写了一半的文件。
+# 重复上传已存在的内容时不改动文件本身（修改时间参与ETag/Last-Modified），
+# 而是在 .recent/ 下刷新同名的空标记文件，供垃圾回收判断宽限期。
+import hashlib
+import os
+import tempfile
+
+TMP_SUFFIX = '.tmp'
+MARKER_DIR = '.recent'
+
+
+def atomic_write(path, write):
+    """
+    在目标目录中创建临时文件，调用 write(fileobj) 写入后原子替换为 path
+    临时文件与目标在同一文件系统，os.replace 保证原子性
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.', suffix=TMP_SUFFIX)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+class ContentAddressedStorage:
+    """
+    :param root: 存储根目录
+    :param depth: 分片目录层数
+    :param width: 每层目录名取哈希的字符数（depth=2, width=2 时每层256个目录）
+    """
+
+    def __init__(self, root, depth=2, width=2):
+        self.root = str(root)
+        self.depth = depth
+        self.width = width
+
+    def name_for(self, digest, suffix):
+        shards = [digest[i * self.width:(i + 1) * self.width] for i in range(self.depth)]
+        return '/'.join(shards + [digest + suffix])
+
+    def path(self, name):
+        return os.path.join(self.root, *name.split('/'))
+
+    def exists(self, name):
+        return os.path.exists(self.path(name))
+
+    def _marker_path(self, name):
+        return os.path.join(self.root, MARKER_DIR, *name.split('/'))
+
+    def touch(self, name):
+        """记录文件刚被使用（不改动文件本身）"""
+        marker = self._marker_path(name)
+        os.makedirs(os.path.dirname(marker), exist_ok=True)
+        with open(marker, 'a'):
+            pass
+        os.utime(marker)
+
+    def touched_at(self, name):
+        """最近一次 touch 的时间，没有记录时返回None"""
+        try:
+            return os.stat(self._marker_path(name)).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def save(self, data, suffix):
+        """
+        保存内容，返回 (文件名, 是否新写入)
+        内容已存在时不重复写，只刷新标记，避免刚被引用的文件在宽限期内被垃圾回收
+        """
+        name = self.name_for(hashlib.sha256(data).hexdigest(), suffix)
+        path = self.path(name)
+        if os.path.exists(path):
+            self.touch(name)
+            if os.path.exists(path):
+                return name, False
+            # 恰好被垃圾回收删除，重新写入
+        atomic_write(path, lambda f: f.write(data))
+        return name, True
+
+    def delete(self, name):
+        for path in (self.path(name), self._marker_path(name)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def prune_markers(self, deadline):
+        """删除早于deadline的标记（宽限期已过，不再起作用）"""
+        for dirpath, _, filenames in os.walk(os.path.join(self.root, MARKER_DIR)):
+            for filename in filenames:
+                marker = os.path.join(dirpath, filename)
+                try:
+                    if os.stat(marker).st_mtime < deadline:
+                        os.remove(marker)
+                except FileNotFoundError:
+                    pass
+
+    def listdir(self):
+        """遍历存储中的所有文件，生成 (相对文件名, 完整路径)；包含未分片的旧文件与残留的临时文件，不含标记"""
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            if dirpath == self.root and MARKER_DIR in dirnames:
+                dirnames.remove(MARKER_DIR)
+            for filename in filenames:
+                fullPath = os.path.join(dirpath, filename)
+                yield os.path.relpath(fullPath, self.root).replace(os.sep, '/'), fullPath
+
+    def remove_empty_dirs(self):
+        for dirpath, dirnames, filenames in os.walk(self.root, topdown=False):
+            if dirpath != self.root and not os.listdir(dirpath):
+                try:
+                    os.rmdir(dirpath)
+                except OSError:
+                    pass
@@ -1,3 +1,877 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.signals import request_started
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import Http404, HttpResponse
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from menu.cache import get_menu_cache
+from menu.models import SysMenu, SysRoleMenu
+from role.models import SysRole, SysUserRole
+from . import avatars
+from .avatars import InvalidImage, avatar_path, resolve_avatar, store_avatar, variant_name
+from .storage import atomic_write
+from .exporter import EXPORT_FIELDS, astream_users, stream_users
+from .bloom import (WARMUP_DISPATCH_UID, UsernameFilter, get_username_filter_config, username_exists,
+                    warm_on_first_request)
+from .importer import UserImporter
+from .middleware import JwtAuthenticationMiddleware, PathMatcher, VerifiedTokenCache
+from .hashing import BulkPasswordHasher, HashingOverloaded, PasswordHashingService, make_password
+from .models import SysTokenRevocation, SysUser
+from .revocation import (REASON_PASSWORD, REASON_STATUS, RevocationSnapshot, get_revocations, is_revoked,
+                         prune_revocations, revoke_user_tokens)
+from .tokens import issue_tokens, refresh_tokens
+from python222.db_router import mark_written
+from python222.media import serve_media
+from python222 import metrics
+from python222.metrics import MetricsMiddleware, MetricsRegistry, MultiProcessStore, merge_snapshots, render_prometheus
+from .views import AssignRolesView, BatchStatusView, CheckView, ImportView, LoginView, PasswordView, SearchView, TestView
+
+
+class SearchViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.roles = [SysRole.objects.create(name=f'角色{i}', code=f'role{i}') for i in range(3)]
+        for i in range(60):
+            user = SysUser.objects.create(username=f'user{i:03d}', password='x')
+            for role in cls.roles[:i % 3 + 1]:
+                SysUserRole.objects.create(user=user, role=role)
+
+    def search(self, **data):
+        request = RequestFactory().post('/user/search', data=json.dumps(data), content_type='application/json')
+        return json.loads(async_to_sync(SearchView.as_view())(request).content)
+
+    def test_role_list(self):
+        result = self.search(pageNum=1, pageSize=3, query='')
+        self.assertEqual(result['total'], 60)
+        self.assertEqual([user['username'] for user in result['userList']], ['user000', 'user001', 'user002'])
+        self.assertEqual([len(user['roleList']) for user in result['userList']], [1, 2, 3])
+        self.assertEqual(result['userList'][2]['roleList'][0], {'id': self.roles[0].id, 'name': '角色0'})
+
+    def test_query_count_independent_of_page_size(self):
+        # COUNT + 分页查询 + 角色批量查询
+        for pageSize in (5, 50):
+            with self.assertNumQueries(3):
+                result = self.search(pageNum=1, pageSize=pageSize, query='user')
+            self.assertEqual(len(result['userList']), pageSize)
+
+    def test_invalid_page_size(self):
+        self.assertEqual(self.search(pageNum=1, pageSize='2', query='')['userList'][1]['username'], 'user001')
+        for pageSize in (0, -5, 'abc', None):
+            self.assertEqual(self.search(pageNum=1, pageSize=pageSize, query='')['code'], 400)
+        self.assertEqual(self.search(pageSize=0, query='', cursor='')['code'], 400)
+        for pageNum in (0, 'abc', None):
+            self.assertEqual(self.search(pageNum=pageNum, pageSize=2, query='')['code'], 400)
+        self.assertEqual(self.search(pageSize=2, query='')['code'], 400)
+
+    def test_cursor_pagination(self):
+        # 部分用户create_time为空，验证 (create_time, id) 排序下的翻页不重不漏
+        SysUser.objects.filter(id__in=SysUser.objects.order_by('id').values('id')[:20]) \
+            .update(create_time='2024-01-02')
+        SysUser.objects.filter(username__endswith='5').update(create_time='2024-01-01')
+        for orderBy in ('id', 'create_time'):
+            seen, cursor = [], ''
+            while True:
+                result = self.search(pageSize=7, query='user', cursor=cursor, orderBy=orderBy)
+                self.assertNotIn('total', result)
+                seen += [user['id'] for user in result['userList']]
+                cursor = result['nextCursor']
+                if cursor is None:
+                    break
+            self.assertEqual(sorted(seen), sorted(SysUser.objects.values_list('id', flat=True)))
+            self.assertEqual(len(seen), len(set(seen)))
+
+    def test_invalid_cursor(self):
+        result = self.search(pageSize=5, query='', cursor='not-a-cursor')
+        self.assertEqual(result['code'], 400)
+
+    def test_trigram_search(self):
+        SysUser.objects.create(username='ZhangSan', password='x', email='zs@example.com', phonenumber='13812345678')
+        self.assertEqual([user['username'] for user in self.search(pageNum=1, pageSize=10, query='gsa')['userList']],
+                         ['ZhangSan'])
+        # 三元组都命中但不连续时不应返回
+        self.assertEqual(self.search(pageNum=1, pageSize=10, query='zhansan')['total'], 0)
+        result = self.search(pageNum=1, pageSize=10, query='2345', searchFields=['phonenumber'])
+        self.assertEqual([user['username'] for user in result['userList']], ['ZhangSan'])
+        # 修改后索引同步更新
+        user = SysUser.objects.get(username='ZhangSan')
+        user.username = 'LiSi'
+        user.save()
+        self.assertEqual(self.search(pageNum=1, pageSize=10, query='gsa')['total'], 0)
+        self.assertEqual(self.search(pageNum=1, pageSize=10, query='isi')['total'], 1)
+
+
+class BatchUpdateTest(TestCase):
+    def test_bulk_update_users_chunks(self):
+        from . import services
+        ids = [SysUser.objects.create(username=f'u{i}', password='x', status=0).id for i in range(5)]
+        services.UPDATE_CHUNK_SIZE, old = 2, services.UPDATE_CHUNK_SIZE
+        try:
+            # 5个id分3块，每块一条UPDATE；重复id只计一次
+            with self.assertNumQueries(3):
+                count = services.bulk_update_users(ids + ids[:1] + [999999], status=1)
+        finally:
+            services.UPDATE_CHUNK_SIZE = old
+        self.assertEqual(count, 5)
+        self.assertEqual(SysUser.objects.filter(status=1).count(), 5)
+
+
+    def test_batch_status_revokes_changed_users_only(self):
+        active = SysUser.objects.create(username='active', password='x', status=1)
+        disabled = SysUser.objects.create(username='disabled', password='x', status=0)
+        request = RequestFactory().post('/user/batchStatus', content_type='application/json',
+                                        data=json.dumps({'ids': [active.id, disabled.id, 999999], 'status': 1}))
+        result = json.loads(BatchStatusView.as_view()(request).content)
+        self.assertEqual((result['code'], result['count']), (200, 1))
+        self.assertEqual(list(SysTokenRevocation.objects.values_list('user_id', flat=True)), [disabled.id])
+        self.assertEqual(SysUser.objects.get(id=disabled.id).status, 1)
+
+
+class UsernameFilterTest(TestCase):
+    def setUp(self):
+        # 每个测试使用新的持久化文件与过滤器实例；测试事务中的数据对后台线程不可见，改为同步加载
+        path = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), 'username_bloom.bin')
+        self.enterContext(override_settings(USERNAME_FILTER={'PATH': path, 'WARM_IN_BACKGROUND': False}))
+        SysUser.objects.create(username='Admin', password='x')
+
+    def test_definite_negative_skips_database(self):
+        self.assertTrue(username_exists('Admin'))  # 首次调用加载过滤器
+        with self.assertNumQueries(0):
+            self.assertFalse(username_exists('nobody'))
+        with self.assertNumQueries(1):
+            self.assertTrue(username_exists('Admin'))
+
+    def test_new_username_added_on_save(self):
+        self.assertFalse(username_exists('newcomer'))
+        SysUser.objects.create(username='newcomer', password='x')
+        self.assertTrue(username_exists('newcomer'))
+
+    def test_persisted_file_reused(self):
+        username_exists('Admin')
+        SysUser.objects.create(username='later', password='x')
+        # 新进程：加载文件后只按id水位补齐新增用户
+        filter = UsernameFilter(get_username_filter_config())
+        with self.assertNumQueries(1):
+            self.assertTrue(filter.might_exist('later'))
+        self.assertTrue(filter.might_exist('admin'))
+
+    def test_background_warm_falls_through_until_ready(self):
+        filter = UsernameFilter({**get_username_filter_config(), 'WARM_IN_BACKGROUND': True})
+        with mock.patch('user.bloom.threading.Thread') as thread, self.assertNumQueries(0):
+            # 未就绪时不在请求中构建，按可能存在处理（调用方再查库）
+            self.assertTrue(filter.might_exist('nobody'))
+            self.assertTrue(filter.might_exist('nobody'))
+        self.assertEqual(thread.call_count, 1)
+        with mock.patch('user.bloom.connections'):  # 后台线程结束时关闭自己的连接，这里在测试线程中执行
+            thread.call_args.kwargs['target']()
+        self.assertFalse(filter.might_exist('nobody'))
+
+    def test_warm_started_by_first_request(self):
+        with mock.patch('user.bloom.UsernameFilter.warm_in_background') as warm, \
+                override_settings(USERNAME_FILTER={**get_username_filter_config(), 'WARM_IN_BACKGROUND': True}):
+            request_started.connect(warm_on_first_request, dispatch_uid=WARMUP_DISPATCH_UID)
+            request_started.send(sender=None)
+            request_started.send(sender=None)
+        self.assertEqual(warm.call_count, 1)
+
+
+@override_settings(PASSWORD_HASHING={'MODE': 'inline'},
+                   PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ImportTest(TestCase):
+    def setUp(self):
+        SysUser.objects.create(username='existing', password='x')
+
+    def post(self, body, fmt):
+        request = RequestFactory().post(f'/user/import?format={fmt}', data=body, content_type='text/plain')
+        return json.loads(ImportView.as_view()(request).content)
+
+    def test_ndjson_mixed_rows(self):
+        lines = [
+            {'username': 'ok1', 'phonenumber': 13800000000, 'status': 0},
+            {'username': 12345},
+            {'username': 'badPhone', 'phonenumber': '138000000001'},
+            {'username': 'longEmail', 'email': 'a' * 101},
+            {'username': 'longAvatar', 'avatar': 'a' * 256},
+            {'username': 'longRemark', 'remark': 'a' * 501},
+            {'username': ['x']},
+            {'username': 'badStatus', 'status': 'x'},
+            {'username': 'existing'},
+            {'username': 'ok1'},
+        ]
+        body = '\n'.join(json.dumps(line) for line in lines) + '\nnot json\n'
+        result = self.post(body, 'ndjson')
+        self.assertEqual((result['created'], result['failed']), (2, 9))
+        self.assertEqual([error['row'] for error in result['errors']], [3, 4, 5, 6, 7, 8, 9, 10, 11])
+        self.assertEqual(result['errors'][-2]['info'], '用户名在导入数据中重复')
+        self.assertEqual(SysUser.objects.get(username='ok1').phonenumber, '13800000000')
+        self.assertTrue(SysUser.objects.filter(username='12345').exists())
+
+    def test_csv_duplicate_usernames(self):
+        body = 'username,email\nfresh,a@b.c\nexisting,\nfresh,\n , \n'
+        result = self.post(body, 'csv')
+        self.assertEqual((result['created'], result['failed']), (1, 3))
+        self.assertEqual({error['info'] for error in result['errors']},
+                         {'用户名已存在', '用户名在导入数据中重复', '用户名不能为空'})
+
+
+    def test_concurrent_import_rejected(self):
+        # 另一个导入正占用批量哈希名额
+        with BulkPasswordHasher():
+            response = ImportView.as_view()(RequestFactory().post('/user/import?format=csv', data='username\na\n',
+                                                                  content_type='text/plain'))
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(SysUser.objects.filter(username='a').exists())
+        self.assertEqual(self.post('username\na\n', 'csv')['created'], 1)
+
+    def test_case_insensitive_existing_username(self):
+        # 模拟MySQL不区分大小写的排序规则：IN查询按库中写法返回已存在的用户名
+        body = 'username\nEXISTING\nfresh\nFRESH\n'
+        with mock.patch.object(UserImporter, '_existing_usernames', return_value={'existing'}):
+            result = self.post(body, 'csv')
+        self.assertEqual((result['code'], result['created'], result['failed']), (200, 1, 2))
+        self.assertEqual([(error['username'], error['info']) for error in result['errors']],
+                         [('EXISTING', '用户名已存在'), ('FRESH', '用户名在导入数据中重复')])
+
+
+@override_settings(PASSWORD_HASHING={'MODE': 'inline'},
+                   PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class LoginMenuCacheTest(TestCase):
+    def setUp(self):
+        # 每个用例使用新的进程内菜单缓存
+        self.enterContext(override_settings(MENU_CACHE={'BACKEND': 'locmem'}))
+        self.user = SysUser.objects.create(username='loginUser', password=make_password('pwd'))
+        self.role = SysRole.objects.create(name='管理员', code='admin')
+        SysUserRole.objects.create(user=self.user, role=self.role)
+        self.root = SysMenu.objects.create(name='系统管理', parent_id=0, order_num=1)
+        self.child = SysMenu.objects.create(name='用户管理', parent_id=self.root.id, order_num=1)
+        for menu in (self.root, self.child):
+            SysRoleMenu.objects.create(role=self.role, menu=menu)
+
+    def login(self, password='pwd'):
+        request = RequestFactory().post('/user/login', data=json.dumps({'username': 'loginUser', 'password': password}),
+                                        content_type='application/json')
+        return json.loads(async_to_sync(LoginView.as_view())(request).content)
+
+    def menu_names(self, result):
+        def walk(menus):
+            return [(menu['name'], walk(menu['children'])) for menu in menus]
+        return walk(result['menuList'])
+
+    def test_second_login_hits_cache(self):
+        first = self.login()
+        self.assertEqual((first['code'], first['roles']), (200, '管理员'))
+        self.assertEqual(self.menu_names(first), [('系统管理', [('用户管理', [])])])
+        with CaptureQueriesContext(connection) as queries:
+            second = self.login()
+        # 只剩查询用户与读取吊销版本两条，菜单、角色均来自缓存
+        self.assertEqual(len(queries), 2, [query['sql'] for query in queries])
+        self.assertFalse([query for query in queries if 'sys_menu' in query['sql'] or 'sys_role' in query['sql']
+                          or 'sys_user_role' in query['sql']])
+        self.assertEqual(second['menuList'], first['menuList'])
+        self.assertEqual(self.login('wrong')['code'], 401)
+
+    def payload(self):
+        result = self.login()
+        return result['roles'], result['menuList']
+
+    def assert_invalidated_on_commit(self, change, check):
+        before = self.payload()
+        with self.captureOnCommitCallbacks() as callbacks:
+            change()
+        # 提交前仍返回缓存中的旧数据，提交后失效
+        self.assertEqual(self.payload(), before)
+        for callback in callbacks:
+            callback()
+        check(self.login())
+
+    def test_role_menu_change(self):
+        extra = SysMenu.objects.create(name='日志管理', parent_id=0, order_num=2)
+        self.assert_invalidated_on_commit(
+            lambda: SysRoleMenu.objects.create(role=self.role, menu=extra),
+            lambda result: self.assertEqual(self.menu_names(result),
+                                            [('系统管理', [('用户管理', [])]), ('日志管理', [])]))
+
+    def test_menu_role_and_user_role_changes(self):
+        def rename_menu():
+            self.child.name = '账号管理'
+            self.child.save()
+        self.assert_invalidated_on_commit(
+            rename_menu, lambda result: self.assertEqual(self.menu_names(result), [('系统管理', [('账号管理', [])])]))
+
+        def rename_role():
+            self.role.name = '超级管理员'
+            self.role.save()
+        self.assert_invalidated_on_commit(rename_role, lambda result: self.assertEqual(result['roles'], '超级管理员'))
+        self.assert_invalidated_on_commit(
+            lambda: SysUserRole.objects.filter(user=self.user).delete(),
+            lambda result: self.assertEqual((result['roles'], result['menuList']), ('', [])))
+
+
+class ExportTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.role = SysRole.objects.create(name='导出角色', code='export')
+        cls.users = [SysUser.objects.create(username=f'export{i}', password='secret', email=f'e{i}@x.com', status=i % 2)
+                     for i in range(5)]
+        SysUserRole.objects.create(user=cls.users[1], role=cls.role)
+
+    def test_csv_chunks(self):
+        # 5个用户按每块2个：3块各一次用户查询+一次角色查询，最后一次查询为空时结束
+        with self.assertNumQueries(7):
+            parts = list(stream_users(SysUser.objects.all(), 'csv', chunkSize=2))
+        self.assertEqual(len(parts), 4)  # 表头 + 3块
+        self.assertTrue(parts[0].startswith('\ufeff'))
+        rows = list(csv.reader(''.join(parts).lstrip('\ufeff').splitlines()))
+        self.assertEqual(rows[0], list(EXPORT_FIELDS) + ['roles'])
+        self.assertNotIn('password', rows[0])
+        self.assertEqual([row[1] for row in rows[1:]], [user.username for user in self.users])
+        second = dict(zip(rows[0], rows[2]))
+        self.assertEqual((second['id'], second['email'], second['status'], second['roles']),
+                         (str(self.users[1].id), 'e1@x.com', '1', '导出角色'))
+        self.assertNotIn('secret', ''.join(parts))
+
+    def test_ndjson_async(self):
+        async def collect():
+            return [part async for part in astream_users(SysUser.objects.all(), 'ndjson', chunkSize=3)]
+
+        parts = async_to_sync(collect)()
+        self.assertEqual(len(parts), 2)
+        users = [json.loads(line) for part in parts for line in part.splitlines()]
+        self.assertEqual([user['username'] for user in users], [user.username for user in self.users])
+        self.assertEqual(set(users[0]), set(EXPORT_FIELDS) | {'roleList'})
+        self.assertEqual(users[1]['roleList'], [{'id': self.role.id, 'name': '导出角色'}])
+
+
+class HashingServiceTest(TestCase):
+    def test_max_pending_rejects_immediately(self):
+        service = PasswordHashingService(mode='inline', max_pending=1)
+        started, release = threading.Event(), threading.Event()
+
+        def slow_check(password, encoded):
+            started.set()
+            release.wait(5)
+            return True
+
+        with mock.patch('django.contrib.auth.hashers.check_password', slow_check):
+            worker = threading.Thread(target=service.check_password, args=('a', 'b'))
+            worker.start()
+            started.wait(5)
+            with self.assertRaises(HashingOverloaded):
+                service.check_password('a', 'b')
+            release.set()
+            worker.join()
+        stats = service.stats()['check_password']
+        self.assertEqual((stats['count'], stats['rejected']), (1, 1))
+
+    def test_timeout_counted_and_exported(self):
+        # 进程池首次启动worker远慢于超时时间，调用必然超时
+        service = PasswordHashingService(mode='process', workers=1, timeout=0.001)
+        try:
+            with self.assertRaises(HashingOverloaded):
+                service.check_password('a', 'b')
+        finally:
+            service.shutdown()
+        self.assertEqual(service.stats()['check_password']['timeouts'], 1)
+        with mock.patch('user.hashing._service', service):
+            text = render_prometheus(merge_snapshots([MetricsRegistry().snapshot()] * 2))
+        self.assertIn('password_hashing_timeouts_total{op="check_password"} 2', text)
+
+    def test_overloaded_returns_503(self):
+        request = RequestFactory().get('/user/resetPassword', {'id': SysUser.objects.create(username='h').id})
+        with mock.patch('user.views.make_password', side_effect=HashingOverloaded):
+            response = PasswordView.as_view()(request)
+        self.assertEqual(response.status_code, 503)
+
+
+class RefreshTokenTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = SysUser.objects.create(username='tokenUser', password='x')
+        self.role = SysRole.objects.create(name='普通角色', code='common')
+        self.other = SysRole.objects.create(name='管理员', code='admin')
+        with self.captureOnCommitCallbacks(execute=True):
+            SysUserRole.objects.create(user=self.user, role=self.role)
+
+    def test_refresh_without_role_change_skips_database(self):
+        refresh = issue_tokens(self.user)
+        self.assertEqual(refresh.access_token['roles'], ['common'])
+        get_revocations().refresh(force=True)
+        with self.assertNumQueries(0):
+            access, rotated = refresh_tokens(str(refresh))
+        self.assertEqual(access['roles'], ['common'])
+        self.assertEqual(access['pv'], refresh['pv'])
+
+    def test_refresh_after_role_change_reissues_claims(self):
+        refresh = issue_tokens(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            SysUserRole.objects.create(user=self.user, role=self.other)
+        access, rotated = refresh_tokens(str(refresh))
+        self.assertEqual(access['roles'], ['common', 'admin'])
+        self.assertNotEqual(access['pv'], refresh['pv'])
+
+
+class JwtMiddlewareTest(TestCase):
+    def setUp(self):
+        self.user = SysUser.objects.create(username='jwtUser', password='x')
+        self.token = str(issue_tokens(self.user).access_token)
+        self.middleware = JwtAuthenticationMiddleware(TestView.as_view())
+
+    def get(self, path='/user/test', token=None):
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}
+        return json.loads(self.middleware(RequestFactory().get(path, **headers)).content)
+
+    def test_cached_token_skips_verification(self):
+        with mock.patch('user.middleware.AccessToken', wraps=AccessToken) as verify:
+            self.assertEqual(self.get(token=self.token)['code'], 200)
+            self.assertEqual(self.get(token=self.token)['code'], 200)
+        self.assertEqual(verify.call_count, 1)
+        self.assertEqual(self.get(token=self.token + 'x')['code'], 401)
+        self.assertEqual(self.get()['code'], 401)
+
+    def test_cache_entry_expires_at_exp(self):
+        tokenCache = VerifiedTokenCache(10)
+        now = time.time()
+        with mock.patch('time.time', return_value=now):
+            tokenCache.set('live', {'exp': now + 60})
+            tokenCache.set('expired', {'exp': now - 1})
+            self.assertEqual(tokenCache.get('live'), {'exp': now + 60})
+            self.assertIsNone(tokenCache.get('expired'))
+        with mock.patch('time.time', return_value=now + 60):
+            self.assertIsNone(tokenCache.get('live'))
+
+    def test_white_list(self):
+        matcher = PathMatcher(['/user/login'], ['/media'])
+        self.assertTrue(matcher('/user/login'))
+        self.assertTrue(matcher('/media/userAvatar/a.jpg'))
+        self.assertFalse(matcher('/user/login/extra'))
+        self.assertFalse(matcher('/user/search'))
+        self.assertFalse(PathMatcher(['/user/login'], [])('/media/a.jpg'))
+        # 白名单路径不校验Token，TestView读不到jwt_claims
+        with override_settings(JWT_WHITE_LIST=['/user/test']):
+            self.middleware = JwtAuthenticationMiddleware(TestView.as_view())
+            self.assertEqual(self.get(), {'code': 401, 'info': '没有访问权限，请先登录！'})
+
+    def test_claims_attached_to_request(self):
+        seen = {}
+
+        def view(request):
+            seen['claims'], seen['userId'] = request.jwt_claims, request.jwt_user_id
+            return TestView.as_view()(request)
+
+        self.middleware = JwtAuthenticationMiddleware(view)
+        self.assertEqual(self.get(token=self.token)['code'], 200)
+        self.assertEqual(seen['userId'], str(self.user.id))
+        self.assertEqual(seen['claims']['roles'], [])
+
+
+class AssignRolesTest(TestCase):
+    def setUp(self):
+        self.users = [SysUser.objects.create(username=f'assign{i}', password='x') for i in range(3)]
+        self.roles = [SysRole.objects.create(name=f'角色{i}', code=f'r{i}') for i in range(3)]
+        for user in self.users:
+            SysUserRole.objects.create(user=user, role=self.roles[0])
+            SysUserRole.objects.create(user=user, role=self.roles[1])
+
+    def assign(self, body):
+        request = RequestFactory().post('/user/assignRoles', data=json.dumps(body), content_type='application/json')
+        return json.loads(AssignRolesView.as_view()(request).content)
+
+    def role_ids(self, user):
+        return sorted(SysUserRole.objects.filter(user=user).values_list('role_id', flat=True))
+
+    def test_diff_many_users(self):
+        userIds = [user.id for user in self.users]
+        stamps = [get_menu_cache().stamp(userId, []) for userId in userIds]
+        with self.captureOnCommitCallbacks(execute=True):
+            result = self.assign({'userIds': userIds, 'roleIds': [self.roles[1].id, self.roles[2].id]})
+        self.assertEqual((result['code'], result['created'], result['deleted']), (200, 3, 3))
+        for user in self.users:
+            self.assertEqual(self.role_ids(user), [self.roles[1].id, self.roles[2].id])
+        self.assertTrue(all(get_menu_cache().stamp(userId, []) != stamp for userId, stamp in zip(userIds, stamps)))
+
+    def test_chunked_delete_invalidates_users(self):
+        userIds = [user.id for user in self.users]
+        stamps = [get_menu_cache().stamp(userId, []) for userId in userIds]
+        with mock.patch('user.services.UPDATE_CHUNK_SIZE', 2), self.captureOnCommitCallbacks(execute=True):
+            result = self.assign({'userIds': userIds, 'roleIds': []})
+        self.assertEqual((result['code'], result['created'], result['deleted']), (200, 0, 6))
+        self.assertFalse(SysUserRole.objects.filter(user_id__in=userIds).exists())
+        self.assertTrue(all(get_menu_cache().stamp(userId, []) != stamp for userId, stamp in zip(userIds, stamps)))
+
+    def test_unchanged_and_invalid(self):
+        result = self.assign([{'userId': self.users[0].id, 'roleIds': [self.roles[0].id, self.roles[1].id]}])
+        self.assertEqual((result['created'], result['deleted']), (0, 0))
+        self.assertEqual(self.assign({'userId': self.users[0].id, 'roleIds': [999999]})['code'], 400)
+        self.assertEqual(self.assign({'userId': self.users[0].id})['code'], 400)
+        self.assertEqual(self.role_ids(self.users[0]), [self.roles[0].id, self.roles[1].id])
+
+
+class TokenRevocationTest(TestCase):
+    def setUp(self):
+        self.user = SysUser.objects.create(username='revokeUser', password='x')
+        self.other = SysUser.objects.create(username='otherUser', password='x')
+        get_revocations().refresh(force=True)
+
+    def test_revoked_tokens_rejected_without_queries(self):
+        old, other = issue_tokens(self.user), issue_tokens(self.other)
+        with self.captureOnCommitCallbacks(execute=True):
+            revoke_user_tokens([self.user.id], REASON_PASSWORD)
+        new = issue_tokens(self.user)
+        with self.assertNumQueries(0):
+            self.assertTrue(is_revoked(old.access_token.payload))
+            self.assertFalse(is_revoked(new.access_token.payload))
+            self.assertFalse(is_revoked(other.access_token.payload))
+        with self.assertRaises(TokenError):
+            refresh_tokens(str(old))
+
+    def test_login_after_prune_not_revoked(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            revoke_user_tokens([self.user.id], REASON_STATUS)
+        prune_revocations(timedelta(seconds=-1))
+        self.assertEqual(SysTokenRevocation.objects.count(), 1)  # 最新一行保留，tv不会回落
+        token = issue_tokens(self.user)
+        self.assertFalse(is_revoked(token.access_token.payload))
+
+    def test_incremental_refresh(self):
+        token = issue_tokens(self.user)
+        snapshot = RevocationSnapshot(interval=0)
+        snapshot.refresh()
+        revoke_user_tokens([self.user.id], REASON_STATUS)
+        self.assertFalse(snapshot.is_revoked(self.user.id, token['tv']))
+        snapshot.refresh()
+        self.assertTrue(snapshot.is_revoked(self.user.id, token['tv']))
+
+
+@skipUnless('replica' in settings.DATABASES, "需要在DATABASES中配置别名为'replica'的数据库")
+@override_settings(DATABASE_REPLICAS=['replica'], USERNAME_FILTER={'ENABLED': False})
+class ReadReplicaRouterTest(TestCase):
+    # skipUnless不影响测试运行器收集databases，未配置replica时不能声明该别名，否则整个测试套件无法启动
+    databases = {'default', 'replica'} if 'replica' in settings.DATABASES else {'default'}
+
+    def setUp(self):
+        cache.clear()
+        # 两个库数据不同，用于判断查询落在哪个库
+        SysUser.objects.using('replica').create(username='onlyInReplica', password='x')
+
+    def check(self, username):
+        request = RequestFactory().post('/user/check', data=json.dumps({'username': username}),
+                                        content_type='application/json')
+        request.jwt_user_id = 1
+        return json.loads(CheckView.as_view()(request).content)['code']
+
+    def test_read_only_view_uses_replica(self):
+        self.assertEqual(self.check('onlyInReplica'), 500)
+
+    def test_sticky_after_write(self):
+        mark_written('user:1')
+        self.assertEqual(self.check('onlyInReplica'), 200)
+
+    def test_write_endpoints_mark_sticky(self):
+        request = RequestFactory().post('/user/batchStatus', data=json.dumps({'ids': [], 'status': 1}),
+                                        content_type='application/json')
+        request.jwt_user_id = 1
+        BatchStatusView.as_view()(request)
+        self.assertEqual(self.check('onlyInReplica'), 200)
+
+    def test_writes_go_to_primary(self):
+        user = SysUser.objects.using('replica').get(username='onlyInReplica')
+        user.pk = None
+        user.save()
+        self.assertTrue(SysUser.objects.filter(username='onlyInReplica').exists())
+
+
+@skipUnless(avatars.Image is not None, '需要Pillow')
+class AvatarPipelineTest(TestCase):
+    def setUp(self):
+        self.enterContext(override_settings(MEDIA_ROOT=self.enterContext(tempfile.TemporaryDirectory()),
+                                            AVATAR_PIPELINE={'SIZES': (16, 32)}))
+        # 缩略图任务提交到单线程池，测试结束前等待其完成
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.enterContext(mock.patch.object(avatars, '_get_executor', return_value=self.executor))
+        self.addCleanup(lambda: self.executor.shutdown(wait=True))
+
+    def upload(self, size=(40, 20), fmt='PNG', filename='a.png'):
+        buffer = BytesIO()
+        avatars.Image.new('RGB', size, (200, 30, 30)).save(buffer, fmt)
+        return self.store(buffer.getvalue(), filename)
+
+    def store(self, data, filename):
+        name = async_to_sync(store_avatar)(SimpleUploadedFile(filename, data))
+        self.executor.shutdown(wait=True)
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        avatars._get_executor.return_value = self.executor
+        return name
+
+    def test_store_and_thumbnails(self):
+        name = self.upload()
+        self.assertRegex(name, r'^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.png$')
+        self.assertTrue(os.path.exists(avatar_path(name)))
+        for size in (16, 32):
+            with avatars.Image.open(avatar_path(variant_name(name, size))) as thumb:
+                self.assertEqual((thumb.format, thumb.size), ('WEBP', (size, size)))
+        self.assertEqual(resolve_avatar(name, 32), variant_name(name, 32))
+        # 相同内容只存一份
+        self.assertEqual(self.upload(), name)
+
+    def test_original_returned_until_thumbnails_exist(self):
+        with mock.patch.object(avatars, '_generate_in_background'):
+            name = self.upload(fmt='JPEG', filename='a.jpeg')
+        self.assertTrue(name.endswith('.jpg'))
+        self.assertEqual(resolve_avatar(name, 16), name)
+        # 原图已存在但缺少缩略图时，再次上传会补生成
+        self.assertEqual(self.upload(fmt='JPEG', filename='a.jpeg'), name)
+        self.assertEqual(resolve_avatar(name, 16), variant_name(name, 16))
+
+    def test_rejected_uploads(self):
+        with self.assertRaisesMessage(InvalidImage, '已损坏'):
+            self.store(b'not an image', 'a.png')
+        buffer = BytesIO()
+        avatars.Image.new('RGB', (8, 8)).save(buffer, 'BMP')
+        with self.assertRaisesMessage(InvalidImage, '仅支持'):
+            self.store(buffer.getvalue(), 'a.bmp')
+        with override_settings(AVATAR_PIPELINE={'MAX_PIXELS': 100}):
+            with self.assertRaisesMessage(InvalidImage, '尺寸过大'):
+                self.upload()
+        with override_settings(AVATAR_PIPELINE={'MAX_BYTES': 10}):
+            with self.assertRaisesMessage(InvalidImage, '不能超过'):
+                self.upload()
+        self.assertEqual(list(avatars.get_avatar_storage().listdir()), [])
+
+    def test_decompression_bomb(self):
+        # 超过Pillow自身像素上限两倍时 Image.open 直接抛出 DecompressionBombError
+        with mock.patch.object(avatars.Image, 'MAX_IMAGE_PIXELS', 100):
+            with self.assertRaisesMessage(InvalidImage, '尺寸过大'):
+                self.upload()
+
+
+class MediaServingTest(TestCase):
+    def setUp(self):
+        self.root = self.enterContext(tempfile.TemporaryDirectory())
+        os.makedirs(os.path.join(self.root, 'userAvatar'))
+        with open(os.path.join(self.root, 'userAvatar', 'a.txt'), 'wb') as f:
+            f.write(b'0123456789')
+
+    def get(self, path='userAvatar/a.txt', **headers):
+        response = serve_media(RequestFactory().get(f'/media/{path}', **headers), path, document_root=self.root)
+        self.addCleanup(response.close)
+        return response
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_full_file_and_not_modified(self):
+        response = self.get()
+        self.assertEqual((response.status_code, self.body(response)), (200, b'0123456789'))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        etag = response['ETag']
+        notModified = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((notModified.status_code, notModified['ETag']), (304, etag))
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_cache_headers_by_naming(self):
+        with override_settings(MEDIA_ROOT=self.root):
+            storage = avatars.get_avatar_storage()
+        name, _ = storage.save(b'image', '.png')
+        digest = name.rsplit('/', 1)[1][:-len('.png')]
+        thumb = name[:-len('.png')] + '_64.webp'
+        atomic_write(storage.path(thumb), lambda f: f.write(b'thumb'))
+
+        original = self.get(f'userAvatar/{name}')
+        self.assertEqual(original['ETag'], f'"{digest}"')
+        self.assertIn('immutable', original['Cache-Control'])
+        # 修改时间变化不影响内容寻址文件的ETag
+        os.utime(storage.path(name), (1, 1))
+        self.assertEqual(self.get(f'userAvatar/{name}')['ETag'], f'"{digest}"')
+        for path in (f'userAvatar/{thumb}', 'userAvatar/a.txt'):
+            response = self.get(path)
+            self.assertNotIn('immutable', response['Cache-Control'], path)
+            self.assertIn('must-revalidate', response['Cache-Control'])
+            self.assertNotEqual(response['ETag'], f'"{digest}"')
+
+    def test_ranges(self):
+        for header, content, contentRange in (('bytes=2-4', b'234', 'bytes 2-4/10'),
+                                              ('bytes=7-', b'789', 'bytes 7-9/10'),
+                                              ('bytes=-3', b'789', 'bytes 7-9/10'),
+                                              ('bytes=8-100', b'89', 'bytes 8-9/10')):
+            response = self.get(HTTP_RANGE=header)
+            self.assertEqual((response.status_code, self.body(response)), (206, content), header)
+            self.assertEqual(response['Content-Range'], contentRange)
+        # If-Range不匹配时返回完整文件
+        self.assertEqual(self.get(HTTP_RANGE='bytes=2-4', HTTP_IF_RANGE='"stale"').status_code, 200)
+
+    def test_unsatisfiable_and_multi_range(self):
+        for header in ('bytes=10-', 'bytes=5-2', 'bytes=-0'):
+            response = self.get(HTTP_RANGE=header)
+            self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */10'), header)
+        # 多段Range不支持，按规范返回完整内容
+        response = self.get(HTTP_RANGE='bytes=0-1,-2')
+        self.assertEqual((response.status_code, self.body(response)), (200, b'0123456789'))
+
+    def test_missing_and_traversal(self):
+        with open(os.path.join(os.path.dirname(self.root), os.path.basename(self.root) + '.secret'), 'wb') as f:
+            self.addCleanup(os.remove, f.name)
+        for path in ('userAvatar/missing.txt', 'userAvatar', f'../{os.path.basename(self.root)}.secret',
+                     'userAvatar/../../etc/passwd'):
+            with self.assertRaises(Http404, msg=path):
+                serve_media(RequestFactory().get('/media/x'), path, document_root=self.root)
+
+
+class AvatarStorageTest(TestCase):
+    def setUp(self):
+        self.enterContext(override_settings(MEDIA_ROOT=self.enterContext(tempfile.TemporaryDirectory()),
+                                            AVATAR_PIPELINE={'SIZES': (16, 32)}))
+        self.storage = avatars.get_avatar_storage()
+
+    def save(self, data, age=None):
+        """保存头像及其缩略图，age不为空时把修改时间调到age秒之前（超出GC宽限期）"""
+        name, _ = self.storage.save(data, '.png')
+        names = [name] + [variant_name(name, size) for size in (16, 32)]
+        for variant in names[1:]:
+            atomic_write(self.storage.path(variant), lambda f: f.write(b'thumb'))
+        if age is not None:
+            old = time.time() - age
+            for item in names:
+                os.utime(self.storage.path(item), (old, old))
+        return names
+
+    def gc(self, *args):
+        out = StringIO()
+        call_command('gc_avatars', *args, stdout=out)
+        return out.getvalue()
+
+    def files(self):
+        return {name for name, _ in self.storage.listdir()}
+
+    def test_content_addressed_save(self):
+        name, created = self.storage.save(b'abc', '.png')
+        self.assertTrue(created)
+        self.assertEqual(name, 'ba/78/ba7816bf8f01cfea414140de5dae2223b00361a396177a9cb410ff61f20015ad.png')
+        self.assertEqual(self.storage.save(b'abc', '.png'), (name, False))
+        with open(self.storage.path(name), 'rb') as f:
+            self.assertEqual(f.read(), b'abc')
+        self.storage.delete(name)
+        self.storage.delete(name)  # 重复删除不报错
+        self.storage.remove_empty_dirs()
+        self.assertEqual(os.listdir(self.storage.root), [])
+
+    def test_duplicate_save_keeps_mtime_and_defers_gc(self):
+        name = self.save(b'old', age=48 * 3600)[0]
+        mtime = os.stat(self.storage.path(name)).st_mtime
+        self.assertIsNone(self.storage.touched_at(name))
+        self.assertEqual(self.storage.save(b'old', '.png'), (name, False))
+        # 文件本身不变（ETag与Last-Modified不变），重新使用记录在标记中
+        self.assertEqual(os.stat(self.storage.path(name)).st_mtime, mtime)
+        self.assertIsNotNone(self.storage.touched_at(name))
+        self.assertNotIn('.recent', ''.join(self.files()))
+        self.gc()
+        self.assertIn(name, self.files())
+
+    def test_atomic_write_cleans_up(self):
+        def fail(f):
+            f.write(b'partial')
+            raise RuntimeError('boom')
+
+        target = self.storage.path('ab/cd/x.png')
+        with self.assertRaises(RuntimeError):
+            atomic_write(target, fail)
+        self.assertFalse(os.path.exists(target))
+        self.assertEqual(os.listdir(os.path.dirname(target)), [])
+
+    def test_gc_keeps_referenced_and_removes_garbage(self):
+        referenced = self.save(b'used', age=48 * 3600)
+        unreferenced = self.save(b'unused', age=48 * 3600)
+        recent = self.save(b'recent')
+        SysUser.objects.create(username='avatarOwner', password='x', avatar=referenced[0])
+
+        out = self.gc('--dry-run')
+        self.assertTrue(all(name in out for name in unreferenced))
+        self.assertEqual(self.files(), set(referenced + unreferenced + recent))
+
+        self.gc()
+        self.assertEqual(self.files(), set(referenced + recent))
+        self.assertTrue(all(os.path.exists(self.storage.path(name)) for name in referenced))
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        self.directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(METRICS={'DIR': self.directory}))
+        self.enterContext(mock.patch.object(metrics, '_registry', MetricsRegistry()))
+        self.enterContext(mock.patch.object(metrics, '_store', None))
+
+    def test_render_merged_snapshots(self):
+        registry = MetricsRegistry()
+        registry.record('user-search', 'POST', 200, 0.02, 3, 0.004, 512)
+        registry.record('user-search', 'POST', 500, 3, 0, 0.0, None)
+        text = render_prometheus(merge_snapshots([registry.snapshot(), registry.snapshot()]))
+        self.assertIn('http_requests_total{view="user-search",method="POST",status="200"} 2', text)
+        self.assertIn('http_requests_total{view="user-search",method="POST",status="500"} 2', text)
+        self.assertIn('http_request_duration_seconds_bucket{view="user-search",le="0.025"} 2', text)
+        self.assertIn('http_request_duration_seconds_bucket{view="user-search",le="2.5"} 2', text)
+        self.assertIn('http_request_duration_seconds_bucket{view="user-search",le="5.0"} 4', text)
+        self.assertIn('http_request_duration_seconds_count{view="user-search"} 4', text)
+        self.assertIn('http_request_db_queries_bucket{view="user-search",le="3.0"} 4', text)
+        # 流式响应不统计大小
+        self.assertIn('http_response_size_bytes_count{view="user-search"} 2', text)
+        self.assertIn('http_request_db_query_seconds_total{view="user-search"} 0.008', text)
+
+    def test_middleware_records_queries_and_status(self):
+        def view(request):
+            list(SysUser.objects.all())
+            SysUser.objects.count()
+            return HttpResponse('missing', status=404)
+
+        middleware = MetricsMiddleware(view)
+        middleware(RequestFactory().get('/nowhere'))
+        snapshot = metrics._registry.snapshot()
+        self.assertEqual(snapshot['requests'], {metrics.KEY_SEPARATOR.join((metrics.UNRESOLVED, 'GET', '404')): 1})
+        queries = snapshot['histograms']['http_request_db_queries'][metrics.UNRESOLVED]
+        self.assertEqual(queries[-2:], [2, 1])  # [..., sum, count]
+        text = middleware(RequestFactory().get('/metrics')).content.decode()
+        self.assertIn(f'http_requests_total{{view="{metrics.UNRESOLVED}",method="GET",status="404"}} 1', text)
+
+    def test_stale_process_files_compacted(self):
+        registry = MetricsRegistry()
+        registry.record('v', 'GET', 200, 0.01, 1, 0.0, 10)
+        process = subprocess.Popen([sys.executable, '-c', ''])
+        process.wait()
+        # 已退出进程与本进程旧文件合并进归档；存活进程的文件保留
+        for pid in (process.pid, os.getpid(), os.getppid()):
+            with open(os.path.join(self.directory, f'metrics_{pid}.json'), 'w') as f:
+                json.dump(registry.snapshot(), f)
+        store = MultiProcessStore(self.directory, MetricsRegistry(), 5)
+        self.assertEqual(sorted(name for name in os.listdir(self.directory) if name.endswith('.json')),
+                         sorted([metrics.ARCHIVE_FILE, f'metrics_{os.getppid()}.json']))
+        key = metrics.KEY_SEPARATOR.join(('v', 'GET', '200'))
+        self.assertEqual(store.collect()['requests'], {key: 3})
+        # 再次启动不会重复计入
+        self.assertEqual(MultiProcessStore(self.directory, MetricsRegistry(), 5).collect()['requests'], {key: 3})
+
+    def test_default_dir_per_deployment(self):
+        with override_settings(METRICS={}), mock.patch.dict(os.environ, {}, clear=False) as env:
+            env.pop('PROMETHEUS_MULTIPROC_DIR', None)
+            default = metrics.get_metrics_config()['DIR']
+            with override_settings(BASE_DIR='/srv/other'):
+                self.assertNotEqual(metrics.get_metrics_config()['DIR'], default)
+        self.assertTrue(os.path.basename(default).startswith('python222_metrics_'))
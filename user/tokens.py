@@ -0,0 +1,82 @@
+# user/tokens.py（携带角色与权限版本的JWT）
+# 登录时签发的Token除用户id外还带上：
+#   roles：角色编码列表，按角色鉴权可直接读取Token，不查库
+#   rids ：角色id列表，用于计算权限版本
+#   pv   ：权限版本，由 menu/cache.py 的用户/角色版本号摘要得到，角色或菜单关联变更后随之变化
+#   tv   ：吊销版本，见 user/revocation.py
+# 刷新Token时只做一次验签，pv未变时直接沿用Token中的角色；pv变化才重新查询角色。
+# MENU_CACHE 为 locmem 时版本号是进程内的，跨进程刷新会按pv变化处理（多一次查询，结果仍正确）。
+import hashlib
+
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from menu.cache import get_menu_cache
+from menu.services import MENU_STICKY_KEY
+from python222.db_router import replica_reads
+from role.models import SysUserRole
+from .revocation import current_token_version, get_revocations, is_revoked
+
+ROLES_NAMESPACE = 'token_roles'
+
+
+def get_user_roles(user_id):
+    """
+    用户的角色id与角色编码，与菜单树共用版本号失效
+    :return: (按id排序的角色id列表, 角色编码列表)
+    """
+    roleCache = get_menu_cache(ROLES_NAMESPACE)
+    cached = roleCache.get(user_id)
+    if cached is None:
+        generation = roleCache.generation()
+        with replica_reads(MENU_STICKY_KEY):
+            rows = list(SysUserRole.objects.filter(user_id=user_id).order_by('role_id')
+                        .values_list('role_id', 'role__code'))
+        cached = ([roleId for roleId, _ in rows], [code for _, code in rows if code])
+        roleCache.set(user_id, cached[0], cached, generation)
+    return cached
+
+
+def permission_version(user_id, role_ids):
+    """权限版本的短摘要，写入Token的pv声明"""
+    stamp = get_menu_cache().stamp(user_id, sorted(role_ids))
+    return hashlib.blake2b(repr(stamp).encode(), digest_size=6).hexdigest()
+
+
+def _set_role_claims(token, user_id, role_ids, role_codes):
+    token['roles'] = role_codes
+    token['rids'] = role_ids
+    token['pv'] = permission_version(user_id, role_ids)
+
+
+def issue_tokens(user):
+    """登录时签发：返回带角色与权限版本声明的RefreshToken，access_token属性会复制这些声明"""
+    refresh = RefreshToken.for_user(user)
+    roleIds, roleCodes = get_user_roles(user.id)
+    _set_role_claims(refresh, user.id, roleIds, roleCodes)
+    refresh['tv'] = current_token_version()
+    return refresh
+
+
+def refresh_tokens(token):
+    """
+    用RefreshToken换取新的AccessToken（验签失败、过期或已被吊销时抛出TokenError）
+    :return: (新的AccessToken, 开启ROTATE_REFRESH_TOKENS时的新RefreshToken，否则为None)
+    """
+    refresh = RefreshToken(token)
+    get_revocations().refresh()
+    if is_revoked(refresh.payload):
+        raise TokenError('Token已被吊销')
+    userId = refresh[api_settings.USER_ID_CLAIM]
+    if refresh.get('pv') != permission_version(userId, refresh.get('rids', [])):
+        # 角色或菜单关联已变更，按最新角色重新签发
+        roleIds, roleCodes = get_user_roles(userId)
+        _set_role_claims(refresh, userId, roleIds, roleCodes)
+    access = refresh.access_token
+    if not api_settings.ROTATE_REFRESH_TOKENS:
+        return access, None
+    refresh.set_jti()
+    refresh.set_exp()
+    refresh.set_iat()
+    return access, refresh
@@ -1,10 +1,12 @@
 from django.urls import path
-from user.views import TestView, JwtTestView, LoginView, SaveView, PwdView, ImageView, AvatarView, SearchView, \
-    ActionView, CheckView, PasswordView, StatusView, AssignRolesView
+from user.views import TestView, JwtTestView, LoginView, RefreshView, SaveView, PwdView, ImageView, AvatarView, \
+    SearchView, ActionView, CheckView, PasswordView, StatusView, AssignRolesView, ImportView, \
+    ExportView, BatchStatusView, BatchPasswordView
 
 urlpatterns = [
 
     path('login', LoginView.as_view(), name='login'), # 登录
+    path('refresh', RefreshView.as_view(), name='refresh'), # 刷新Token
     path('save', SaveView.as_view(), name='save'), # 用户信息修改
     path('updateUserPwd', PwdView.as_view(), name='updateUserPwd'), # 修改密码
     path('test', TestView.as_view(), name='test'), # 测试
@@ -18,6 +20,10 @@ urlpatterns = [
 
     path('resetPassword', PasswordView.as_view(), name='resetPassword'), # 重置密码
     path('status', StatusView.as_view(), name='status'), # 状态修改
+    path('batchStatus', BatchStatusView.as_view(), name='batchStatus'), # 批量状态修改
+    path('batchResetPassword', BatchPasswordView.as_view(), name='batchResetPassword'), # 批量重置密码
+    path('import', ImportView.as_view(), name='import'), # 批量导入
+    path('export', ExportView.as_view(), name='export'), # 流式导出
 
     path('assignRoles', AssignRolesView.as_view(), name='assignRoles'),
     ]
\ No newline at end of file
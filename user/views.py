@@ -1,286 +1,39 @@
-import json
-
-from django.core.paginator import Paginator
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, transaction
 from django.views import View
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
+from rest_framework_simplejwt.exceptions import TokenError
 from rest_framework_simplejwt.tokens import RefreshToken
-from django.contrib.auth.hashers import check_password, make_password
 
-from python222 import settings
+from python222.db_router import read_only_view, sticky_after_write
+from python222.fastjson import JSONDecodeError, JsonResponse, parse_json
+from python222.pagination import InvalidCursor, akeyset_page
 # 导入角色、菜单模型（跨应用关联，适配当前权限菜单逻辑）
-from role.models import SysRole, SysUserRole
-from menu.models import SysMenu
-# 导入菜单序列化器（用于菜单数据格式处理）
-from menu.serializers import SysMenuSerializer
-from .models import SysUser, SysUserSerializer
+from role.models import SysUserRole
+# 导入菜单解析服务（角色+菜单联表查询、菜单树构建与缓存）
+from menu.services import get_user_menu_payload
+from .models import SysUser, buildUserDict
+from .services import InvalidAssignment, aload_role_lists, assign_roles, bulk_update_users, lock_changed_users
+from .search import INDEXED_FIELDS, search_users
+from .importer import UserImporter, iter_rows
+from .exporter import astream_users, stream_users
+from .avatars import InvalidImage, resolve_avatar, store_avatar
+from .bloom import username_exists
 from datetime import datetime  # 新增：导入datetime模块，对应文档1-604行日期处理逻辑
-from django.contrib.auth.hashers import make_password  # 新增：导入密码哈希工具，对应文档1-604行安全规范
-
-
-
-@method_decorator(csrf_exempt, name='dispatch')
-class LoginView(View):
-    def buildTreeMenu(self, sysMenuList):
-        resultMenuList = []
-        if not sysMenuList:
-            return resultMenuList
-        for menu in sysMenuList:
-            for sub_menu in sysMenuList:
-                if sub_menu.parent_id == menu.id:
-                    if not hasattr(menu, "children"):
-                        menu.children = []
-                    menu.children.append(sub_menu)
-            if menu.parent_id == 0:
-                resultMenuList.append(menu)
-        return resultMenuList
-
-    def post(self, request):
-        username = request.GET.get('username', '')
-        password = request.GET.get('password', '')
-        request.GET.get('rememberMe', False)
-
-        if not username or not password:
-            try:
-                data = json.loads(request.body)
-                username = data.get('username', '')
-                password = data.get('password', '')
-            except json.JSONDecodeError:
-                return JsonResponse({'code': 400, 'info': '请求格式错误，请用JSON或URL参数'})
-
-        try:
-            user = SysUser.objects.get(username=username)
-            if password and check_password(password, user.password):
-                roleList = SysRole.objects.raw("""
-                    SELECT id FROM sys_role 
-                    WHERE id IN (SELECT role_id FROM sys_user_role WHERE user_id=%s)
-                """, [user.id])
-                roleIds = [role.id for role in roleList]
-
-                menuSet = set()
-                if roleIds:
-                    for roleId in roleIds:
-                        menus = SysMenu.objects.raw("""
-                            SELECT * FROM sys_menu 
-                            WHERE id IN (SELECT menu_id FROM sys_role_menu WHERE role_id=%s)
-                        """, [roleId])
-                        for menu in menus:
-                            menuSet.add(menu)
-                menuList = list(menuSet)
-
-                sortedMenus = sorted(menuList, key=lambda x: x.order_num if x.order_num else 999)
-                treeMenus = self.buildTreeMenu(sortedMenus)
-                serializerMenus = [SysMenuSerializer(menu).data for menu in treeMenus]
-
-                # -------------------------- 关键修改开始 --------------------------
-
-                roles = ",".join([role.name for role in roleList])
-
-                # 1. 生成Token（原有逻辑）
-                refresh = RefreshToken.for_user(user)
-                access_token = str(refresh.access_token)
-
-                # 2. 新增：构建userInfo（包含用户名、头像路径，适配前端currentUser存储）
-                user_info = {
-                    'username': user.username,  # 前端显示用户名需此字段
-                    # 若SysUser模型未添加avatar字段，需先添加（下方有模型字段定义提示）
-                    'avatar': user.avatar if hasattr(user, 'avatar') and user.avatar else '',
-                    'create_time': user.create_time.strftime('%Y-%m-%d %H:%M:%S') if user.create_time else None,
-                }
-
-                # 3. 响应中新增userInfo字段（前端需通过data.userInfo读取）
-                return JsonResponse({
-                    'code': 200,
-                    'token': access_token,
-                    'menuList': serializerMenus,
-                    'userInfo': {  # 原有userInfo字段不变
-                        'username': user.username,
-                        'id': user.id,
-                        'avatar': user.avatar if hasattr(user, 'avatar') and user.avatar else '',
-                        "create_time": user.create_time.strftime('%Y-%m-%d %H:%M:%S') if user.create_time else None,
-                    },  # 新增：为前端提供用户信息
-                    'roles': roles,
-                    'info': '登录成功！',
-                    'id': user.id,
-                })
-                # -------------------------- 关键修改结束 --------------------------
-            else:
-                print("密码验证失败！")
-                return JsonResponse({'code': 401, 'info': '密码错误！'})
-        except SysUser.DoesNotExist:
-            return JsonResponse({'code': 401, 'info': '用户名不存在！'})
-        except Exception as e:
-            print(f"登录异常：{str(e)}")
-            return JsonResponse({'code': 500, 'info': '服务器内部错误！'})
-
-class TestView(View):
-    def get(self, request):
-        # 兼容Bearer Token格式
-        token = request.META.get('HTTP_AUTHORIZATION', '')
-        if token.startswith('Bearer '):
-            token = token.split(' ')[1]
-
-        if token:
-            try:
-                userList = list(SysUser.objects.all().values())
-                return JsonResponse({'code': 200, 'info': '测试！', 'data': userList})
-            except Exception as e:
-                print(f"测试接口异常：{str(e)}")
-                return JsonResponse({'code': 500, 'info': '测试接口查询失败！'})
-        else:
-            return JsonResponse({'code': 401, 'info': '没有访问权限，请先登录！'})
-
-
-class JwtTestView(View):
-    def get(self, request):
-        try:
-            # 测试用户创建（密码哈希存储）
-            user, created = SysUser.objects.get_or_create(
-                username='python222',
-                defaults={'password': make_password('123456')}
-            )
-            # 生成Token
-            refresh = RefreshToken.for_user(user)
-            access_token = str(refresh.access_token)
-            return JsonResponse({
-                'code': 200,
-                'token': access_token,
-                'refresh_token': str(refresh),
-                'info': '测试Token生成成功！'
-            })
-        except Exception as e:
-            print(f"Jwt测试异常：{str(e)}")
-            return JsonResponse({'code': 500, 'info': '测试接口异常！'})
-
-
-@method_decorator(csrf_exempt, name='dispatch')  # 对齐文档3-299行csrf豁免规范
-class SaveView(View):
-    def post(self, request):
-        try:
-            data = json.loads(request.body.decode("utf-8"))
-            print(f"Received data: {data}")
-
-            if data['id'] == -1:  # 添加用户（对齐文档3-604行添加逻辑）
-                # 1. 用户名唯一性校验（文档隐含的基础校验）
-                if SysUser.objects.filter(username=data['username']).exists():
-                    return JsonResponse({'code': 400, 'info': f'用户名"{data["username"]}"已存在，请更换！'})
-
-                # 2. 创建用户（严格对齐文档3-604行字段赋值）
-                obj_sysUser = SysUser(
-                    username=data['username'],
-                    # 文档3-604行默认密码123456，且强制哈希存储
-                    password=make_password(data.get('password', '123456')),
-                    # 文档3-604行默认头像default.jpg
-                    avatar=data.get('avatar', 'default.jpg'),
-                    email=data.get('email', ''),
-                    phonenumber=data.get('phonenumber', ''),
-                    login_date=None,  # 新用户无登录时间（文档隐含逻辑）
-                    status=data.get('status', 1),  # 文档3-48行status默认1（正常）
-                    # 修复datetime调用错误：datetime.datetime.now()而非datetime.now()
-                    create_time=datetime.datetime.now().date(),  # 对齐文档3-604行创建时间赋值
-                    update_time=datetime.datetime.now().date(),  # 新增时同步更新时间
-                    remark=data.get('remark', '')
-                )
-                obj_sysUser.save()
-                print(f"User {data['username']} created successfully.")
-
-            else:  # 修改用户（对齐文档3-604行修改逻辑）
-                try:
-                    # 1. 获取已有用户（文档3-604行通过id查询）
-                    existing_user = SysUser.objects.get(id=data['id'])
-                    print(f"Found user with id {data['id']}: {existing_user.username}")
-                except SysUser.DoesNotExist:
-                    return JsonResponse({'code': 404, 'info': '用户不存在！'})
-
-                # 2. 用户名变更校验（文档隐含的唯一性逻辑）
-                if data['username'] != existing_user.username:
-                    if SysUser.objects.filter(username=data['username']).exists():
-                        return JsonResponse({'code': 400, 'info': f'用户名"{data["username"]}"已存在，请更换！'})
-
-                # 3. 基础字段更新（对齐文档3-604行字段覆盖逻辑）
-                existing_user.username = data['username']
-                existing_user.avatar = data.get('avatar', existing_user.avatar)
-                existing_user.email = data.get('email', existing_user.email)
-                existing_user.phonenumber = data.get('phonenumber', existing_user.phonenumber)
-                existing_user.login_date = data.get('login_date', existing_user.login_date)
-                existing_user.status = data.get('status', existing_user.status)
-                existing_user.remark = data.get('remark', existing_user.remark)
-
-                # 4. 密码特殊处理（文档3-604行未显式处理，按安全规范补充哈希）
-                if 'password' in data and data['password']:
-                    existing_user.password = make_password(data['password'])
-
-                # 5. 更新时间（对齐文档3-604行update_time赋值）
-                # 修复datetime调用错误：datetime.datetime.now()而非datetime.now()
-                existing_user.update_time = datetime.datetime.now().date()
-
-                existing_user.save()
-                print(f"User {existing_user.username} updated successfully.")
-
-            # 统一响应格式（对齐文档3-604行返回规范）
-            return JsonResponse({'code': 200, 'info': '用户信息保存成功！'})
-
-        except json.JSONDecodeError as e:
-            print(f"JSON decode error: {str(e)}")
-            return JsonResponse({'code': 400, 'info': '请求格式错误，需为JSON'})
-        except Exception as e:
-            print(f"保存用户异常：{str(e)}")
-            return JsonResponse({'code': 500, 'info': '服务器内部错误！'})
-
-
-@method_decorator(csrf_exempt, name='dispatch')
-class PwdView(View):
-    def post(self, request):
-        try:
-            data = json.loads(request.body.decode("utf-8"))
-            user_id = data.get('id')
-            old_password = data.get('oldPassword')
-            new_password = data.get('newPassword')
-
-            if not all([user_id, old_password, new_password]):
-                return JsonResponse({'code': 400, 'info': '参数不完整，请检查'})
-
-            try:
-                user = SysUser.objects.get(id=user_id)
-            except SysUser.DoesNotExist:
-                return JsonResponse({'code': 404, 'info': '用户不存在'})
-
-            # 验证旧密码（假设数据库中密码是加密存储的）
-            if not check_password(old_password, user.password):
-                return JsonResponse({'code': 500, 'info': '原密码错误！'})
-
-            # 加密新密码并更新
-            user.password = make_password(new_password)
-            user.update_time = datetime.now().date()
-            user.save()
-
-            return JsonResponse({'code': 200, 'info': '密码修改成功'})
-        except json.JSONDecodeError:
-            return JsonResponse({'code': 400, 'info': '请求格式错误，需为JSON'})
-        except Exception as e:
-            print(f"修改密码异常：{str(e)}")
-            return JsonResponse({'code': 500, 'info': '服务器内部错误'})
+# 密码哈希统一走进程池服务（user/hashing.py），排队超限时抛出HashingOverloaded
+from .hashing import HashingOverloaded, acheck_password, check_password, make_password
+from .tokens import issue_tokens, refresh_tokens
+from .revocation import REASON_DELETED, REASON_PASSWORD, REASON_STATUS, revoke_user_tokens
 
 
 
 @method_decorator(csrf_exempt, name='dispatch')
 class LoginView(View):
-    def buildTreeMenu(self, sysMenuList):
-        resultMenuList = []
-        if not sysMenuList:
-            return resultMenuList
-        for menu in sysMenuList:
-            for sub_menu in sysMenuList:
-                if sub_menu.parent_id == menu.id:
-                    if not hasattr(menu, "children"):
-                        menu.children = []
-                    menu.children.append(sub_menu)
-            if menu.parent_id == 0:
-                resultMenuList.append(menu)
-        return resultMenuList
-
-    def post(self, request):
+    # 异步视图：ASGI下直接在事件循环中处理，密码校验与菜单查询放到线程中执行
+    async def post(self, request):
         username = request.GET.get('username', '')
         password = request.GET.get('password', '')
         id=request.GET.get('id', '')
@@ -288,43 +41,24 @@ class LoginView(View):
 
         if not username or not password:
             try:
-                data = json.loads(request.body)
+                data = parse_json(request.body)
                 username = data.get('username', '')
                 password = data.get('password', '')
                 id=data.get('id', '')
-            except json.JSONDecodeError:
+            except JSONDecodeError:
                 return JsonResponse({'code': 400, 'info': '请求格式错误，请用JSON或URL参数'})
 
         try:
-            user = SysUser.objects.get(username=username)
-            if password and check_password(password, user.password):
-                roleList = SysRole.objects.raw("""
-                    SELECT id FROM sys_role 
-                    WHERE id IN (SELECT role_id FROM sys_user_role WHERE user_id=%s)
-                """, [user.id])
-                roleIds = [role.id for role in roleList]
-
-                menuSet = set()
-                if roleIds:
-                    for roleId in roleIds:
-                        menus = SysMenu.objects.raw("""
-                            SELECT * FROM sys_menu 
-                            WHERE id IN (SELECT menu_id FROM sys_role_menu WHERE role_id=%s)
-                        """, [roleId])
-                        for menu in menus:
-                            menuSet.add(menu)
-                menuList = list(menuSet)
-
-                sortedMenus = sorted(menuList, key=lambda x: x.order_num if x.order_num else 999)
-                treeMenus = self.buildTreeMenu(sortedMenus)
-                serializerMenus = [SysMenuSerializer(menu).data for menu in treeMenus]
+            user = await SysUser.objects.aget(username=username)
+            # PBKDF2为CPU密集计算，提交到哈希进程池，不占用事件循环和数据库线程
+            if password and await acheck_password(password, user.password):
+                # 角色与菜单一次联表查询并缓存（见 menu/services.py）
+                roles, serializerMenus = await sync_to_async(get_user_menu_payload)(user.id)
 
                 # -------------------------- 关键修改开始 --------------------------
 
-                roles = ",".join([role.name for role in roleList])
-
-                # 1. 生成Token（原有逻辑）
-                refresh = RefreshToken.for_user(user)
+                # 1. 生成Token：携带角色编码与权限版本，到期后凭refresh_token调用 /user/refresh 续期
+                refresh = await sync_to_async(issue_tokens)(user)
                 access_token = str(refresh.access_token)
 
                 # 2. 新增：构建userInfo（包含用户名、头像路径，适配前端currentUser存储）
@@ -338,6 +72,7 @@ class LoginView(View):
                 return JsonResponse({
                     'code': 200,
                     'token': access_token,
+                    'refresh_token': str(refresh),
                     'menuList': serializerMenus,
                     'userInfo': {  # 原有userInfo字段不变
                         'username': user.username,
@@ -356,18 +91,39 @@ class LoginView(View):
                 return JsonResponse({'code': 401, 'info': '密码错误！'})
         except SysUser.DoesNotExist:
             return JsonResponse({'code': 401, 'info': '用户名不存在！'})
+        except HashingOverloaded:
+            return JsonResponse({'code': 503, 'info': '服务繁忙，请稍后重试'}, status=503)
         except Exception as e:
             print(f"登录异常：{str(e)}")
             return JsonResponse({'code': 500, 'info': '服务器内部错误！'})
 
+@method_decorator(csrf_exempt, name='dispatch')
+class RefreshView(View):
+    def post(self, request):
+        """用refresh_token换取新的access token：只验签，不校验密码也不重建菜单树"""
+        try:
+            data = parse_json(request.body)
+            token = data.get('refresh_token', '')
+            if not token:
+                return JsonResponse({'code': 400, 'info': 'refresh_token不能为空！'})
+            access, refresh = refresh_tokens(token)
+            result = {'code': 200, 'token': str(access), 'info': 'Token刷新成功！'}
+            if refresh is not None:
+                result['refresh_token'] = str(refresh)
+            return JsonResponse(result)
+        except JSONDecodeError:
+            return JsonResponse({'code': 400, 'info': '请求格式错误，需为JSON！'})
+        except TokenError:
+            return JsonResponse({'code': 401, 'info': '登录已过期，请重新登录！'}, status=401)
+        except Exception as e:
+            print(f"刷新Token异常：{str(e)}")
+            return JsonResponse({'code': 500, 'info': '服务器内部错误！'})
+
+
 class TestView(View):
     def get(self, request):
-        # 兼容Bearer Token格式
-        token = request.META.get('HTTP_AUTHORIZATION', '')
-        if token.startswith('Bearer '):
-            token = token.split(' ')[1]
-
-        if token:
+        # Token已由JwtAuthenticationMiddleware验证，解析结果挂在request.jwt_claims上
+        if getattr(request, 'jwt_claims', None):
             try:
                 userList = list(SysUser.objects.all().values())
                 return JsonResponse({'code': 200, 'info': '测试！', 'data': userList})
@@ -402,14 +158,15 @@ class JwtTestView(View):
 
 @method_decorator(csrf_exempt, name='dispatch')  # 对齐文档3-299行csrf豁免规范
 class SaveView(View):
+    @sticky_after_write
     def post(self, request):
         try:
-            data = json.loads(request.body.decode("utf-8"))
+            data = parse_json(request.body)
             print(f"Received data: {data}")
 
             if data['id'] == -1:  # 添加用户（对齐文档3-604行添加逻辑）
-                # 1. 用户名唯一性校验（文档隐含的基础校验）
-                if SysUser.objects.filter(username=data['username']).exists():
+                # 1. 用户名唯一性校验（过滤器判定不存在时不查库，并发写入由唯一索引兜底）
+                if username_exists(data['username']):
                     return JsonResponse({'code': 400, 'info': f'用户名"{data["username"]}"已存在，请更换！'})
 
                 # 2. 创建用户（严格对齐文档3-604行字段赋值）
@@ -440,7 +197,7 @@ class SaveView(View):
 
                 # 2. 用户名变更校验（文档隐含的唯一性逻辑）
                 if data['username'] != existing_user.username:
-                    if SysUser.objects.filter(username=data['username']).exists():
+                    if username_exists(data['username']):
                         return JsonResponse({'code': 400, 'info': f'用户名"{data["username"]}"已存在，请更换！'})
 
                 # 3. 基础字段更新（对齐文档3-604行字段覆盖逻辑）
@@ -449,25 +206,36 @@ class SaveView(View):
                 existing_user.email = data.get('email', existing_user.email)
                 existing_user.phonenumber = data.get('phonenumber', existing_user.phonenumber)
                 existing_user.login_date = data.get('login_date', existing_user.login_date)
+                statusChanged = 'status' in data and data['status'] != existing_user.status
                 existing_user.status = data.get('status', existing_user.status)
                 existing_user.remark = data.get('remark', existing_user.remark)
 
                 # 4. 密码特殊处理（文档3-604行未显式处理，按安全规范补充哈希）
-                if 'password' in data and data['password']:
+                passwordChanged = bool(data.get('password'))
+                if passwordChanged:
                     existing_user.password = make_password(data['password'])
 
                 # 5. 更新时间（对齐文档3-604行update_time赋值）
                 existing_user.update_time = datetime.now().date()
 
-                existing_user.save()
+                with transaction.atomic():
+                    existing_user.save()
+                    # 改密或修改状态后吊销该用户已签发的Token
+                    if passwordChanged or statusChanged:
+                        revoke_user_tokens([existing_user.id], REASON_PASSWORD if passwordChanged else REASON_STATUS)
                 print(f"User {existing_user.username} updated successfully.")
 
             # 统一响应格式（对齐文档3-604行返回规范）
             return JsonResponse({'code': 200, 'info': '用户信息保存成功！'})
 
-        except json.JSONDecodeError as e:
+        except JSONDecodeError as e:
             print(f"JSON decode error: {str(e)}")
             return JsonResponse({'code': 400, 'info': '请求格式错误，需为JSON'})
+        except IntegrityError:
+            # 校验通过后被并发请求抢先使用，或其它进程刚改名而本进程过滤器尚未重建
+            return JsonResponse({'code': 400, 'info': f'用户名"{data["username"]}"已存在，请更换！'})
+        except HashingOverloaded:
+            return JsonResponse({'code': 503, 'info': '服务繁忙，请稍后重试'}, status=503)
         except Exception as e:
             print(f"保存用户异常：{str(e)}")
             return JsonResponse({'code': 500, 'info': '服务器内部错误！'})
@@ -475,7 +243,8 @@ class SaveView(View):
 
 @method_decorator(csrf_exempt, name='dispatch')  # 对齐文档3-299行CSRF豁免
 class ActionView(View):
-    def get(self, request):
+    @read_only_view
+    async def get(self, request):
         """
         根据id获取用户信息（对齐文档3-606行ActionView逻辑）
         :param request:
@@ -487,11 +256,11 @@ class ActionView(View):
             if not id:
                 return JsonResponse({'code': 400, 'info': '参数id不能为空！'})
 
-            user_object = SysUser.objects.get(id=id)
+            user_object = await SysUser.objects.aget(id=id)
             # 用序列化器返回数据（文档3-325行序列化器使用规范）
             return JsonResponse({
                 'code': 200,
-                'user': SysUserSerializer(user_object).data,
+                'user': buildUserDict(user_object),
                 'info': '获取用户信息成功！'
             })
         except SysUser.DoesNotExist:
@@ -500,37 +269,40 @@ class ActionView(View):
             print(f"获取用户异常：{str(e)}")
             return JsonResponse({'code': 500, 'info': '服务器内部错误！'})
 
-    def delete(self, request):
+    @sticky_after_write
+    async def delete(self, request):
         """
         删除操作
         :param request:
         :return:
         """
 
-        idList = json.loads(request.body.decode("utf-8"))
-        SysUserRole.objects.filter(user_id__in=idList).delete()
-        SysUser.objects.filter(id__in=idList).delete()
+        idList = parse_json(request.body)
+        await SysUserRole.objects.filter(user_id__in=idList).adelete()
+        await SysUser.objects.filter(id__in=idList).adelete()
+        await sync_to_async(revoke_user_tokens)(idList, REASON_DELETED)
         return JsonResponse({'code': 200})
 
 
 @method_decorator(csrf_exempt, name='dispatch')  # 前端POST需豁免CSRF
 class CheckView(View):
+    @read_only_view
     def post(self, request):
         """验证用户名是否重复（对齐文档3-608行CheckView逻辑）"""
         try:
-            data = json.loads(request.body.decode("utf-8"))
+            data = parse_json(request.body)
             username = data.get('username', '')  # 用get避免KeyError
             print("username=", username)
 
             if not username:
                 return JsonResponse({'code': 400, 'info': '用户名不能为空！'})
 
-            # 用户名唯一性校验（文档3-608行核心逻辑）
-            if SysUser.objects.filter(username=username).exists():
+            # 用户名唯一性校验（文档3-608行核心逻辑）；过滤器判定不存在时直接返回，不查库
+            if username_exists(username):
                 return JsonResponse({'code': 500, 'info': '用户名已存在，请更换！'})
             else:
                 return JsonResponse({'code': 200, 'info': '用户名可用！'})
-        except json.JSONDecodeError:
+        except JSONDecodeError:
             return JsonResponse({'code': 400, 'info': '请求格式错误，需为JSON！'})
         except Exception as e:
             print(f"校验用户名异常：{str(e)}")
@@ -538,9 +310,10 @@ class CheckView(View):
 
 @method_decorator(csrf_exempt, name='dispatch')
 class PwdView(View):
+    @sticky_after_write
     def post(self, request):
         try:
-            data = json.loads(request.body.decode("utf-8"))
+            data = parse_json(request.body)
             user_id = data.get('id')
             old_password = data.get('oldPassword')
             new_password = data.get('newPassword')
@@ -557,14 +330,18 @@ class PwdView(View):
             if not check_password(old_password, user.password):
                 return JsonResponse({'code': 500, 'info': '原密码错误！'})
 
-            # 加密新密码并更新
+            # 加密新密码并更新，同时吊销该用户已签发的Token（需重新登录）
             user.password = make_password(new_password)
             user.update_time = datetime.now().date()
-            user.save()
+            with transaction.atomic():
+                user.save()
+                revoke_user_tokens([user.id], REASON_PASSWORD)
 
             return JsonResponse({'code': 200, 'info': '密码修改成功'})
-        except json.JSONDecodeError:
+        except JSONDecodeError:
             return JsonResponse({'code': 400, 'info': '请求格式错误，需为JSON'})
+        except HashingOverloaded:
+            return JsonResponse({'code': 503, 'info': '服务繁忙，请稍后重试'}, status=503)
         except Exception as e:
             print(f"修改密码异常：{str(e)}")
             return JsonResponse({'code': 500, 'info': '服务器内部错误'})
@@ -572,20 +349,17 @@ class PwdView(View):
 
 @method_decorator(csrf_exempt, name='dispatch')
 class ImageView(View):
-    def post(self, request):
+    async def post(self, request):
         file = request.FILES.get('avatar')
         print("接收到的文件:", file)
         if file:
-            file_name = file.name
-            suffix_name = file_name[file_name.rfind("."):]
-            new_file_name = datetime.datetime.now().strftime('%Y%m%d%H%M%S') + suffix_name
-            file_path = f"{settings.MEDIA_ROOT}/userAvatar/{new_file_name}"
-            print("文件存储路径:", file_path)
             try:
-                with open(file_path, 'wb') as f:
-                    for chunk in file.chunks():
-                        f.write(chunk)
+                # 解码校验与写文件在线程池中完成，32/64/128px缩略图在后台生成（见 user/avatars.py）
+                new_file_name = await store_avatar(file)
+                print("文件存储名:", new_file_name)
                 return JsonResponse({'code': 200, 'title': new_file_name})
+            except InvalidImage as e:
+                return JsonResponse({'code': 400, 'errorInfo': str(e)})
             except Exception as e:
                 print(f"上传头像异常: {e}")
                 return JsonResponse({'code': 500, 'errorInfo': '上传头像失败'})
@@ -593,9 +367,10 @@ class ImageView(View):
 
 @method_decorator(csrf_exempt, name='dispatch')
 class AvatarView(View):
+    @sticky_after_write
     def post(self, request):
         try:
-            data = json.loads(request.body.decode("utf-8"))
+            data = parse_json(request.body)
             print("AvatarView接收到的数据data:", data)
             user_id = data.get('id')
             avatar = data.get('avatar')
@@ -626,11 +401,15 @@ class PasswordView(View):
             # 密码必须哈希存储（对齐文档安全规范，参考SaveView实现）
             user.password = make_password('123456')
             user.update_time = datetime.now().date()
-            user.save()
+            with transaction.atomic():
+                user.save()
+                revoke_user_tokens([user.id], REASON_PASSWORD)
             return JsonResponse({'code': 200, 'info': '密码重置成功，默认密码：123456'})
 
         except SysUser.DoesNotExist:
             return JsonResponse({'code': 404, 'info': '用户不存在'})
+        except HashingOverloaded:
+            return JsonResponse({'code': 503, 'info': '服务繁忙，请稍后重试'}, status=503)
         except Exception as e:
             print(f"重置密码异常：{str(e)}")
             return JsonResponse({'code': 500, 'info': '服务器内部错误'})
@@ -638,10 +417,11 @@ class PasswordView(View):
 
 @method_decorator(csrf_exempt, name='dispatch')  # CSRF豁免，适配前端POST请求
 class StatusView(View):
+    @sticky_after_write
     def post(self, request):
         """修改用户状态（启用/禁用）"""
         try:
-            data = json.loads(request.body.decode("utf-8"))
+            data = parse_json(request.body)
             user_id = data.get('id')
             status = data.get('status')
 
@@ -649,12 +429,16 @@ class StatusView(View):
                 return JsonResponse({'code': 400, 'info': '参数id和status不能为空'})
 
             user = SysUser.objects.get(id=user_id)
+            statusChanged = user.status != status
             user.status = status
             user.update_time = datetime.now().date()  # 更新状态时同步更新时间
-            user.save()
+            with transaction.atomic():
+                user.save()
+                if statusChanged:
+                    revoke_user_tokens([user.id], REASON_STATUS)
             return JsonResponse({'code': 200, 'info': '用户状态更新成功'})
 
-        except json.JSONDecodeError:
+        except JSONDecodeError:
             return JsonResponse({'code': 400, 'info': '请求格式错误，需为JSON'})
         except SysUser.DoesNotExist:
             return JsonResponse({'code': 404, 'info': '用户不存在'})
@@ -670,68 +454,231 @@ class StatusView(View):
 
 
 
+def _parse_id_list(ids):
+    """校验批量接口的id列表，返回整数列表；不合法时返回None"""
+    if not isinstance(ids, list) or not ids:
+        return None
+    try:
+        return [int(userId) for userId in ids]
+    except (TypeError, ValueError):
+        return None
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class BatchStatusView(View):
+    @sticky_after_write
+    def post(self, request):
+        """批量修改用户状态：{"ids": [...], "status": 0/1}，按块执行单条UPDATE"""
+        try:
+            data = parse_json(request.body)
+            userIds = _parse_id_list(data.get('ids'))
+            status = data.get('status')
+            if userIds is None or status is None:
+                return JsonResponse({'code': 400, 'info': '参数ids和status不能为空'})
+
+            with transaction.atomic():
+                # 只更新状态确有变化的用户，已是目标状态或不存在的id不更新、不吊销Token
+                changedIds = lock_changed_users(userIds, status=status)
+                count = bulk_update_users(changedIds, status=status, update_time=datetime.now().date())
+                revoke_user_tokens(changedIds, REASON_STATUS)
+            return JsonResponse({'code': 200, 'info': '用户状态更新成功', 'count': count})
+        except JSONDecodeError:
+            return JsonResponse({'code': 400, 'info': '请求格式错误，需为JSON'})
+        except Exception as e:
+            print(f"批量修改状态异常：{str(e)}")
+            return JsonResponse({'code': 500, 'info': '服务器内部错误'})
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class BatchPasswordView(View):
+    @sticky_after_write
+    def post(self, request):
+        """批量重置密码为默认123456：{"ids": [...]}，默认密码只哈希一次"""
+        try:
+            data = parse_json(request.body)
+            userIds = _parse_id_list(data.get('ids'))
+            if userIds is None:
+                return JsonResponse({'code': 400, 'info': '参数ids不能为空'})
+
+            password = make_password('123456')
+            with transaction.atomic():
+                count = bulk_update_users(userIds, password=password, update_time=datetime.now().date())
+                revoke_user_tokens(userIds, REASON_PASSWORD)
+            return JsonResponse({'code': 200, 'info': '密码重置成功，默认密码：123456', 'count': count})
+        except JSONDecodeError:
+            return JsonResponse({'code': 400, 'info': '请求格式错误，需为JSON'})
+        except HashingOverloaded:
+            return JsonResponse({'code': 503, 'info': '服务繁忙，请稍后重试'}, status=503)
+        except Exception as e:
+            print(f"批量重置密码异常：{str(e)}")
+            return JsonResponse({'code': 500, 'info': '服务器内部错误'})
+
+
+# 用户导出
+class ExportView(View):
+    def get(self, request):
+        """
+        流式导出用户（不含密码），format=csv/ndjson，可选query按用户名过滤
+        数据按主键分块读取并逐块输出，导出全表时内存占用保持恒定
+        """
+        fmt = request.GET.get('format', 'csv')
+        if fmt not in ('csv', 'ndjson'):
+            return JsonResponse({'code': 400, 'info': 'format仅支持csv或ndjson'})
+        queryset = search_users(SysUser.objects.all(), request.GET.get('query', ''))
+        # ASGI下使用异步生成器，WSGI下使用同步生成器，两者都能边查边发
+        if isinstance(request, ASGIRequest):
+            content = astream_users(queryset, fmt)
+        else:
+            content = stream_users(queryset, fmt)
+        response = StreamingHttpResponse(
+            content, content_type='text/csv; charset=utf-8' if fmt == 'csv' else 'application/x-ndjson')
+        response['Content-Disposition'] = f'attachment; filename="users.{fmt}"'
+        return response
+
+
+# 用户批量导入
+@method_decorator(csrf_exempt, name='dispatch')
+class ImportView(View):
+    @sticky_after_write
+    def post(self, request):
+        """
+        批量导入用户：上传字段file，或直接把CSV/NDJSON作为请求体
+        格式由参数format（csv/ndjson）指定，缺省时按文件扩展名或Content-Type判断
+        单行出错不影响其它行，逐行错误在errors中返回
+        """
+        upload = request.FILES.get('file')
+        source = upload if upload else request  # 两者都可按行迭代，边读边导入
+        fmt = request.GET.get('format', '')
+        if not fmt:
+            name = upload.name.lower() if upload else ''
+            contentType = request.content_type or ''
+            if name.endswith(('.ndjson', '.jsonl')) or 'ndjson' in contentType:
+                fmt = 'ndjson'
+            elif name.endswith('.csv') or 'csv' in contentType:
+                fmt = 'csv'
+        if fmt not in ('csv', 'ndjson'):
+            return JsonResponse({'code': 400, 'info': '请通过format参数指定导入格式：csv或ndjson'})
+        try:
+            with UserImporter() as importer:
+                importer.run(iter_rows(source, fmt))
+            return JsonResponse({'code': 200, 'info': '导入完成', **importer.result()})
+        except HashingOverloaded:
+            return JsonResponse({'code': 503, 'info': '已有导入任务在执行，请稍后重试'}, status=503)
+        except UnicodeDecodeError:
+            return JsonResponse({'code': 400, 'info': '文件需为UTF-8编码'})
+        except Exception as e:
+            print(f"批量导入用户异常：{str(e)}")
+            return JsonResponse({'code': 500, 'info': '服务器内部错误'})
+
+
 # 用户信息查询
+LIST_AVATAR_SIZE = 64
+
+
 @method_decorator(csrf_exempt, name='dispatch')  # 对齐文档3-299行csrf豁免规范
 class SearchView(View):
-    def post(self, request):
+    @read_only_view
+    async def post(self, request):
         try:
-            data = json.loads(request.body.decode("utf-8"))
-            pageNum = data['pageNum']  # 当前页（对应文档3-581行分页参数）
-            pageSize = data['pageSize']  # 每页大小（对应文档3-581行分页参数）
+            data = parse_json(request.body)
+            try:
+                pageSize = int(data['pageSize'])  # 每页大小（对应文档3-581行分页参数）
+            except (TypeError, ValueError):
+                return JsonResponse({'code': 400, 'info': 'pageSize需为整数'})
+            if pageSize < 1:
+                return JsonResponse({'code': 400, 'info': 'pageSize需大于0'})
             query = data.get('query', '')  # 查询参数，默认空字符串避免KeyError
 
             # 1. 修复查询语法：用__icontains实现不区分大小写模糊查询（对齐文档3-594行）
             # 2. 修复SQL注入：raw查询用参数化传递userId（对齐文档3-394行安全规范）
-            user_queryset = SysUser.objects.filter(username__icontains=query)
-            userListPage = Paginator(user_queryset, pageSize).page(pageNum)
+            # 子串检索走三元组索引（user/search.py），可通过searchFields同时检索邮箱、手机号
+            searchFields = data.get('searchFields') or ['username']
+            if not set(searchFields) <= set(INDEXED_FIELDS):
+                return JsonResponse({'code': 400, 'info': f'searchFields仅支持：{",".join(INDEXED_FIELDS)}'})
+            user_queryset = search_users(SysUser.objects.all(), query, searchFields)
+
+            result = {'code': 200}
+            if 'cursor' in data:
+                # 游标分页（可选）：按键集翻页，默认不统计总数
+                users, result['nextCursor'] = await akeyset_page(user_queryset.values(), pageSize,
+                                                                 data['cursor'], data.get('orderBy', 'id'))
+                if data.get('withTotal'):
+                    result['total'] = await user_queryset.acount()
+            else:
+                try:
+                    pageNum = int(data['pageNum'])  # 当前页（对应文档3-581行分页参数）
+                except (KeyError, TypeError, ValueError):
+                    return JsonResponse({'code': 400, 'info': 'pageNum需为整数'})
+                if pageNum < 1:
+                    return JsonResponse({'code': 400, 'info': 'pageNum需大于0'})
+                result['total'] = await user_queryset.acount()
+                offset = (pageNum - 1) * pageSize
+                pageQueryset = user_queryset.order_by('id').values()[offset:offset + pageSize]
+                users = [user async for user in pageQueryset]  # 转字典（对应文档3-68行序列化处理）
+
+            # 整页用户的角色一次IN查询取回，再在内存中分组（避免每个用户一次查询）
+            roleLists = await aload_role_lists([user['id'] for user in users])
+            for user in users:
+                user['roleList'] = roleLists.get(user['id'], [])  # 为用户添加角色列表（对应文档3-594行角色关联逻辑）
+                user['avatarThumb'] = resolve_avatar(user['avatar'], LIST_AVATAR_SIZE)  # 列表页使用小尺寸头像
 
-            obj_users = userListPage.object_list.values()  # 转字典（对应文档3-68行序列化处理）
-            users = list(obj_users)
+            result['userList'] = users
+            return JsonResponse(result)
 
-            for user in users:
-                userId = user['id']
-                # 修复SQL拼接风险：用参数化查询传递userId
-                roleList = SysRole.objects.raw("""
-                    SELECT id, name FROM sys_role 
-                    WHERE id IN (SELECT role_id FROM sys_user_role WHERE user_id = %s)
-                """, [userId])  # 对齐文档3-394行raw查询语法
-
-                roleListDict = []
-                for role in roleList:
-                    roleDict = {'id': role.id, 'name': role.name}
-                    roleListDict.append(roleDict)
-                user['roleList'] = roleListDict  # 为用户添加角色列表（对应文档3-594行角色关联逻辑）
-
-            total = user_queryset.count()  # 优化计数：直接用查询集计数，避免重复查询
-            return JsonResponse({'code': 200, 'userList': users, 'total': total})
-
-        except json.JSONDecodeError:
+        except InvalidCursor as e:
+            return JsonResponse({'code': 400, 'info': str(e)})
+        except JSONDecodeError:
             return JsonResponse({'code': 400, 'info': '请求格式错误，需为JSON'})  # 对齐文档3-525行异常处理
         except Exception as e:
             print(f"查询用户异常：{str(e)}")
             return JsonResponse({'code': 500, 'info': '服务器内部错误'})  # 对齐文档3-314行异常捕获
 
 
-# @method_decorator(csrf_exempt, name='dispatch')
-# class AssignRolesView(View):
-#     def post(self, request):
-#         try:
-#             data = request.POST  # 假设前端传递form-data格式数据，若为json需用json.loads(request.body)
-#             user_id = data.get('userId')
-#             role_ids = data.getlist('roleIds[]')  # 若前端传递的是数组形式的角色ID列表
-#
-#             if not user_id or not role_ids:
-#                 return JsonResponse({'code': 400, 'info': '用户ID和角色ID不能为空'})
-#
-#             # 先删除该用户已有的角色关联
-#             SysUserRole.objects.filter(user_id=user_id).delete()
-#             # 再添加新的角色关联
-#             for role_id in role_ids:
-#                 SysUserRole.objects.create(user_id=user_id, role_id=role_id)
-#
-#             return JsonResponse({'code': 200, 'info': '角色分配成功'})
-#         except Exception as e:
-#             print(f"角色分配异常：{str(e)}")
-#             return JsonResponse({'code': 500, 'info': '角色分配失败，请重试'})
+def _parse_assignments(data):
+    """
+    解析角色分配请求，支持三种格式：
+      {"userId": 1, "roleIds": [1, 2]}                      单个用户
+      {"userIds": [1, 2, 3], "roleIds": [1, 2]}             多个用户分配相同角色
+      [{"userId": 1, "roleIds": [1]}, ...]                  多个用户各自的角色（或 {"assignments": [...]}）
+    :return: user_id -> 角色id集合；不合法时返回None
+    """
+    if isinstance(data, dict) and 'assignments' in data:
+        data = data['assignments']
+    try:
+        if isinstance(data, list):
+            items = [(item['userId'], item['roleIds']) for item in data]
+        elif 'userIds' in data:
+            items = [(userId, data['roleIds']) for userId in data['userIds']]
+        else:
+            items = [(data['userId'], data['roleIds'])]
+        assignments = {}
+        for userId, roleIds in items:
+            if not isinstance(roleIds, list):
+                return None
+            assignments[int(userId)] = {int(roleId) for roleId in roleIds}
+    except (KeyError, TypeError, ValueError):
+        return None
+    return assignments or None
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AssignRolesView(View):
+    @sticky_after_write
+    def post(self, request):
+        """分配角色：按差集增删用户角色关联，整批在一个事务中完成"""
+        try:
+            assignments = _parse_assignments(parse_json(request.body))
+            if assignments is None:
+                return JsonResponse({'code': 400, 'info': '用户ID和角色ID列表不能为空'})
+
+            created, deleted = assign_roles(assignments)
+            return JsonResponse({'code': 200, 'info': '角色分配成功', 'created': created, 'deleted': deleted})
+        except JSONDecodeError:
+            return JsonResponse({'code': 400, 'info': '请求格式错误，需为JSON'})
+        except InvalidAssignment as e:
+            return JsonResponse({'code': 400, 'info': str(e)})
+        except Exception as e:
+            print(f"角色分配异常：{str(e)}")
+            return JsonResponse({'code': 500, 'info': '角色分配失败，请重试'})
 
 